@@ -0,0 +1,257 @@
+import asyncio
+import queue
+import serial
+import threading
+
+# seconds to wait for the first connection when the transport is created
+kCONNECT_TIMEOUT = 10
+
+# reconnect delays in seconds - the last value is repeated until connected
+kRECONNECT_DELAYS = [1, 2, 5, 10, 30]
+
+# maximum bytes read from the serial port in one call
+kSERIAL_READ_SIZE = 4096
+
+
+class AsyncTransport(object):
+    """
+    This object is an asyncio based connection to the AlarmDecoder. It runs its own event loop on a
+    background thread. The ser2sock (socket://host:port) connection uses asyncio streams and a local
+    serial port is read via the event loop watching the serial port file descriptor.
+
+    It provides the same methods and properties as a pyserial object that are used by the plugin
+    (readline, write, close, is_open, in_waiting, timeout) so it can be used in place of the object
+    returned by serial.serial_for_url. Reading, writing, reconnecting and re-sending the handshake
+    commands (VER and CONFIG) after a reconnect all run on the one event loop.
+
+    The basic usage is:
+
+        x = AsyncTransport(url='socket://127.0.0.1:10000', logger=loggerObject, handshakeCommands=['V\\r', 'C\\r'])
+        x.write(b'V\\r')  # returns the number of bytes written
+        x.readline()  # returns bytes of one line or b'' if timeout seconds passed with no line
+        x.close()
+    """
+
+    def __init__(self, url='', baudrate=115200, timeout=None, logger=None, handshakeCommands=None):
+        """
+        Creates the event loop and opens the connection. Raises an exception if the first connection fails.
+
+        **parameters:**
+        url -- a 'socket://host:port' URL or a serial port name
+        baudrate -- serial port baud rate (ignored for socket:// connections)
+        timeout -- seconds readline will wait for a line. None waits forever.
+        logger -- the logger object to use
+        handshakeCommands -- list of command strings to send after each reconnect
+        """
+        if logger is None:
+            raise ValueError("logger parameter not provided or not a logger object.")
+
+        self.logger = logger
+        self.url = url
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.handshakeCommands = handshakeCommands or []
+
+        self.isConnected = False
+        self.isClosed = False
+
+        self.__lineQueue = queue.Queue()
+        self.__readBuffer = bytearray()
+        self.__reader = None
+        self.__writer = None
+        self.__serial = None
+        self.__reconnectAttempt = 0
+        self.__reconnectHandle = None
+
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__runLoop, name='AlarmDecoderAsyncTransport', daemon=True)
+        self.__thread.start()
+
+        # make the first connection - errors are raised to the caller like serial.serial_for_url
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.__connect(), self.__loop)
+            future.result(kCONNECT_TIMEOUT)
+
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def is_open(self):
+        # the transport stays open while it is reconnecting - only close() ends it
+        return not self.isClosed
+
+    @property
+    def in_waiting(self):
+        # the number of complete lines waiting - used to tell if there is a backlog
+        return self.__lineQueue.qsize()
+
+    def readline(self):
+        """
+        returns the next line as bytes (including the line ending) or b'' if no line arrives
+        within timeout seconds
+        """
+        try:
+            return self.__lineQueue.get(timeout=self.timeout)
+
+        except queue.Empty:
+            return b''
+
+    def write(self, data):
+        """
+        writes bytes to the AlarmDecoder via the event loop and returns the number of bytes written.
+        Raises an exception if the write fails or the AlarmDecoder is not connected.
+
+        **parameters:**
+        data -- bytes to write
+        """
+        if self.isClosed:
+            raise serial.SerialException("connection is closed")
+
+        future = asyncio.run_coroutine_threadsafe(self.__write(data), self.__loop)
+        return future.result(kCONNECT_TIMEOUT)
+
+    def close(self):
+        """
+        closes the connection, cancels any reconnect and stops the event loop
+        """
+        if self.isClosed:
+            return
+
+        self.isClosed = True
+
+        try:
+            if self.__loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(self.__disconnect(), self.__loop)
+                future.result(kCONNECT_TIMEOUT)
+                self.__loop.call_soon_threadsafe(self.__loop.stop)
+
+            self.__thread.join(kCONNECT_TIMEOUT)
+
+        except Exception as err:
+            self.logger.debug(u"error closing async transport - error:{}".format(str(err)))
+
+    def __runLoop(self):
+        asyncio.set_event_loop(self.__loop)
+        self.__loop.run_forever()
+        self.__loop.close()
+
+    async def __connect(self):
+        if self.url.startswith('socket://'):
+            host, port = self.url[len('socket://'):].rsplit(':', 1)
+            self.__reader, self.__writer = await asyncio.open_connection(host, int(port))
+            self.__loop.create_task(self.__readSocket())
+
+        else:
+            # non-blocking serial port read by watching its file descriptor
+            self.__serial = serial.serial_for_url(self.url, baudrate=self.baudrate, timeout=0)
+            self.__loop.add_reader(self.__serial.fileno(), self.__readSerial)
+
+        self.isConnected = True
+        self.__reconnectAttempt = 0
+        self.logger.info(u"async transport connected to AlarmDecoder:{}".format(self.url))
+
+    async def __disconnect(self):
+        if self.__reconnectHandle is not None:
+            self.__reconnectHandle.cancel()
+            self.__reconnectHandle = None
+
+        self.__closeConnection()
+
+    def __closeConnection(self):
+        self.isConnected = False
+
+        if self.__writer is not None:
+            self.__writer.close()
+            self.__writer = None
+            self.__reader = None
+
+        if self.__serial is not None:
+            try:
+                self.__loop.remove_reader(self.__serial.fileno())
+            except Exception:
+                pass
+            self.__serial.close()
+            self.__serial = None
+
+    async def __write(self, data):
+        if not self.isConnected:
+            raise serial.SerialException("AlarmDecoder is not connected - reconnect pending")
+
+        if self.__writer is not None:
+            self.__writer.write(data)
+            await self.__writer.drain()
+        else:
+            self.__serial.write(data)
+
+        return len(data)
+
+    async def __readSocket(self):
+        reader = self.__reader
+
+        try:
+            while True:
+                data = await reader.read(kSERIAL_READ_SIZE)
+                if len(data) == 0:
+                    break
+                self.__addData(data)
+
+        except Exception as err:
+            self.logger.error(u"async transport read error:{}".format(str(err)))
+
+        self.__connectionLost()
+
+    def __readSerial(self):
+        try:
+            data = self.__serial.read(self.__serial.in_waiting or 1)
+            if len(data) > 0:
+                self.__addData(data)
+
+        except Exception as err:
+            self.logger.error(u"async transport read error:{}".format(str(err)))
+            self.__connectionLost()
+
+    def __addData(self, data):
+        # split the buffer into complete lines and keep any partial line for the next read
+        self.__readBuffer.extend(data)
+
+        while True:
+            lineEnd = self.__readBuffer.find(b'\n')
+            if lineEnd < 0:
+                break
+
+            self.__lineQueue.put(bytes(self.__readBuffer[:lineEnd + 1]))
+            del self.__readBuffer[:lineEnd + 1]
+
+    def __connectionLost(self):
+        if self.isClosed or (not self.isConnected):
+            return
+
+        self.logger.error(u"async transport lost connection to AlarmDecoder:{}".format(self.url))
+        self.__closeConnection()
+        self.__readBuffer.clear()
+        self.__scheduleReconnect()
+
+    def __scheduleReconnect(self):
+        if self.isClosed:
+            return
+
+        delay = kRECONNECT_DELAYS[min(self.__reconnectAttempt, len(kRECONNECT_DELAYS) - 1)]
+        self.__reconnectAttempt += 1
+        self.logger.info(u"async transport will attempt to reconnect in {} seconds".format(delay))
+        self.__reconnectHandle = self.__loop.call_later(delay, lambda: self.__loop.create_task(self.__reconnect()))
+
+    async def __reconnect(self):
+        self.__reconnectHandle = None
+
+        try:
+            await self.__connect()
+
+            # re-send the handshake commands so VER and CONFIG are read again
+            for command in self.handshakeCommands:
+                await self.__write(command.encode("utf8"))
+
+        except Exception as err:
+            self.logger.error(u"async transport unable to reconnect - error:{}".format(str(err)))
+            self.isConnected = False
+            self.__scheduleReconnect()
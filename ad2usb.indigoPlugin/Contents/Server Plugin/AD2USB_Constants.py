@@ -95,3 +95,13 @@ k_CODE_USE_VARIABLE = 'inVariable'
 k_CODE_USE_OTP = 'inOTP'
 k_CODE_USE_PREFS = 'inPrefs'
 
+
+# Message reading loop settings
+k_READ_LOOP_SLEEP = 0.5  # seconds runConcurrentThread sleeps when no messages are waiting
+k_MESSAGE_CACHE_SIZE = 64  # number of parsed keypad messages to keep - see AlarmDecoder.MessageCache
+
+# AlarmDecoder write priorities - lower numbers are written first
+k_WRITE_PRIORITY_KEYPAD = 0  # arming, disarming, panic and other keypad messages
+k_WRITE_PRIORITY_COMMAND = 1  # AlarmDecoder commands - CONFIG and VER
+k_WRITE_PRIORITY_VIRTUAL_ZONE = 2  # virtual zone L commands
+k_WRITE_PRIORITY_PRESS_STAR = 3  # automatic '*' sent for "Press * to show faults"
@@ -0,0 +1,85 @@
+# maximum bytes kept while waiting for a line ending - protects against a stream with no line endings
+kMAX_PARTIAL_LINE = 4096
+
+
+class LineFramer(object):
+    """
+    This object splits a stream of bytes read from the AlarmDecoder into complete lines.
+    Bytes are added with feed() as they are read in chunks of any size. Complete lines (ending in LF
+    or CRLF) are returned one at a time by getLine() and any partial line is kept until the rest
+    of it arrives on a later read.
+
+    The basic usage is:
+
+        x = LineFramer()
+        x.feed(someBytes)
+        x.getLine()  # returns the next complete line as a string (with the line ending) or None
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.searchStart = 0
+
+        # statistics
+        self.chunksRead = 0
+        self.bytesRead = 0
+        self.linesFramed = 0
+        self.partialLinesDiscarded = 0
+
+    def feed(self, data):
+        """
+        adds bytes read from the AlarmDecoder to the buffer
+
+        **parameters:**
+        data -- bytes read from the AlarmDecoder
+        """
+        if len(data) == 0:
+            return
+
+        self.chunksRead += 1
+        self.bytesRead += len(data)
+        self.buffer.extend(data)
+
+        # a line this long without a line ending is not a valid message - drop it
+        if (len(self.buffer) > kMAX_PARTIAL_LINE) and (self.buffer.find(b'\n', self.searchStart) < 0):
+            self.partialLinesDiscarded += 1
+            self.clear()
+
+    def getLine(self):
+        """
+        returns the next complete line as a string including the line ending or None if
+        there is no complete line in the buffer
+        """
+        lineEnd = self.buffer.find(b'\n', self.searchStart)
+        if lineEnd < 0:
+            # start the next search where this one ended
+            self.searchStart = len(self.buffer)
+            return None
+
+        lineInBytes = bytes(self.buffer[:lineEnd + 1])
+        del self.buffer[:lineEnd + 1]
+        self.searchStart = 0
+        self.linesFramed += 1
+
+        # line endings never fall inside a multi-byte character so a complete line always decodes
+        return lineInBytes.decode("utf8", errors="replace")
+
+    def hasLine(self):
+        """
+        returns True if there is a complete line in the buffer
+        """
+        return self.buffer.find(b'\n', self.searchStart) >= 0
+
+    def clear(self):
+        """
+        discards any buffered bytes - used when the connection is reset
+        """
+        del self.buffer[:]
+        self.searchStart = 0
+
+    def getStatistics(self):
+        """
+        returns a dictionary of the framer statistics
+        """
+        return {'chunksRead': self.chunksRead, 'bytesRead': self.bytesRead, 'linesFramed': self.linesFramed,
+                'bufferedBytes': len(self.buffer), 'partialLinesDiscarded': self.partialLinesDiscarded}
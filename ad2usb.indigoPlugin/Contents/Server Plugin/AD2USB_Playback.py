@@ -0,0 +1,241 @@
+from datetime import datetime
+import glob
+import gzip
+import heapq
+import os
+import re
+import time
+
+# playback speeds - any other value is a number that multiplies real time (1 is real time)
+kPLAYBACK_FIXED = 'fixed'  # pause a fixed time between messages and ignore the timestamps
+kPLAYBACK_MAX = 'max'  # no pause - as fast as the messages can be processed
+
+# format of the timestamp written to the panel message log - see __initPanelLogging
+kPLAYBACK_TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class PanelMessagePlayback(object):
+    """
+    This object reads panel messages from a playback file one line at a time. The file is opened
+    once and kept open between calls so each message read costs the same no matter how far into
+    the file playback is.
+
+    The file name can also be a folder or a glob pattern (for example the rotated panelMessages.log.*
+    files). All of the files are read at the same time and their messages are returned in
+    timestamp order. Files ending in '.gz' are decompressed as they are read.
+
+    It expects the playback file to be in the **EXACT** format as the panel message log:
+    *datetime | panel_message_string* *BUT* will also allow a line to begin with '#' that
+    will be skipped or '~' that will be written to the Indigo log.
+
+    The basic usage is:
+
+        x = PanelMessagePlayback(fileName='/path/to/panelMessagePlayback.txt', logger=loggerObject)
+        x.readMessage()  # returns the next panel message string or None when the file has been read
+        x.messageTime  # the datetime of the last message read or None if it had no valid timestamp
+        x.lineNumber  # the line number of the last message read - in the file x.messageFileName
+        x.messageFileName  # the file the last message read came from
+        x.close()
+    """
+
+    def __init__(self, fileName='', logger=None):
+        """
+        **parameters:**
+        fileName -- the playback file, folder or glob pattern to read
+        logger -- the logger object to use
+        """
+        if logger is None:
+            raise ValueError("logger parameter not provided or not a logger object.")
+
+        self.logger = logger
+        self.fileName = fileName
+        self.lineNumber = 0
+        self.messageFileName = ''
+        self.messageTime = None
+        self.isFinished = False
+
+        self.fileNames = findPlaybackFiles(fileName)
+        self.__fileGenerators = [self.__messageGenerator(name) for name in self.fileNames]
+
+        if len(self.__fileGenerators) == 1:
+            self.__messages = self.__fileGenerators[0]
+        else:
+            # each file is in timestamp order so merging only needs one message from each file
+            self.__messages = heapq.merge(*self.__fileGenerators, key=lambda item: item[0])
+
+    def readMessage(self):
+        """
+        returns the next panel message as a string or None if the entire file has been read
+        """
+        if self.isFinished:
+            return None
+
+        try:
+            sortTime, self.messageTime, message, self.messageFileName, self.lineNumber = next(self.__messages)
+            return message
+
+        except StopIteration:
+            self.isFinished = True
+            return None
+
+    def close(self):
+        """
+        closes the playback files
+        """
+        for fileGenerator in self.__fileGenerators:
+            fileGenerator.close()
+        self.isFinished = True
+
+    def __messageGenerator(self, fileName):
+        # messages without a valid timestamp sort with the message before them
+        sortTime = datetime.min
+
+        # each file counts its own lines since messages from several files are merged
+        lineNumber = 0
+
+        # the with block keeps the file open until the generator is exhausted or closed
+        if fileName.endswith('.gz'):
+            f = gzip.open(fileName, 'rt')
+        else:
+            f = open(fileName, 'rt')
+
+        with f:
+            self.logger.debug(u'reading file:{}...'.format(fileName))
+
+            for line in f:
+                lineNumber += 1
+
+                # skip the line if its a comment
+                if line.startswith('#'):
+                    continue
+
+                # lines that start with ~ are test comments to log to Indigo Log Window
+                if line.startswith('~'):
+                    self.logger.info(line.strip())
+                    continue
+
+                # split on the "|" and strip the whitespace from the message part of the file
+                lineItems = re.split(r'\|', line, maxsplit=1)
+                if len(lineItems) < 2:
+                    self.logger.warning(u"Skipping playback file:{}, line {} - no '|' found:{}".format(
+                        fileName, lineNumber, line.strip()))
+                    continue
+
+                messageTime = parseTimestamp(lineItems[0])
+                if messageTime is not None:
+                    sortTime = messageTime
+
+                yield (sortTime, messageTime, lineItems[1].strip(), fileName, lineNumber)
+
+
+class PlaybackClock(object):
+    """
+    This object decides how long to pause before each playback message is processed. In the fixed
+    mode it pauses a set time per message (1 second for 'May Exit Now' countdown messages). Otherwise
+    it uses the timestamp of each message to reproduce the time between messages, divided by the
+    speed - 1 is real time, 10 is ten times faster. The 'max' speed does not pause at all.
+
+    Pauses are measured from the first message so time spent processing messages does not add up.
+
+    The basic usage is:
+
+        x = PlaybackClock(speed='1', fixedSleep=8)
+        x.waitForMessage(messageTime, message)  # pauses until it is time to process the message
+    """
+
+    def __init__(self, speed=kPLAYBACK_FIXED, fixedSleep=8):
+        """
+        **parameters:**
+        speed -- 'fixed', 'max' or a number (as a string or number) that multiplies real time
+        fixedSleep -- seconds to pause between messages in the fixed mode
+        """
+        self.fixedSleep = fixedSleep
+        self.setSpeed(speed)
+
+    def setSpeed(self, speed=kPLAYBACK_FIXED):
+        """
+        changes the playback speed and starts timing again from the next message
+
+        **parameters:**
+        speed -- 'fixed', 'max' or a number (as a string or number) that multiplies real time
+        """
+        if speed in (kPLAYBACK_FIXED, kPLAYBACK_MAX):
+            self.speed = speed
+        else:
+            try:
+                self.speed = float(speed)
+                if self.speed <= 0:
+                    self.speed = kPLAYBACK_MAX
+            except (TypeError, ValueError):
+                self.speed = kPLAYBACK_FIXED
+
+        self.__startMessageTime = None
+        self.__startWallTime = None
+
+    def waitForMessage(self, messageTime=None, message=''):
+        """
+        pauses until it is time to process the message
+
+        **parameters:**
+        messageTime -- the datetime of the message or None if it is not known
+        message -- the panel message
+        """
+        if self.speed == kPLAYBACK_MAX:
+            return
+
+        if self.speed == kPLAYBACK_FIXED:
+            if "May Exit Now" in message:
+                time.sleep(1)
+            else:
+                time.sleep(self.fixedSleep)
+            return
+
+        # messages without a timestamp are processed right away
+        if messageTime is None:
+            return
+
+        # start timing on the first message or if the timestamps go backwards (new file, clock change)
+        if (self.__startMessageTime is None) or (messageTime < self.__startMessageTime):
+            self.__startMessageTime = messageTime
+            self.__startWallTime = time.time()
+            return
+
+        offset = (messageTime - self.__startMessageTime).total_seconds() / self.speed
+        delay = self.__startWallTime + offset - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def findPlaybackFiles(fileName=''):
+    """
+    returns a sorted list of the playback files for a file name, folder or glob pattern.
+    Hidden files in a folder are skipped.
+
+    **parameters:**
+    fileName -- a file name, folder or glob pattern
+    """
+    fileName = os.path.expanduser(fileName)
+
+    if os.path.isfile(fileName):
+        return [fileName]
+
+    if os.path.isdir(fileName):
+        fileNames = [os.path.join(fileName, name) for name in os.listdir(fileName) if not name.startswith('.')]
+    else:
+        fileNames = glob.glob(fileName)
+
+    return sorted([name for name in fileNames if os.path.isfile(name)])
+
+
+def parseTimestamp(timestampString=''):
+    """
+    returns the datetime of a panel message log timestamp or None if it is not valid
+
+    **parameters:**
+    timestampString -- the part of the panel message log line before the '|'
+    """
+    try:
+        return datetime.strptime(timestampString.strip(), kPLAYBACK_TIME_FORMAT)
+
+    except ValueError:
+        return None
@@ -0,0 +1,175 @@
+import queue
+import threading
+import time
+
+# default maximum number of panel messages waiting to be processed
+kREADER_QUEUE_SIZE = 1000
+
+# seconds the reader waits before checking again when the connection is not available
+kREADER_IDLE_WAIT = 1.0
+
+# log a warning on the first dropped message and then every N drops
+kREADER_DROP_LOG_INTERVAL = 100
+
+
+class PanelMessageReader(object):
+    """
+    This object runs a background thread that reads panel messages from the AlarmDecoder and
+    places them on a bounded queue. The thread does no parsing and makes no Indigo calls so slow
+    message processing (or Indigo IPC) cannot stall reading from the serial port or socket.
+
+    If the queue is full the oldest waiting message is dropped to make room for the newest.
+
+    The basic usage is:
+
+        x = PanelMessageReader(readMethod=someFunction, isReadyMethod=someOtherFunction, logger=loggerObject)
+        x.start()
+        x.getMessage(timeout=5)  # returns a tuple (timeRead, message) or None if no message arrived
+        x.getStatistics()  # returns a dictionary of queue depth, high water mark, dropped, etc.
+        x.stop()
+    """
+
+    def __init__(self, readMethod=None, isReadyMethod=None, logger=None, maxQueueSize=kREADER_QUEUE_SIZE):
+        """
+        **parameters:**
+        readMethod -- a function that returns one message string or an empty string on timeout
+        isReadyMethod -- a function that returns True if the connection is ready to be read
+        logger -- the logger object to use
+        maxQueueSize -- maximum number of messages to hold before dropping messages
+        """
+        if logger is None:
+            raise ValueError("logger parameter not provided or not a logger object.")
+
+        self.logger = logger
+        self.readMethod = readMethod
+        self.isReadyMethod = isReadyMethod
+
+        self.messageQueue = queue.Queue(maxsize=maxQueueSize)
+        self.maxQueueSize = maxQueueSize
+
+        self.__stopEvent = threading.Event()
+        self.__thread = None
+        self.__statsLock = threading.Lock()
+
+        # statistics
+        self.messagesRead = 0
+        self.messagesDropped = 0
+        self.queueHighWater = 0
+        self.maxQueueWait = 0.0
+
+    def start(self):
+        """
+        starts the reader thread if it is not already running
+        """
+        if self.isRunning():
+            return
+
+        self.__stopEvent.clear()
+        self.__thread = threading.Thread(target=self.__readLoop, name='AlarmDecoderReader', daemon=True)
+        self.__thread.start()
+        self.logger.info(u"AlarmDecoder reader thread started")
+
+    def stop(self, timeout=None):
+        """
+        asks the reader thread to stop and waits up to timeout seconds for it to finish
+
+        **parameters:**
+        timeout -- seconds to wait for the thread to finish. None (the default) does not wait.
+        """
+        self.__stopEvent.set()
+
+        if (self.__thread is not None) and (timeout is not None):
+            self.__thread.join(timeout)
+
+        self.logger.info(u"AlarmDecoder reader thread stopped")
+
+    def isRunning(self):
+        """
+        returns True if the reader thread is running; False otherwise
+        """
+        return (self.__thread is not None) and self.__thread.is_alive() and (not self.__stopEvent.is_set())
+
+    def getMessage(self, timeout=None):
+        """
+        returns the next message as a tuple of (timeRead, message) or None if no message
+        arrives within timeout seconds
+
+        **parameters:**
+        timeout -- seconds to wait for a message. None waits forever.
+        """
+        try:
+            timeRead, message = self.messageQueue.get(timeout=timeout)
+
+        except queue.Empty:
+            return None
+
+        # track the longest time a message has waited in the queue
+        queueWait = time.time() - timeRead
+        if queueWait > self.maxQueueWait:
+            self.maxQueueWait = queueWait
+
+        return (timeRead, message)
+
+    def getQueueDepth(self):
+        """
+        returns the number of messages waiting to be processed
+        """
+        return self.messageQueue.qsize()
+
+    def getStatistics(self):
+        """
+        returns a dictionary of the reader statistics
+        """
+        with self.__statsLock:
+            return {'queueDepth': self.messageQueue.qsize(), 'queueSize': self.maxQueueSize,
+                    'queueHighWater': self.queueHighWater, 'messagesRead': self.messagesRead,
+                    'messagesDropped': self.messagesDropped, 'maxQueueWait': round(self.maxQueueWait, 3)}
+
+    def __readLoop(self):
+        self.logger.debug(u"called")
+
+        while not self.__stopEvent.is_set():
+            try:
+                # wait for the connection if it is not available
+                if (self.isReadyMethod is not None) and (not self.isReadyMethod()):
+                    self.__stopEvent.wait(kREADER_IDLE_WAIT)
+                    continue
+
+                message = self.readMethod()
+
+                # empty messages are timeouts - just read again
+                if (message is None) or (len(message) == 0):
+                    continue
+
+                self.__putMessage((time.time(), message))
+
+            except Exception as err:
+                self.logger.error(u"Error in AlarmDecoder reader thread - error:{}".format(str(err)))
+                self.__stopEvent.wait(kREADER_IDLE_WAIT)
+
+        self.logger.debug(u"completed")
+
+    def __putMessage(self, item):
+        with self.__statsLock:
+            self.messagesRead += 1
+
+            try:
+                self.messageQueue.put_nowait(item)
+
+            except queue.Full:
+                # drop the oldest message to make room for the newest one
+                try:
+                    self.messageQueue.get_nowait()
+                except queue.Empty:
+                    pass
+
+                self.messagesDropped += 1
+                if (self.messagesDropped % kREADER_DROP_LOG_INTERVAL) == 1:
+                    self.logger.warning(u"AlarmDecoder message queue is full ({} messages) - {} message(s) dropped so far".format(
+                        self.maxQueueSize, self.messagesDropped))
+
+                self.messageQueue.put_nowait(item)
+
+            depth = self.messageQueue.qsize()
+            if depth > self.queueHighWater:
+                self.queueHighWater = depth
@@ -0,0 +1,196 @@
+import queue
+import threading
+import time
+
+# number of worker threads that execute Indigo triggers
+kTRIGGER_WORKERS = 2
+
+# seconds a worker waits for a trigger before checking if it should stop
+kTRIGGER_IDLE_WAIT = 1.0
+
+
+class TriggerExecutor(object):
+    """
+    This object executes Indigo triggers on background worker threads so the thread reading panel
+    messages never waits for indigo.trigger.execute. Each trigger id is always given to the same
+    worker so a trigger queued twice is executed in the order it was queued.
+
+    The basic usage is:
+
+        x = TriggerExecutor(executeMethod=someFunction, logger=loggerObject)
+        x.start()
+        x.queueTrigger(triggerId, name='Alarm Disarmed')
+        x.waitUntilIdle(timeout=5)  # returns True when every queued trigger has been executed
+        x.getStatistics()  # returns a dictionary of triggers executed, queue latency, execution time, etc.
+        x.stop(timeout=5)
+    """
+
+    def __init__(self, executeMethod=None, logger=None, workers=kTRIGGER_WORKERS):
+        """
+        **parameters:**
+        executeMethod -- a function that executes one trigger given its Indigo trigger id
+        logger -- the logger object to use
+        workers -- number of worker threads
+        """
+        if logger is None:
+            raise ValueError("logger parameter not provided or not a logger object.")
+
+        self.logger = logger
+        self.executeMethod = executeMethod
+
+        # one queue per worker of (triggerId, name, timeQueued)
+        self.__triggerQueues = [queue.Queue() for worker in range(max(workers, 1))]
+        self.__threads = []
+        self.__stopEvent = threading.Event()
+        self.__statsLock = threading.Lock()
+
+        # statistics
+        self.triggersQueued = 0
+        self.triggersExecuted = 0
+        self.executeErrors = 0
+        self.totalQueueLatency = 0.0
+        self.maxQueueLatency = 0.0
+        self.totalExecutionTime = 0.0
+        self.maxExecutionTime = 0.0
+
+    def start(self):
+        """
+        starts the worker threads if they are not already running
+        """
+        if self.isRunning():
+            return
+
+        self.__stopEvent.clear()
+        self.__threads = []
+        for index, triggerQueue in enumerate(self.__triggerQueues):
+            thread = threading.Thread(target=self.__executeLoop, args=(triggerQueue,),
+                                      name='TriggerExecutor{}'.format(index), daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+
+        self.logger.debug(u"trigger executor started with {} worker(s)".format(len(self.__threads)))
+
+    def stop(self, timeout=None):
+        """
+        asks the worker threads to stop once the triggers already queued have been executed and
+        waits up to timeout seconds for them to finish. New triggers are not accepted.
+
+        **parameters:**
+        timeout -- seconds to wait for the threads to finish. None (the default) does not wait.
+        """
+        self.__stopEvent.set()
+
+        if timeout is not None:
+            endTime = time.time() + timeout
+            for thread in self.__threads:
+                thread.join(max(endTime - time.time(), 0))
+
+            notExecuted = self.getQueueDepth()
+            if notExecuted > 0:
+                self.logger.warning(u"Trigger executor stopped - {} queued trigger(s) were not executed".format(notExecuted))
+
+        self.logger.debug(u"trigger executor stopped")
+
+    def isRunning(self):
+        """
+        returns True if the worker threads are running; False otherwise
+        """
+        return (len(self.__threads) > 0) and all(thread.is_alive() for thread in self.__threads) and \
+            (not self.__stopEvent.is_set())
+
+    def queueTrigger(self, triggerId=0, name=''):
+        """
+        queues a trigger to be executed. Returns True if queued; False if the executor is not running.
+
+        **parameters:**
+        triggerId -- the Indigo trigger id
+        name -- the trigger name used in log messages
+        """
+        if not self.isRunning():
+            return False
+
+        with self.__statsLock:
+            self.triggersQueued += 1
+
+        self.__triggerQueues[hash(triggerId) % len(self.__triggerQueues)].put((triggerId, name, time.time()))
+        return True
+
+    def getQueueDepth(self):
+        """
+        returns the number of triggers queued or being executed
+        """
+        return sum(triggerQueue.unfinished_tasks for triggerQueue in self.__triggerQueues)
+
+    def waitUntilIdle(self, timeout=None):
+        """
+        waits until every queued trigger has been executed. Returns True if the queue is empty; False if
+        timeout seconds passed first.
+
+        **parameters:**
+        timeout -- seconds to wait. None waits forever.
+        """
+        endTime = None
+        if timeout is not None:
+            endTime = time.time() + timeout
+
+        while self.getQueueDepth() > 0:
+            if (endTime is not None) and (time.time() >= endTime):
+                return False
+            time.sleep(0.01)
+
+        return True
+
+    def getStatistics(self):
+        """
+        returns a dictionary of the trigger executor statistics - times are in seconds
+        """
+        with self.__statsLock:
+            completed = self.triggersExecuted + self.executeErrors
+            return {'queueDepth': self.getQueueDepth(), 'triggersQueued': self.triggersQueued,
+                    'triggersExecuted': self.triggersExecuted, 'executeErrors': self.executeErrors,
+                    'averageQueueLatency': round(self.totalQueueLatency / max(completed, 1), 3),
+                    'maxQueueLatency': round(self.maxQueueLatency, 3),
+                    'averageExecutionTime': round(self.totalExecutionTime / max(completed, 1), 3),
+                    'maxExecutionTime': round(self.maxExecutionTime, 3)}
+
+    def __executeLoop(self, triggerQueue):
+        self.logger.debug(u"called")
+
+        while True:
+            try:
+                triggerId, name, timeQueued = triggerQueue.get(timeout=kTRIGGER_IDLE_WAIT)
+
+            except queue.Empty:
+                # only stop once every queued trigger has been executed
+                if self.__stopEvent.is_set():
+                    break
+                continue
+
+            startTime = time.time()
+            isExecuted = False
+            try:
+                self.executeMethod(triggerId)
+                isExecuted = True
+
+            except Exception as err:
+                self.logger.error(u"Error executing trigger:{} id:{} - error:{}".format(name, triggerId, str(err)))
+
+            endTime = time.time()
+            with self.__statsLock:
+                if isExecuted:
+                    self.triggersExecuted += 1
+                else:
+                    self.executeErrors += 1
+
+                queueLatency = startTime - timeQueued
+                self.totalQueueLatency += queueLatency
+                self.maxQueueLatency = max(self.maxQueueLatency, queueLatency)
+
+                executionTime = endTime - startTime
+                self.totalExecutionTime += executionTime
+                self.maxExecutionTime = max(self.maxExecutionTime, executionTime)
+
+            # marked done after the statistics so waitUntilIdle sees them
+            triggerQueue.task_done()
+
+        self.logger.debug(u"completed")
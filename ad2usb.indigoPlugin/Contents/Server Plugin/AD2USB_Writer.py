@@ -0,0 +1,467 @@
+import collections
+import heapq
+import threading
+import time
+import AlarmDecoder
+
+# seconds the writer thread waits for a command before checking if it should stop
+kWRITER_IDLE_WAIT = 1.0
+
+# acknowledgement types - what the AlarmDecoder sends back after a command is accepted
+kACK_KEYPAD = 'KEYPAD'  # a !KPE echo, a !> prompt or a change in the keypad message to the command's keypad
+kACK_VER = 'VER'  # a !VER message
+kACK_CONFIG = 'CONFIG'  # a !CONFIG message
+
+# seconds to wait for an acknowledgement before retrying or reporting an error
+kACK_TIMEOUT = 5.0
+
+# number of times a command is re-sent if it is not acknowledged
+# keypad commands are never re-sent since a repeated arm or disarm code could change the panel state
+kACK_RETRIES = {kACK_KEYPAD: 0, kACK_VER: 1, kACK_CONFIG: 1}
+
+# number of round trip times kept to calculate percentiles
+kACK_SAMPLE_SIZE = 500
+
+
+class PanelCommandWriter(object):
+    """
+    This object runs a single background thread that writes all commands to the AlarmDecoder.
+    Commands are queued with a priority (lower numbers are written first) and written one at a
+    time with a pause (pacing) between commands so bytes from different commands never interleave.
+
+    Commands queued with a coalesce key replace any command with the same key that is still waiting
+    to be written. For example repeated '*' presses become one press and several virtual zone
+    updates to the same zone become a single update with the latest state.
+
+    The basic usage is:
+
+        x = PanelCommandWriter(writeMethod=someFunction, logger=loggerObject, pacing=0.1)
+        x.start()
+        x.queueCommand('12341', priority=0)
+        x.queueCommand('L051\\r', priority=2, coalesceKey='L05')
+        x.getStatistics()  # returns a dictionary of commands written, coalesced, queue latency, etc.
+        x.stop()
+    """
+
+    def __init__(self, writeMethod=None, logger=None, pacing=0.0, ackTracker=None):
+        """
+        **parameters:**
+        writeMethod -- a function that writes one command string and returns True or False
+        logger -- the logger object to use
+        pacing -- seconds to wait after each command is written
+        ackTracker -- optional CommandAckTracker told about each command written
+        """
+        if logger is None:
+            raise ValueError("logger parameter not provided or not a logger object.")
+
+        self.logger = logger
+        self.writeMethod = writeMethod
+        self.pacing = pacing
+        self.ackTracker = ackTracker
+
+        # heap of [priority, sequence, command, coalesceKey, timeQueued, attempt]
+        self.__commandHeap = []
+        self.__pendingByKey = {}
+        self.__sequence = 0
+        self.__condition = threading.Condition()
+        self.__isStopping = False
+        self.__thread = None
+
+        # statistics
+        self.commandsQueued = 0
+        self.commandsWritten = 0
+        self.commandsCoalesced = 0
+        self.writeErrors = 0
+        self.maxQueueLatencyByPriority = {}
+
+    def start(self):
+        """
+        starts the writer thread if it is not already running
+        """
+        if self.isRunning():
+            return
+
+        with self.__condition:
+            self.__isStopping = False
+
+        self.__thread = threading.Thread(target=self.__writeLoop, name='AlarmDecoderWriter', daemon=True)
+        self.__thread.start()
+        self.logger.debug(u"AlarmDecoder writer thread started")
+
+    def stop(self, timeout=None):
+        """
+        asks the writer thread to stop and waits up to timeout seconds for it to finish.
+        Commands still waiting to be written are discarded.
+
+        **parameters:**
+        timeout -- seconds to wait for the thread to finish. None (the default) does not wait.
+        """
+        with self.__condition:
+            self.__isStopping = True
+            discarded = len(self.__commandHeap)
+            self.__commandHeap = []
+            self.__pendingByKey = {}
+            self.__condition.notify_all()
+
+        if (self.__thread is not None) and (timeout is not None):
+            self.__thread.join(timeout)
+
+        if discarded > 0:
+            self.logger.warning(u"AlarmDecoder writer stopped - {} queued command(s) were not sent".format(discarded))
+
+        self.logger.debug(u"AlarmDecoder writer thread stopped")
+
+    def isRunning(self):
+        """
+        returns True if the writer thread is running; False otherwise
+        """
+        return (self.__thread is not None) and self.__thread.is_alive() and (not self.__isStopping)
+
+    def queueCommand(self, command='', priority=0, coalesceKey=None, attempt=1):
+        """
+        queues a command to be written. Returns True if queued or coalesced; False otherwise.
+
+        **parameters:**
+        command -- the string to write to the AlarmDecoder
+        priority -- integer priority - lower numbers are written first
+        coalesceKey -- optional key - a waiting command with the same key is replaced by this command
+        attempt -- 1 for a new command; higher for a command re-sent by the ack tracker
+        """
+        with self.__condition:
+            if self.__isStopping:
+                return False
+
+            self.commandsQueued += 1
+
+            # replace a waiting command with the same key - it keeps its place in the queue
+            if (coalesceKey is not None) and (coalesceKey in self.__pendingByKey):
+                self.__pendingByKey[coalesceKey][2] = command
+                self.commandsCoalesced += 1
+                return True
+
+            self.__sequence += 1
+            entry = [priority, self.__sequence, command, coalesceKey, time.time(), attempt]
+            heapq.heappush(self.__commandHeap, entry)
+
+            if coalesceKey is not None:
+                self.__pendingByKey[coalesceKey] = entry
+
+            self.__condition.notify()
+            return True
+
+    def getQueueDepth(self):
+        """
+        returns the number of commands waiting to be written
+        """
+        with self.__condition:
+            return len(self.__commandHeap)
+
+    def getStatistics(self):
+        """
+        returns a dictionary of the writer statistics
+        """
+        with self.__condition:
+            return {'queueDepth': len(self.__commandHeap), 'commandsQueued': self.commandsQueued,
+                    'commandsWritten': self.commandsWritten, 'commandsCoalesced': self.commandsCoalesced,
+                    'writeErrors': self.writeErrors,
+                    'maxQueueLatencyByPriority': dict(self.maxQueueLatencyByPriority)}
+
+    def __writeLoop(self):
+        self.logger.debug(u"called")
+
+        while True:
+            # re-send or report commands that were never acknowledged
+            if self.ackTracker is not None:
+                for retry in self.ackTracker.checkTimeouts():
+                    self.queueCommand(**retry)
+
+            with self.__condition:
+                if (len(self.__commandHeap) == 0) and (not self.__isStopping):
+                    self.__condition.wait(kWRITER_IDLE_WAIT)
+
+                if self.__isStopping:
+                    break
+
+                if len(self.__commandHeap) == 0:
+                    continue
+
+                priority, sequence, command, coalesceKey, timeQueued, attempt = heapq.heappop(self.__commandHeap)
+                if coalesceKey is not None:
+                    del self.__pendingByKey[coalesceKey]
+
+            queueLatency = round(time.time() - timeQueued, 3)
+            if queueLatency > self.maxQueueLatencyByPriority.get(priority, 0.0):
+                self.maxQueueLatencyByPriority[priority] = queueLatency
+
+            try:
+                if self.writeMethod(command):
+                    self.commandsWritten += 1
+
+                    if self.ackTracker is not None:
+                        self.ackTracker.commandSent(command, priority, coalesceKey, attempt)
+                else:
+                    self.writeErrors += 1
+
+            except Exception as err:
+                self.writeErrors += 1
+                self.logger.error(u"Error in AlarmDecoder writer thread - error:{}".format(str(err)))
+
+            # pace the commands so the AlarmDecoder and panel can keep up
+            if self.pacing > 0:
+                time.sleep(self.pacing)
+
+        self.logger.debug(u"completed")
+
+
+class CommandAckTracker(object):
+    """
+    This object matches commands written to the AlarmDecoder with the message that shows the
+    command was accepted and records the round trip time. Keypad commands are acknowledged by a
+    !KPE echo, a !> prompt, or a change in the keypad message sent to the keypad address the
+    command was sent from (the K## prefix or the AlarmDecoder's keypad address). VER and CONFIG
+    commands are acknowledged by the !VER and !CONFIG messages. Virtual zone (L) commands are not
+    tracked.
+
+    Commands not acknowledged within the timeout are either returned by checkTimeouts to be
+    re-sent or reported as an error.
+
+    The basic usage is:
+
+        x = CommandAckTracker(logger=loggerObject, keypadAddressMethod=someFunction)
+        x.commandSent('V\\r', priority, coalesceKey, attempt)  # called by the writer after each write
+        x.messageReceived('VER', rawMessage)  # called for every message read
+        x.messageReceived('KPM', rawMessage, keypadMask)  # keypad messages include the keypad mask (int)
+        x.checkTimeouts()  # returns a list of commands to re-send
+        x.getStatistics()  # returns a dictionary of round trip percentiles by ack type
+    """
+
+    def __init__(self, logger=None, ackTimeout=kACK_TIMEOUT, keypadAddressMethod=None):
+        """
+        **parameters:**
+        logger -- the logger object to use
+        ackTimeout -- seconds to wait for an acknowledgement
+        keypadAddressMethod -- a function that returns the AlarmDecoder's keypad address - the address
+                of keypad commands without a K## prefix
+        """
+        if logger is None:
+            raise ValueError("logger parameter not provided or not a logger object.")
+
+        self.logger = logger
+        self.ackTimeout = ackTimeout
+        self.keypadAddressMethod = keypadAddressMethod
+
+        self.__lock = threading.Lock()
+        self.__pending = []  # list of dict in the order commands were sent
+
+        # the last keypad message sent to each keypad address commands have been sent from
+        # by keypad address bit - see AlarmDecoder.KPMRecord.getKeypadAddressBit
+        self.__lastKeypadMessages = {}
+
+        # statistics
+        self.roundTripTimes = {kACK_KEYPAD: collections.deque(maxlen=kACK_SAMPLE_SIZE),
+                               kACK_VER: collections.deque(maxlen=kACK_SAMPLE_SIZE),
+                               kACK_CONFIG: collections.deque(maxlen=kACK_SAMPLE_SIZE)}
+        self.acknowledged = 0
+        self.retries = 0
+        self.timeouts = 0
+
+    def getAckType(self, command=''):
+        """
+        returns the acknowledgement type for a command or None if the command is not tracked
+
+        **parameters:**
+        command -- the string written to the AlarmDecoder
+        """
+        if len(command) == 0:
+            return None
+
+        if command[0] == 'V':
+            return kACK_VER
+
+        if command[0] == 'C':
+            return kACK_CONFIG
+
+        # virtual zone commands do not change what the keypad shows
+        if command[0] == 'L':
+            return None
+
+        return kACK_KEYPAD
+
+    def getKeypadAddressBit(self, command=''):
+        """
+        returns the keypad mask bit (int) of the keypad address a keypad command is sent from or 0 if
+        the address is not known
+
+        **parameters:**
+        command -- the string written to the AlarmDecoder
+        """
+        # K## sends the keys from keypad address ##
+        if (command[:1] == 'K') and command[1:3].isdigit():
+            address = command[1:3]
+        elif self.keypadAddressMethod is not None:
+            address = str(self.keypadAddressMethod())
+        else:
+            return 0
+
+        try:
+            return AlarmDecoder.KPMRecord.getKeypadAddressBit(int(address))
+        except ValueError:
+            return 0
+
+    def commandSent(self, command='', priority=0, coalesceKey=None, attempt=1):
+        """
+        records that a command was written and is waiting for an acknowledgement
+
+        **parameters:**
+        command -- the string written to the AlarmDecoder
+        priority -- the write priority (used if the command is re-sent)
+        coalesceKey -- the coalesce key (used if the command is re-sent)
+        attempt -- 1 for the first write; higher for a re-sent command
+        """
+        ackType = self.getAckType(command)
+        if ackType is None:
+            return
+
+        keypadBit = 0
+        if ackType == kACK_KEYPAD:
+            keypadBit = self.getKeypadAddressBit(command)
+
+        with self.__lock:
+            # a keypad message is only an acknowledgement if it is not the message the keypad already showed
+            if (keypadBit != 0) and (keypadBit not in self.__lastKeypadMessages):
+                self.__lastKeypadMessages[keypadBit] = None
+
+            self.__pending.append({'ackType': ackType, 'timeSent': time.time(), 'command': command,
+                                   'priority': priority, 'coalesceKey': coalesceKey, 'attempt': attempt,
+                                   'keypadBit': keypadBit, 'keypadMessage': self.__lastKeypadMessages.get(keypadBit)})
+
+    def messageReceived(self, messageType='', messageString='', keypadMask=0):
+        """
+        checks if a message read from the AlarmDecoder acknowledges the oldest command waiting for it
+
+        **parameters:**
+        messageType -- the AlarmDecoder.Message messageType (KPM, KPE, PROMPT, VER, CONFIG, etc.)
+        messageString -- the message as read
+        keypadMask -- for KPM messages the keypad mask as an integer - see AlarmDecoder.KPMRecord
+        """
+        if messageType == 'KPM':
+            self.__keypadMessageReceived(messageString, keypadMask or 0)
+            return
+
+        ackType = None
+        if (messageType == 'KPE') or messageString.startswith('!>'):
+            ackType = kACK_KEYPAD
+
+        elif messageType == 'VER':
+            ackType = kACK_VER
+
+        elif messageType == 'CONFIG':
+            ackType = kACK_CONFIG
+
+        if (ackType is None) or (len(self.__pending) == 0):
+            return
+
+        with self.__lock:
+            for index, pendingCommand in enumerate(self.__pending):
+                if pendingCommand['ackType'] == ackType:
+                    self.__acknowledge(index, pendingCommand)
+                    break
+
+    def checkTimeouts(self):
+        """
+        removes commands that have waited longer than the timeout. Returns a list of dictionaries
+        (command, priority, coalesceKey, attempt) for commands that should be re-sent. Commands
+        that have no retries left are reported as an error.
+        """
+        retryList = []
+        now = time.time()
+
+        with self.__lock:
+            stillPending = []
+            for pendingCommand in self.__pending:
+                if (now - pendingCommand['timeSent']) < self.ackTimeout:
+                    stillPending.append(pendingCommand)
+                    continue
+
+                ackType = pendingCommand['ackType']
+                if pendingCommand['attempt'] <= kACK_RETRIES[ackType]:
+                    self.retries += 1
+                    retryList.append({'command': pendingCommand['command'], 'priority': pendingCommand['priority'],
+                                      'coalesceKey': pendingCommand['coalesceKey'], 'attempt': pendingCommand['attempt'] + 1})
+                else:
+                    self.timeouts += 1
+
+                    # keypad commands may contain an alarm code so they are never logged
+                    if ackType == kACK_KEYPAD:
+                        commandToLog = 'keypad'
+                    else:
+                        commandToLog = ackType
+
+                    self.logger.error(u"AlarmDecoder did not acknowledge {} command within {} seconds (attempt {}). Check the AlarmDecoder connection.".format(
+                        commandToLog, self.ackTimeout, pendingCommand['attempt']))
+
+            self.__pending = stillPending
+
+        for retry in retryList:
+            self.logger.warning(u"AlarmDecoder did not acknowledge {} command - sending it again".format(
+                self.getAckType(retry['command'])))
+
+        return retryList
+
+    def getStatistics(self):
+        """
+        returns a dictionary with the number acknowledged, retried, timed out and waiting and the
+        50th, 90th and 99th percentile and maximum round trip times in seconds for each ack type
+        """
+        with self.__lock:
+            statistics = {'acknowledged': self.acknowledged, 'retries': self.retries,
+                          'timeouts': self.timeouts, 'pending': len(self.__pending)}
+
+            for ackType in self.roundTripTimes:
+                samples = sorted(self.roundTripTimes[ackType])
+                if len(samples) == 0:
+                    continue
+
+                statistics[ackType] = {'count': len(samples),
+                                       'p50': round(self.__percentile(samples, 50), 3),
+                                       'p90': round(self.__percentile(samples, 90), 3),
+                                       'p99': round(self.__percentile(samples, 99), 3),
+                                       'max': round(samples[-1], 3)}
+
+        return statistics
+
+    def __keypadMessageReceived(self, messageString, keypadMask):
+        # only a change in the message to the keypad address a command was sent from counts
+        if len(self.__lastKeypadMessages) == 0:
+            return
+
+        with self.__lock:
+            for keypadBit in self.__lastKeypadMessages:
+                if not (keypadMask & keypadBit):
+                    continue
+
+                for index, pendingCommand in enumerate(self.__pending):
+                    if (pendingCommand['keypadBit'] != keypadBit) or (pendingCommand['ackType'] != kACK_KEYPAD):
+                        continue
+
+                    # the first message after the command tells us what the keypad showed if we did not know
+                    if pendingCommand['keypadMessage'] is None:
+                        pendingCommand['keypadMessage'] = messageString
+
+                    elif messageString != pendingCommand['keypadMessage']:
+                        self.__acknowledge(index, pendingCommand)
+
+                    break
+
+                self.__lastKeypadMessages[keypadBit] = messageString
+
+    def __acknowledge(self, index, pendingCommand):
+        # called with the lock held
+        del self.__pending[index]
+        self.roundTripTimes[pendingCommand['ackType']].append(time.time() - pendingCommand['timeSent'])
+        self.acknowledged += 1
+
+    def __percentile(self, sortedSamples, percent):
+        # nearest rank percentile
+        rank = int(round(percent / 100.0 * len(sortedSamples) + 0.5)) - 1
+        return sortedSamples[min(max(rank, 0), len(sortedSamples) - 1)]
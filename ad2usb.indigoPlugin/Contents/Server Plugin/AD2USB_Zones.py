@@ -0,0 +1,97 @@
+class ZoneFaultList(object):
+    """
+    This object holds the faulted zone numbers for one keypad as an integer bitset - bit N is set
+    when zone N is faulted - so adding or removing a zone does not search, de-duplicate or sort a list.
+
+    str() of the object is the same as str() of the sorted list of zones (for example '[3, 5]') and
+    is kept until a zone is added or removed since it is written to the keypad zoneFaultList state
+    after every zone change.
+
+    The basic usage is:
+
+        x = ZoneFaultList()
+        x.add(5)  # returns True if the zone was not already faulted
+        x.remove(5)  # returns True if the zone was faulted
+        5 in x
+        str(x)  # '[5]'
+        x.toList()  # [5]
+    """
+
+    def __init__(self, zones=None):
+        """
+        **parameters:**
+        zones -- optional list of zone numbers (int) to start with
+        """
+        self.__bits = 0
+        self.__string = None
+
+        for zone in zones or []:
+            self.add(zone)
+
+    def add(self, zone=0):
+        """
+        adds a zone to the fault list. Returns True if the list changed; False otherwise.
+
+        **parameters:**
+        zone -- the zone number (int) - must be greater than zero
+        """
+        if zone <= 0:
+            return False
+
+        zoneBit = 1 << zone
+        if self.__bits & zoneBit:
+            return False
+
+        self.__bits |= zoneBit
+        self.__string = None
+        return True
+
+    def remove(self, zone=0):
+        """
+        removes a zone from the fault list. Returns True if the list changed; False otherwise.
+
+        **parameters:**
+        zone -- the zone number (int)
+        """
+        if (zone <= 0) or not (self.__bits & (1 << zone)):
+            return False
+
+        self.__bits &= ~(1 << zone)
+        self.__string = None
+        return True
+
+    def clear(self):
+        """
+        removes every zone from the fault list
+        """
+        self.__bits = 0
+        self.__string = None
+
+    def toList(self):
+        """
+        returns the faulted zone numbers as a sorted list of int
+        """
+        zones = []
+        bits = self.__bits
+        while bits:
+            lowestBit = bits & -bits
+            zones.append(lowestBit.bit_length() - 1)
+            bits ^= lowestBit
+
+        return zones
+
+    def __contains__(self, zone):
+        return (zone > 0) and bool(self.__bits & (1 << zone))
+
+    def __len__(self):
+        return bin(self.__bits).count('1')
+
+    def __iter__(self):
+        return iter(self.toList())
+
+    def __str__(self):
+        if self.__string is None:
+            self.__string = str(self.toList())
+        return self.__string
+
+    __repr__ = __str__
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 import re
 import SAIC_EventCodes
 import AD2USB_Constants
@@ -18,6 +19,400 @@ kCAPABILITIES = ['TX', 'RX', 'SM', 'VZ', 'RF', 'ZX', 'RE', 'AU', '3X', 'CG', 'DD
 kVALID_CONFIG_ITEMS = ['ADDRESS', 'EXP', 'REL', 'LRR', 'DEDUPLICATE']
 
 
+class MessageRecord(object):
+    """
+    Base class for the parsed properties of one message type. Each message type has a subclass that lists
+    its fields in __slots__ so parsing a message creates one small object instead of a dictionary.
+    Fields that were not set by the parser are returned as None by get().
+
+    A frozen record (see freeze) can no longer be changed so it can be shared by more than one message.
+    Only the fields in kLAZY_FIELDS can still be set - once - when they are first decoded.
+
+    The basic usage is:
+
+        x = KPMRecord()
+        x.panelState = 'ready'
+        x.get('panelState')  # returns 'ready'
+        x.toDict()  # returns a dictionary of the fields that are set
+        x.freeze()  # x.panelState = 'fault' now raises AttributeError
+    """
+    __slots__ = ()
+
+    # the field names in __slots__ order and as a set for get() - set for each subclass by __init_subclass__
+    kFIELDS = ()
+    kFIELD_NAMES = frozenset()
+
+    # field name to the method that decodes it the first time it is read - see KPMRecord
+    kLAZY_FIELDS = {}
+
+    isFrozen = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__dict__.get('__slots__'):
+            cls.kFIELDS = tuple(cls.__slots__)
+            cls.kFIELD_NAMES = frozenset(cls.__slots__)
+
+            # the same record with read only fields - freeze() changes the class of the record to this
+            # so records that are never frozen do not pay for checking each field that is set
+            cls.kFROZEN_CLASS = type('Frozen' + cls.__name__, (FrozenRecord, cls), {'__slots__': ()})
+
+    def freeze(self):
+        """
+        prevents any further changes to the fields (and to any records in the fields) so the record can be shared
+        """
+        for name in self.kFIELDS:
+            # object.__getattribute__ does not decode a lazy field that has not been read yet
+            try:
+                value = object.__getattribute__(self, name)
+            except AttributeError:
+                continue
+
+            if isinstance(value, MessageRecord):
+                value.freeze()
+
+        if not self.isFrozen:
+            self.__class__ = self.kFROZEN_CLASS
+
+    def get(self, name='', default=None):
+        """
+        returns the value of a field or default if the field does not exist or is not set
+
+        **parameters:**
+        name -- the field name
+        default -- the value to return if the field is not set
+        """
+        if name in self.kFIELD_NAMES:
+            return getattr(self, name, default)
+        else:
+            return default
+
+    def toDict(self):
+        """
+        returns a dictionary of the fields that are set
+        """
+        return {name: getattr(self, name) for name in self.kFIELDS if hasattr(self, name)}
+
+    def __repr__(self):
+        return repr(self.toDict())
+
+
+class FrozenRecord(object):
+    """
+    Mixed into a MessageRecord class by MessageRecord.freeze() to make the fields read only. A field in
+    kLAZY_FIELDS can be set once - when it is decoded.
+    """
+    __slots__ = ()
+
+    isFrozen = True
+
+    def __setattr__(self, name, value):
+        if name in self.kLAZY_FIELDS:
+            try:
+                object.__getattribute__(self, name)
+            except AttributeError:
+                # not decoded yet
+                object.__setattr__(self, name, value)
+                return
+
+        raise AttributeError('cannot change {} - record is frozen'.format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError('cannot delete {} - record is frozen'.format(name))
+
+
+class KeypadFlags(MessageRecord):
+    # the order matches the 20 character bit field of the KPM message - see Message.getKPMKeypadData
+    __slots__ = ('READY', 'ARMED_AWAY', 'ARMED_HOME', 'BACKLIGHT', 'PGM_MODE',
+                 'BEEPS', 'ZONES_BYPASSED', 'AC_ON', 'CHIME_MODE', 'ALARM_OCCURRED',
+                 'ALARM_BELL_ON', 'BATTERY_LOW', 'ARMED_INSTANT', 'FIRE', 'CHECK_ZONE',
+                 'ARMED_STAY_NIGHT', 'ERROR_REPORT', 'ADEMCO_OR_DSC')
+
+    def __init__(self, bitString=''):
+        """
+        **parameters:**
+        bitString -- the 20 chars of the KPM bit field - mostly 0 and 1 but some are characters
+        """
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+        # the bitString is read left to right - one char per field - the extra chars are unused
+        for name, bit in zip(self.__slots__, bitString):
+            # value may be an int or char
+            if bit in '0123456789':
+                # make it an int - usually 0 or 1
+                setattr(self, name, int(bit))
+            else:
+                # keep it a string
+                setattr(self, name, bit)
+
+
+class KPMRecord(MessageRecord):
+    """
+    The parsed properties of a KPM message. Only the 4 parts of the message and the zone number are set
+    when the message is parsed. The fields that take more work (keypadFlags, keypadDestinations, panelState,
+    homeKitState and the fields from the message text) are decoded the first time one of them is read and
+    then kept in the record, so a message that is never looked at does not pay for them.
+    """
+    __slots__ = ('isValidNumericCode', 'panelState', 'homeKitState', 'isBypassZone', 'isPressForFaultMessage',
+                 'isAlarmTripped', 'isCountdown', 'isFault', 'isCheck', 'doesMessageContainZoneNumber',
+                 'doesMessageZoneMatchNumericCode', 'bitField', 'numericCode', 'rawData', 'alphanumericKeypadMessage',
+                 'keypadFlags', 'zoneNumberAsInt', 'isSystemMessage', 'keypadDestinations', 'zoneFromMessage',
+                 'countdownTimeRemaining', 'keypadMask', 'keypadMaskAsInt')
+
+    # field name to the method that decodes it - see __getattr__
+    kLAZY_FIELDS = {
+        'keypadFlags': 'decodeKeypadFlags',
+        'keypadDestinations': 'decodeKeypadDestinations',
+        'keypadMaskAsInt': 'decodeKeypadDestinations',
+        'panelState': 'decodePanelState',
+        'homeKitState': 'decodePanelState',
+        'isBypassZone': 'decodeMessageText',
+        'isPressForFaultMessage': 'decodeMessageText',
+        'isAlarmTripped': 'decodeMessageText',
+        'isCountdown': 'decodeMessageText',
+        'isFault': 'decodeMessageText',
+        'isCheck': 'decodeMessageText',
+        'doesMessageContainZoneNumber': 'decodeMessageText',
+        'doesMessageZoneMatchNumericCode': 'decodeMessageText',
+        'zoneFromMessage': 'decodeMessageText',
+        'countdownTimeRemaining': 'decodeMessageText',
+    }
+
+    def __getattr__(self, name):
+        # only called when a field has not been set - decode it if its one of the lazy fields
+        decodeMethod = self.kLAZY_FIELDS.get(name)
+        if decodeMethod is None:
+            raise AttributeError(name)
+
+        getattr(self, decodeMethod)()
+        return object.__getattribute__(self, name)
+
+    def decodeKeypadFlags(self):
+        """
+        sets keypadFlags from the bitField - skipping the first char '['
+        """
+        # char 0 = '[', char 1-20 = data, char 21 = ']'
+        keypadFlags = KeypadFlags(self.bitField[1:21])
+
+        # the flags are shared along with a frozen record - see MessageCache
+        if self.isFrozen:
+            keypadFlags.freeze()
+
+        self.keypadFlags = keypadFlags
+
+    @staticmethod
+    def getKeypadAddressBit(address=0):
+        """
+        returns the bit (int) for a keypad address in keypadMaskAsInt or 0 if the address is not 0-31
+
+        **parameters:**
+        address -- the keypad address (int)
+        """
+        if not 0 <= address <= 31:
+            return 0
+
+        # the first hex pair is keypads 0-7 so it is the most significant byte
+        return 1 << ((3 - address // 8) * 8 + address % 8)
+
+    def decodeKeypadDestinations(self):
+        """
+        sets keypadMaskAsInt (int) - the keypad mask as an integer - see getKeypadAddressBit
+        sets keypadDestinations (tuple of int) - the keypads 0-31 this message is intended for
+        """
+        # we do this in pairs given how the data is structured per NuTech docs
+        # byte 1:0-7, 2:8-15, 3:16-23, 4:24-31
+        keypadMaskAsInt = 0
+
+        # we can loop thru the 4 pairs of 2 x hex digits
+        for hexPair in range(0, 4):
+            # string is start of h*2, end h*2 + 2 = 0:2, 2:4, 4:6, 6:8
+            keyPadHexPairAsString = self.keypadMask[hexPair*2:hexPair*2+2]
+            try:
+                pairValue = int(keyPadHexPairAsString, 16)
+            except ValueError:
+                # an invalid hex pair has no keypads
+                continue
+
+            keypadMaskAsInt |= (pairValue & 0xff) << ((3 - hexPair) * 8)
+
+        self.keypadMaskAsInt = keypadMaskAsInt
+        self.keypadDestinations = tuple(address for address in range(0, 32)
+                                        if keypadMaskAsInt & self.getKeypadAddressBit(address))
+
+    def decodeMessageText(self):
+        """
+        sets the fields that come from the alphanumeric message text for certain cases
+        """
+        # the fields are worked out first and each is set once - a frozen record only allows that
+        isBypassZone = False
+        isPressForFaultMessage = False
+        isAlarmTripped = False
+        isCountdown = False
+        isFault = False
+        isCheck = False
+        zoneFromMessage = None
+        countdownTimeRemaining = None
+        hasZone = False
+
+        # akm = alphanumericKeypadMessage
+        akm = self.alphanumericKeypadMessage
+
+        # Hit * for faults
+        if " * " in akm:
+            isPressForFaultMessage = True
+
+        # DISARM - Alarm Tripped
+        elif akm[1:14] == "DISARM SYSTEM":
+            isAlarmTripped = True
+
+        # BYPAS
+        elif akm[1:6] == "BYPAS":
+            # zoneNumberAsInt has bypassed zone details
+            isBypassZone = True
+            hasZone = True
+
+        # ARMED .. May Exit Countdown
+        elif ("ARMED" in akm) and ("Exit Now" in akm):
+            isCountdown = True
+            countdownTimeRemaining = self.zoneNumberAsInt
+
+        # FAULT
+        elif akm[1:6] == "FAULT":
+            # zoneNumberAsInt has bypassed zone details
+            isFault = True
+            hasZone = True
+
+        # CHECK
+        elif akm[1:6] == "CHECK":
+            # mark the message as a CHECK message - corresponds to TROUBLE LRR message
+            isCheck = True
+            hasZone = True
+
+        if hasZone:
+            zoneFromMessage = self.__decodeZoneFromMessage(akm)
+
+        self.isBypassZone = isBypassZone
+        self.isPressForFaultMessage = isPressForFaultMessage
+        self.isAlarmTripped = isAlarmTripped
+        self.isCountdown = isCountdown
+        self.isFault = isFault
+        self.isCheck = isCheck
+        self.doesMessageContainZoneNumber = False
+        self.zoneFromMessage = zoneFromMessage
+        self.countdownTimeRemaining = countdownTimeRemaining
+
+        # check if zone number in message text = numericCode field
+        self.doesMessageZoneMatchNumericCode = hasZone and (zoneFromMessage == self.zoneNumberAsInt)
+
+    def decodePanelState(self):
+        """
+        sets panelState and homeKitState from the keypad flags
+        """
+        flags = self.keypadFlags
+
+        # check for Alarm On (bit 11) first since this can happen in AWAY, STAY, etc.
+        if flags.ALARM_BELL_ON == 1:
+            panelState = AD2USB_Constants.k_PANEL_ALARM_ON
+
+        # check for Alarm Occurred (bit 10) second
+        elif flags.ALARM_OCCURRED == 1:
+            panelState = AD2USB_Constants.k_PANEL_ALARM_OCCURRED
+
+        # now check for READY
+        elif (flags.READY == 1) and (flags.ARMED_AWAY == 0) and (flags.ARMED_HOME == 0):
+            panelState = AD2USB_Constants.k_PANEL_READY
+
+        elif (flags.ARMED_AWAY == 1) and (flags.READY == 0):
+
+            # MAX
+            if flags.ARMED_INSTANT == 1:
+                panelState = AD2USB_Constants.k_PANEL_ARMED_MAX
+
+            # AWAY
+            else:
+                panelState = AD2USB_Constants.k_PANEL_ARMED_AWAY
+
+        elif (flags.ARMED_HOME == 1) and (flags.READY == 0):
+
+            # INSTANT
+            if (flags.ARMED_INSTANT == 1) and (flags.ARMED_STAY_NIGHT == 0):
+                panelState = AD2USB_Constants.k_PANEL_ARMED_INSTANT
+
+            # NIGHT STAY
+            elif (flags.ARMED_INSTANT == 0) and (flags.ARMED_STAY_NIGHT == 1):
+                panelState = AD2USB_Constants.k_PANEL_ARMED_NIGHT_STAY
+
+            # STAY
+            else:
+                panelState = AD2USB_Constants.k_PANEL_ARMED_STAY
+
+        elif (flags.READY == 0) and (flags.ARMED_AWAY == 0) and (flags.ARMED_HOME == 0):
+            # this is a fault
+            # first 3 bits are zero: READY = 0, AWAY = 0, HOME (STAY) = 0
+            # unless not a numeric in which case it is an error
+            if self.isValidNumericCode:
+                panelState = AD2USB_Constants.k_PANEL_FAULT
+            else:
+                panelState = AD2USB_Constants.k_PANEL_ERROR
+
+        else:
+            # we have an error or unknown
+            panelState = AD2USB_Constants.k_PANEL_UNK
+
+        self.panelState = panelState
+
+        # set the HomeKit state based on the panel state - - converted to string - default to DISARMED
+        self.homeKitState = AD2USB_Constants.k_HOMEKIT_STATES.get(panelState, AD2USB_Constants.k_HK_ALARM_DISARMED)
+
+    def __decodeZoneFromMessage(self, akm):
+        # returns the zone number as integer from the message text or None
+        zoneAsString = akm[7:9]
+        if (len(zoneAsString) > 0) and all(c in '0123456789' for c in zoneAsString):
+            return int(zoneAsString)
+        else:
+            return None
+
+
+class VERRecord(MessageRecord):
+    __slots__ = ('serialNumber', 'firmwareVersion', 'capabilties')
+
+
+class CONFIGRecord(MessageRecord):
+    __slots__ = ('flags', 'keypadAddress', 'configMessageString')
+
+
+class RFXRecord(MessageRecord):
+    __slots__ = ('serialNumber', 'data', 'bits')
+
+
+class LRRRecord(MessageRecord):
+    __slots__ = ('eventData', 'partition', 'user', 'eventType', 'isUserEvent', 'isZoneEvent', 'isAllPartitions',
+                 'zoneNumber', 'eventDataAsInt', 'isKnownLRR')
+
+
+class LR2Record(MessageRecord):
+    __slots__ = ('cid_event_code', 'cid_event_string', 'cid_event_qualifier', 'cid_message', 'eventData',
+                 'eventType', 'isAllPartitions', 'isKnownCode', 'isMappedToEvent', 'isUserEvent', 'isZoneEvent',
+                 'partition', 'report_code', 'user', 'userCode', 'zoneNumber')
+
+
+class AUIRecord(MessageRecord):
+    __slots__ = ('data',)
+
+
+class EXPRecord(MessageRecord):
+    __slots__ = ('zoneExpanderAddress', 'expanderChannel', 'data', 'isFaulted')
+
+
+class RELRecord(MessageRecord):
+    __slots__ = ('relayExpanderAddress', 'expanderChannel', 'data', 'isOpen')
+
+
+class ERRRecord(MessageRecord):
+    __slots__ = ('errorsDetails', 'errorCount', 'hasError')
+
+
 class Message(object):
     """
     This object is initialized with a string from the AlarmDecoder and an optional but recommended firmware version.
@@ -27,7 +422,14 @@ class Message(object):
     isValidMessage (boolean) - is this a valid AlarmDecoder message
     needsProcessing (boolean) - is this a message that needs to be processed
     messageType (char) - a 3 letter char that matches the AlarmDecoder protocol for message types
+    details (MessageRecord) - the parsed properties for the message type - see attr()
+    isFrozen (boolean) - True if the message is shared by MessageCache and can no longer be changed
     """
+    __slots__ = ('isValidMessage', 'invalidReason', 'needsProcessing', 'messageType', 'messageString',
+                 'firmwareVersion', 'serialNumber', 'logger', 'details')
+
+    # freeze() changes the class of the message to FrozenMessage
+    isFrozen = False
 
     def __init__(self, messageString='', firmwareVersion='', logger=None):
         # init some internal properties first
@@ -68,7 +470,7 @@ class Message(object):
         # All others are Keypad = but keypad starts with [ or !KPM
         try:
             self.messageString = messageString.rstrip()
-            self.messageDetails = {}
+            self.details = None  # a MessageRecord for the message type - see getMessageProperties
 
             self.logger.debug('received message:{}'.format(self.messageString))
 
@@ -83,108 +485,54 @@ class Message(object):
             self.messageType = 'UNK'
 
     def __processMessage(self):
+        # find the message header and look up its type and parser - see kMESSAGE_DISPATCH
+        if self.messageString[0] == '[':
+            header = '['
+        else:
+            headerMatch = kMESSAGE_HEADER.match(self.messageString)
+            header = headerMatch.group(1) if headerMatch else None
 
-        # order these by most common messages for some efficiency
-        if ((self.messageString[0:4] == '!KPM') or (self.messageString[0:1] == '[')):
-            self.isValidMessage = True
-            self.messageType = 'KPM'
-            self.logger.debug('read {} message type - starting parsing'.format(self.messageType))
-            self.parseMessage_KPM()
-
-        elif self.messageString[0:7] == '!CONFIG':
-            self.isValidMessage = True
-            self.messageType = 'CONFIG'
-            self.logger.debug('read {} message type - starting parsing'.format(self.messageType))
-            self.parseMessage_CONFIG()
-
-        elif self.messageString[0:4] == '!VER':
-            self.isValidMessage = True
-            self.messageType = 'VER'
-            self.logger.debug('read {} message type - starting parsing'.format(self.messageType))
-            self.parseMessage_VER()
-
-        elif (self.messageString[0:2] == '!>'):
-            self.isValidMessage = True
-            self.messageType = 'PROMPT'
+        if header not in kMESSAGE_DISPATCH:
+            self.isValidMessage = False
+            self.messageType = 'UNK'
             self.needsProcessing = False
-            self.logger.debug('read {} message type - no parsing needed'.format(self.messageType))
-
-        elif self.messageString[0:4] == '!AUI':
-            self.isValidMessage = True
-            self.messageType = 'AUI'
-            self.logger.debug('read {} message type - starting parsing'.format(self.messageType))
-            self.parseMessage_AUI()
+            self.logger.warning('Unknown message type:{} - skipping'.format(self.messageString))
+            return
 
-        elif self.messageString[0:4] == '!RFX':
-            self.isValidMessage = True
-            self.messageType = 'RFX'
-            self.logger.debug('read {} message type - starting parsing'.format(self.messageType))
-            self.parseMessage_RFX()
+        self.isValidMessage = True
+        self.messageType, parser = kMESSAGE_DISPATCH[header]
 
-        elif self.messageString[0:4] == '!EXP':
-            self.isValidMessage = True
-            self.messageType = 'EXP'
-            self.logger.debug('read {} message type - starting parsing'.format(self.messageType))
-            self.parseMessage_EXP()
-
-        elif self.messageString[0:4] == '!REL':
-            self.isValidMessage = True
-            self.messageType = 'REL'
-            self.logger.debug('read {} message type - starting parsing'.format(self.messageType))
-            self.parseMessage_REL()
-
-        elif self.messageString[0:4] == '!LRR':
-            if self.firmwareVersion == 'V2.2a.8.8':
-                self.isValidMessage = True
-                self.messageType = 'LR2'
-                self.logger.debug(
-                    'read {} ({}) message type - starting parsing'.format(self.messageType, self.firmwareVersion))
-                self.parseMessage_LR2()
-            elif self.firmwareVersion == 'V2.2a.6':
-                self.isValidMessage = True
-                self.messageType = 'LRR'
-                self.logger.debug(
-                    'read {} ({}) message type - starting parsing'.format(self.messageType, self.firmwareVersion))
-                self.parseMessage_LRR()
-            elif self.firmwareVersion == '':
-                self.logger.warning(
-                    'cannot read {} message type - firmware version not read from AlarmDecoder yet'.format(self.messageType))
-                self.setMessageToInvalid('Unidentified firmware')
-            else:
-                # need firmware version to process LRR
-                self.logger.error(
-                    'Cannot read {} message type - unsupported firmware version:{}. Only V2.2a.6 or V2.2a.8.8 versions are supported.'.format(self.messageType, self.firmwareVersion))
-                self.setMessageToInvalid('Unsupported firmware')
-
-        elif (self.messageString[0:8] == '!Sending') or (self.messageString[0:8] == '!setting') or (self.messageString[0:8] == '!Reading') or (self.messageString[0:5] == '!UART'):
-            self.isValidMessage = True
-            self.messageType = 'PROMPT'
+        if parser is None:
             self.needsProcessing = False
             self.logger.debug('read {} message type - no parsing needed'.format(self.messageType))
-
-        elif self.messageString[0:4] == '!KPE':
-            self.isValidMessage = True
-            self.messageType = 'KPE'
-            self.needsProcessing = False
-            self.logger.debug('read {} message type - no parsing'.format(self.messageType))
-
-        elif self.messageString[0:4] == '!ERR':
-            self.isValidMessage = True
-            self.messageType = 'ERR'
-            self.logger.debug('read {} message type - starting parsing'.format(self.messageType))
-            self.parseMessage_ERR()
-
-        elif self.messageString[0:4] == '!CRC':
-            self.isValidMessage = True
-            self.messageType = 'CRC'
-            self.needsProcessing = False
+        else:
             self.logger.debug('read {} message type - starting parsing'.format(self.messageType))
+            parser(self)
 
+    def parseMessage_LRRForFirmware(self):
+        """
+        The LRR message format depends on the firmware. This sets the message type to LR2 and calls
+        parseMessage_LR2 for V2.2a.8.8 or LRR and parseMessage_LRR for V2.2a.6.
+        """
+        if self.firmwareVersion == 'V2.2a.8.8':
+            self.messageType = 'LR2'
+            self.logger.debug(
+                'read {} ({}) message type - starting parsing'.format(self.messageType, self.firmwareVersion))
+            self.parseMessage_LR2()
+        elif self.firmwareVersion == 'V2.2a.6':
+            self.messageType = 'LRR'
+            self.logger.debug(
+                'read {} ({}) message type - starting parsing'.format(self.messageType, self.firmwareVersion))
+            self.parseMessage_LRR()
+        elif self.firmwareVersion == '':
+            self.logger.warning(
+                'cannot read {} message type - firmware version not read from AlarmDecoder yet'.format(self.messageType))
+            self.setMessageToInvalid('Unidentified firmware')
         else:
-            self.isValidMessage = False
-            self.messageType = 'UNK'
-            self.needsProcessing = False
-            self.logger.warning('Unknown message type:{} - skipping'.format(self.messageString))
+            # need firmware version to process LRR
+            self.logger.error(
+                'Cannot read {} message type - unsupported firmware version:{}. Only V2.2a.6 or V2.2a.8.8 versions are supported.'.format(self.messageType, self.firmwareVersion))
+            self.setMessageToInvalid('Unsupported firmware')
 
     def parseMessage_KPM(self):
         """
@@ -207,12 +555,17 @@ class Message(object):
         isValidNumericCode (boolean) - sometimes numericCode may not be base 10 number (see NuTech docs)
                 in this case we consider it a bad keypad message
         isBypassZone (boolean) - if message text start with BYPAS
-        keypadDestinations (array of int) - the list of keypads this message is intended for
-        keypadFlags (dictionary) - a dictionary with the following keys created based on bitField above.
+        keypadDestinations (tuple of int) - the keypads this message is intended for
+        keypadFlags (KeypadFlags) - a record with the following fields created based on bitField above.
                 most are 0 or 1; except BEEPS (int), ERROR_REPORT (?), and ADEMCO_OR_DSC ("A or "D")
                 READY, ARMED_AWAY, ARMED_HOME, BACKLIGHT, PGM_MODE, BEEPS, ZONES_BYPASSED, AC_ON,
                 CHIME_MODE, ALARM_OCCURRED, ALARM_BELL_ON, BATTERY_LOW, ARMED_INSTANT, FIRE,
                 CHECK_ZONE, ARMED_STAY_NIGHT, ERROR_REPORT, ADEMCO_OR_DSC
+
+        panelState, homeKitState (string) - the panel and HomeKit state based on keypadFlags
+
+        keypadDestinations, keypadFlags, panelState, homeKitState and the message text properties are
+        decoded the first time they are read - see KPMRecord
         """
 
         # return if not a KPM message
@@ -234,205 +587,46 @@ class Message(object):
                 return
 
             # we now have a good KPM message so lets parse it
-            # init the properites
-            self.messageDetails['KPM'] = {}
-            self.messageDetails['KPM']['isValidNumericCode'] = False
-            self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_UNK
-            self.messageDetails['KPM']['homeKitState'] = AD2USB_Constants.k_HK_ALARM_DISARMED
-
-            # text of message
-            self.messageDetails['KPM']['isBypassZone'] = False
-            self.messageDetails['KPM']['isPressForFaultMessage'] = False
-            self.messageDetails['KPM']['isAlarmTripped'] = False
-            self.messageDetails['KPM']['isCountdown'] = False
-            self.messageDetails['KPM']['isFault'] = False
-            self.messageDetails['KPM']['isCheck'] = False
-            self.messageDetails['KPM']['doesMessageContainZoneNumber'] = False
-            self.messageDetails['KPM']['doesMessageZoneMatchNumericCode'] = False
+            # the keypad flags, destinations, panel state and text fields are decoded when first read
+            self.details = KPMRecord()
+            self.details.isValidNumericCode = False
 
             # split the message on comma
             kpmItems = re.split(',', kpmMessage)
-            self.messageDetails['KPM']['bitField'] = kpmItems[0]
-            self.messageDetails['KPM']['numericCode'] = kpmItems[1]
-            self.messageDetails['KPM']['rawData'] = kpmItems[2]
-            self.messageDetails['KPM']['alphanumericKeypadMessage'] = kpmItems[3]
-
-            # process the bits - skipping the first char '['
-            # char 0 = '[', char 1-20 = data, char 21 = ']'
-            self.messageDetails['KPM']['keypadFlags'] = self.getKPMKeypadData(
-                self.messageDetails['KPM']['bitField'][1:21])
+            self.details.bitField = kpmItems[0]
+            self.details.numericCode = kpmItems[1]
+            self.details.rawData = kpmItems[2]
+            self.details.alphanumericKeypadMessage = kpmItems[3]
 
             # get a zone number as int
             # if it contains non 0-9 is may be an ECP bus failure
-            zoneAsInt = self.__getIntFromString(self.messageDetails['KPM']['numericCode'])
+            zoneAsInt = self.__getIntFromString(self.details.numericCode)
             if zoneAsInt is None:
-                self.messageDetails['KPM']['isValidNumericCode'] = False
-                self.messageDetails['KPM']['zoneNumberAsInt'] = 0  # should never be used
+                self.details.isValidNumericCode = False
+                self.details.zoneNumberAsInt = 0  # should never be used
 
             # lets now check if the zone is 1-99 which is valid
             elif 0 < zoneAsInt <= 99:
-                self.messageDetails['KPM']['isValidNumericCode'] = True
-                self.messageDetails['KPM']['zoneNumberAsInt'] = zoneAsInt
+                self.details.isValidNumericCode = True
+                self.details.zoneNumberAsInt = zoneAsInt
 
             else:
-                self.messageDetails['KPM']['isValidNumericCode'] = False
-                self.messageDetails['KPM']['zoneNumberAsInt'] = 0
-                self.logger.warning('Invalid Numeric Code:{} found in KPM message:{}.'.format(self.messageDetails['KPM']['numericCode'], self.messageDetails['KPM']['alphanumericKeypadMessage']))
+                self.details.isValidNumericCode = False
+                self.details.zoneNumberAsInt = 0
+                self.logger.warning('Invalid Numeric Code:{} found in KPM message:{}.'.format(self.details.numericCode, self.details.alphanumericKeypadMessage))
 
             # get keypad mask and determine if its a system message
             keypadMask = self.messageString[30:38]
             self.logger.debug('keypad bitmask is:{}'.format(keypadMask))
-            if keypadMask == '0000000':
-                self.messageDetails['KPM']['isSystemMessage'] = True
-            else:
-                self.messageDetails['KPM']['isSystemMessage'] = False
-
-            # process the bitmask of the keypadMask for keypad destinations 0-31
-            # we do this in pairs given how the data is structured per NuTech docs
-            # byte 1:0-7, 2:8-15, 3:16-23, 4:24-31
-            self.messageDetails['KPM']['keypadDestinations'] = []
-
-            # we can loop thru the 4 pairs of 2 x hex digits and check the masks
-            for hexPair in range(0, 4):
-                # string is start of h*2, end h*2 + 2 = 0:2, 2:4, 4:6, 6:8
-                keyPadHexPairAsString = keypadMask[hexPair*2:hexPair*2+2]
-                # self.logger.debug('keypad bitmask:{} is:{}'.format(hexPair + 1, keyPadHexPairAsString))
-                # HEX 0 and 1 - keypads 0-7, 8-15, 16-23, 24-31
-                for i in range(0, 8):
-                    if self.__getBitFromHexString(keyPadHexPairAsString, i) == 1:
-                        # if true append the integer value to the array
-                        # bit number to add = k * 8 - 0, 8, 16, 24
-                        self.messageDetails['KPM']['keypadDestinations'].append(i+hexPair*8)
-
-            self.logger.debug('keypad destinations are:{}'.format(self.messageDetails['KPM']['keypadDestinations']))
-
-            # ##########
-            # parse the alphanumeric message for certain cases
-            # akm = alphanumericKeypadMessage
-            akm = self.messageDetails['KPM']['alphanumericKeypadMessage']
-
-            # Hit * for faults
-            if " * " in akm:
-                self.messageDetails['KPM']['isPressForFaultMessage'] = True
-
-            # DISARM - Alarm Tripped
-            elif akm[1:14] == "DISARM SYSTEM":
-                self.messageDetails['KPM']['isAlarmTripped'] = True
-
-            # BYPAS
-            elif akm[1:6] == "BYPAS":
-                # zoneNumberAsInt has bypassed zone details
-                self.messageDetails['KPM']['isBypassZone'] = True
-                zoneAsInt = self.__getIntFromString(akm[7:9])
-                if zoneAsInt is None:
-                    self.messageDetails['KPM']['doesMessageContainZoneNumber'] = False
-                    self.messageDetails['KPM']['zoneFromMessage'] = None
-                else:
-                    self.messageDetails['KPM']['doesMessageContainZoneNumber'] = False
-                    self.messageDetails['KPM']['zoneFromMessage'] = zoneAsInt
-
-                # check if zone number in message text = numericCode field
-                if self.messageDetails['KPM']['zoneFromMessage'] == self.messageDetails['KPM']['zoneNumberAsInt']:
-                    self.messageDetails['KPM']['doesMessageZoneMatchNumericCode'] = True
-
-            # ARMED .. May Exit Countdown
-            elif ("ARMED" in akm) and ("Exit Now" in akm):
-                self.messageDetails['KPM']['isCountdown'] = True
-                self.messageDetails['KPM']['countdownTimeRemaining'] = self.messageDetails['KPM']['zoneNumberAsInt']
-
-            # FAULT
-            elif akm[1:6] == "FAULT":
-                # zoneNumberAsInt has bypassed zone details
-                self.messageDetails['KPM']['isFault'] = True
-                zoneAsInt = self.__getIntFromString(akm[7:9])
-                if zoneAsInt is None:
-                    self.messageDetails['KPM']['doesMessageContainZoneNumber'] = False
-                    self.messageDetails['KPM']['zoneFromMessage'] = None
-                else:
-                    self.messageDetails['KPM']['doesMessageContainZoneNumber'] = False
-                    self.messageDetails['KPM']['zoneFromMessage'] = zoneAsInt
-
-                # check if zone number in message text = numericCode field
-                if self.messageDetails['KPM']['zoneFromMessage'] == self.messageDetails['KPM']['zoneNumberAsInt']:
-                    self.messageDetails['KPM']['doesMessageZoneMatchNumericCode'] = True
-
-            # CHECK
-            elif akm[1:6] == "CHECK":
-                # mark the message as a CHECK message - corresponds to TROUBLE LRR message
-                self.messageDetails['KPM']['isCheck'] = True
-
-                # get the zone number as integer
-                zoneAsInt = self.__getIntFromString(akm[7:9])
-                if zoneAsInt is None:
-                    self.messageDetails['KPM']['doesMessageContainZoneNumber'] = False
-                    self.messageDetails['KPM']['zoneFromMessage'] = None
-                else:
-                    self.messageDetails['KPM']['doesMessageContainZoneNumber'] = False
-                    self.messageDetails['KPM']['zoneFromMessage'] = zoneAsInt
-
-                # check if zone number in message text = numericCode field
-                if self.messageDetails['KPM']['zoneFromMessage'] == self.messageDetails['KPM']['zoneNumberAsInt']:
-                    self.messageDetails['KPM']['doesMessageZoneMatchNumericCode'] = True
-
-            #
-            # ########## END
-
-            # determine the panel state, HomeKit State and armed state from the bits
-
-            # check for Alarm On (bit 11) first since this can happen in AWAY, STAY, etc.
-            if (self.getKPMattr(flag='ALARM_BELL_ON') == 1):
-                self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_ALARM_ON
-
-            # check for Alarm Occurred (bit 10) second
-            elif (self.getKPMattr(flag='ALARM_OCCURRED') == 1):
-                self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_ALARM_OCCURRED
-
-            # now check for READY
-            elif (self.getKPMattr(flag='READY') == 1) and (self.getKPMattr(flag='ARMED_AWAY') == 0) and (self.getKPMattr(flag='ARMED_HOME') == 0):
-                self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_READY
-
-            elif (self.getKPMattr(flag='ARMED_AWAY') == 1) and (self.getKPMattr(flag='READY') == 0):
-
-                # MAX
-                if self.getKPMattr(flag='ARMED_INSTANT') == 1:
-                    self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_ARMED_MAX
-
-                # AWAY
-                else:
-                    self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_ARMED_AWAY
-
-            elif (self.getKPMattr(flag='ARMED_HOME') == 1) and (self.getKPMattr(flag='READY') == 0):
-
-                # INSTANT
-                if (self.getKPMattr(flag='ARMED_INSTANT') == 1) and (self.getKPMattr(flag='ARMED_STAY_NIGHT') == 0):
-                    self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_ARMED_INSTANT
-
-                # NIGHT STAY
-                elif (self.getKPMattr(flag='ARMED_INSTANT') == 0) and (self.getKPMattr(flag='ARMED_STAY_NIGHT') == 1):
-                    self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_ARMED_NIGHT_STAY
-
-                # STAY
-                else:
-                    self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_ARMED_STAY
-
-            elif (self.getKPMattr(flag='READY') == 0) and (self.getKPMattr(flag='ARMED_AWAY') == 0) and (self.getKPMattr(flag='ARMED_HOME') == 0):
-                # this is a fault
-                # first 3 bits are zero: READY = 0, AWAY = 0, HOME (STAY) = 0
-                # unless not a numeric in which case it is an error
-                if self.messageDetails['KPM']['isValidNumericCode']:
-                    self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_FAULT
-                else:
-                    self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_ERROR
-
+            self.details.keypadMask = keypadMask
+            if keypadMask == '00000000':
+                self.details.isSystemMessage = True
             else:
-                # we have an error or unknown
-                self.messageDetails['KPM']['panelState'] = AD2USB_Constants.k_PANEL_UNK
-
-            # set the HomeKit state based on the panel state - - converted to string - default to DISARMED 
-            self.messageDetails['KPM']['homeKitState'] = AD2USB_Constants.k_HOMEKIT_STATES.get(self.messageDetails['KPM']['panelState'], AD2USB_Constants.k_HK_ALARM_DISARMED)
+                self.details.isSystemMessage = False
 
             self.needsProcessing = True
-            self.logger.debug('KPM message parsed:{}'.format(self.messageDetails['KPM']))
+            self.logger.debug('KPM message parsed - numericCode:{}, text:{}'.format(
+                self.details.numericCode, self.details.alphanumericKeypadMessage))
 
         except Exception as err:
             self.setMessageToInvalid('error processing KPM message')
@@ -440,7 +634,7 @@ class Message(object):
 
     def getKPMKeypadData(self, bitString):
         """
-        Take an string of 20 chars and returns a dictionary of elements set to value represeted by the bit
+        Take an string of 20 chars and returns a KeypadFlags record with each flag set to value represeted by the bit
 
         **parameters**
         bitString (string) - a string of 20 chars - mostly 0 and 1 but some are characters
@@ -461,35 +655,8 @@ class Message(object):
         # NOTE: V2.2a.8 has 19-20 unused
 
         # process 18 of the 20 bits by reading the string left to right
-        # we use an ordered array here to create the dictionary items
-        bitFieldNames = ['READY', 'ARMED_AWAY', 'ARMED_HOME', 'BACKLIGHT', 'PGM_MODE',
-                         'BEEPS', 'ZONES_BYPASSED', 'AC_ON', 'CHIME_MODE', 'ALARM_OCCURRED',
-                         'ALARM_BELL_ON', 'BATTERY_LOW', 'ARMED_INSTANT', 'FIRE', 'CHECK_ZONE',
-                         'ARMED_STAY_NIGHT', 'ERROR_REPORT', 'ADEMCO_OR_DSC']
-
-        # initialize return value dictionary with None for each item
-        returnDictionary = {}
-        for item in bitFieldNames:
-            returnDictionary[item] = None
-
-        # transform all the bitfields into a dictionary with int or char values
-        # the bitString is 1 to N; bit the key from the array is i-1
-        i = 1
-        for bit in bitString:
-            # skip if we exceed the number of array bit field name items
-            if (i <= len(bitFieldNames)):
-                # value may be an int or char
-                if bit in '0123456789':
-                    # make it an int - usually 0 or 1
-                    returnDictionary[bitFieldNames[i-1]] = int(bit)
-                else:
-                    # keep it a string
-                    returnDictionary[bitFieldNames[i-1]] = bit
-
-            # increment the bitsField array counter
-            i = i + 1
-
-        return returnDictionary
+        # the KeypadFlags fields are in the same order as the bits
+        return KeypadFlags(bitString)
 
     def parseMessage_VER(self):
         """
@@ -507,15 +674,15 @@ class Message(object):
             return
 
         try:
-            self.messageDetails['VER'] = {}
-            self.messageDetails['VER']['serialNumber'] = ''
-            self.messageDetails['VER']['firmwareVersion'] = ''
+            self.details = VERRecord()
+            self.details.serialNumber = ''
+            self.details.firmwareVersion = ''
 
             # set all possible capabilities to False
             # this allows us to check regardless of firmware version
-            self.messageDetails['VER']['capabilties'] = {}
+            self.details.capabilties = {}
             for capability in kCAPABILITIES:
-                self.messageDetails['VER']['capabilties'][capability] = False
+                self.details.capabilties[capability] = False
 
             # strip first 5 chars from the message - !VER:
             versionMessage = self.messageString[5:]
@@ -528,10 +695,10 @@ class Message(object):
 
             # capabilties dict = split on semicolon and build a dict
             for capability in re.split(';', capabiltiesString):
-                self.messageDetails['VER']['capabilties'][capability] = True
+                self.details.capabilties[capability] = True
 
             self.needsProcessing = True
-            self.logger.debug('VER message parsed:{}'.format(self.messageDetails['VER']))
+            self.logger.debug('VER message parsed:{}'.format(self.details))
 
         except Exception as err:
             self.setMessageToInvalid('error processing VER message')
@@ -553,13 +720,13 @@ class Message(object):
             return
 
         try:
-            self.messageDetails['CONFIG'] = {}
-            self.messageDetails['CONFIG']['flags'] = {}
-            self.messageDetails['CONFIG']['keypadAddress'] = ''
+            self.details = CONFIGRecord()
+            self.details.flags = {}
+            self.details.keypadAddress = ''
 
             # strip first 8 chars from the message - !CONFIG>
             configMessage = self.messageString[8:]
-            self.messageDetails['CONFIG']['configMessageString'] = configMessage
+            self.details.configMessageString = configMessage
 
             configItems = re.split('&', configMessage)
 
@@ -569,17 +736,17 @@ class Message(object):
                 # only process parameters we manage so we never change them
                 # see the constant kVALID_CONFIG_ITEMS at the top of this file
                 if (configParam[0] in kVALID_CONFIG_ITEMS):
-                    self.messageDetails['CONFIG']['flags'][configParam[0]] = configParam[1]
+                    self.details.flags[configParam[0]] = configParam[1]
                 # skip parameters we don't manage
                 else:
                     pass
 
             # update keypad address property of the message object
-            if 'ADDRESS' in self.messageDetails['CONFIG']['flags'].keys():
-                self.messageDetails['CONFIG']['keypadAddress'] = self.messageDetails['CONFIG']['flags']['ADDRESS']
+            if 'ADDRESS' in self.details.flags.keys():
+                self.details.keypadAddress = self.details.flags['ADDRESS']
 
             self.needsProcessing = True
-            self.logger.debug('CONFIG message parsed:{}'.format(self.messageDetails['CONFIG']))
+            self.logger.debug('CONFIG message parsed:{}'.format(self.details))
 
         except Exception as err:
             self.setMessageToInvalid('error processing CONFIG message')
@@ -612,10 +779,10 @@ class Message(object):
             return
 
         try:
-            self.messageDetails['RFX'] = {}
-            self.messageDetails['RFX']['serialNumber'] = ''
-            self.messageDetails['RFX']['data'] = ''
-            self.messageDetails['RFX']['bits'] = {}
+            self.details = RFXRecord()
+            self.details.serialNumber = ''
+            self.details.data = ''
+            self.details.bits = {}
 
             # strip first 5 chars from the message - !RFX:
             messageText = self.messageString[5:]
@@ -623,11 +790,11 @@ class Message(object):
 
             # serial number, data = split on comma
             messageItems = re.split(',', messageText)
-            self.messageDetails['RFX']['serialNumber'] = messageItems[0]
-            self.messageDetails['RFX']['data'] = messageItems[1]
+            self.details.serialNumber = messageItems[0]
+            self.details.data = messageItems[1]
 
             # convert data to an int value
-            dataAsInt = self.__hexStringToInt(self.messageDetails['RFX']['data'])
+            dataAsInt = self.__hexStringToInt(self.details.data)
             if dataAsInt is None:
                 self.logger.warning(
                     'RFX parsing - data field is not a valid hex value in message:{}'.format(self.messageString))
@@ -640,15 +807,15 @@ class Message(object):
                 bitFlags = ['UNK1', 'LOWBAT', 'SUP', 'UNK4', 'LOOP3', 'LOOP2', 'LOOP4', 'LOOP1']
                 for i in range(0, 8):
                     flagSet = self.__getBitFromInt(dataAsInt, i)
-                    # self.logger.debug("data:{} ({}), bit:{} is set to:{}".format(self.messageDetails['RFX']['data'], dataAsInt, i, flagSet))
+                    # self.logger.debug("data:{} ({}), bit:{} is set to:{}".format(self.details.data, dataAsInt, i, flagSet))
                     if flagSet == 1:
                         # if true set the flag to True
-                        self.messageDetails['RFX']['bits'][bitFlags[i]] = True
+                        self.details.bits[bitFlags[i]] = True
                     else:
-                        self.messageDetails['RFX']['bits'][bitFlags[i]] = False
+                        self.details.bits[bitFlags[i]] = False
 
                 self.needsProcessing = True
-                self.logger.debug('RFX message parsed:{}'.format(self.messageDetails['RFX']))
+                self.logger.debug('RFX message parsed:{}'.format(self.details))
 
         except Exception as err:
             self.setMessageToInvalid('error parsing RFX message')
@@ -673,30 +840,30 @@ class Message(object):
             return
 
         try:
-            self.messageDetails['LRR'] = {}
-            self.messageDetails['LRR']['eventData'] = ''
-            self.messageDetails['LRR']['partition'] = 0
-            self.messageDetails['LRR']['user'] = ''
-            self.messageDetails['LRR']['eventType'] = ''
-            self.messageDetails['LRR']['isUserEvent'] = False
-            self.messageDetails['LRR']['isZoneEvent'] = False
-            self.messageDetails['LRR']['isAllPartitions'] = False
-            self.messageDetails['LRR']['zoneNumber'] = 0  # added this to match LR2 messages for compatibility
+            self.details = LRRRecord()
+            self.details.eventData = ''
+            self.details.partition = 0
+            self.details.user = ''
+            self.details.eventType = ''
+            self.details.isUserEvent = False
+            self.details.isZoneEvent = False
+            self.details.isAllPartitions = False
+            self.details.zoneNumber = 0  # added this to match LR2 messages for compatibility
 
             # strip first 5 chars from the message - !EXP:
             messageText = self.messageString[5:]
 
             # serial number, data = split on comma
             messageItems = re.split(',', messageText)
-            self.messageDetails['LRR']['eventData'] = messageItems[0]
+            self.details.eventData = messageItems[0]
             # TO DO: remove this line below
-            self.messageDetails['LRR']['eventDataAsInt'] = int(messageItems[0])
-            self.messageDetails['LRR']['partition'] = int(messageItems[1])
-            self.messageDetails['LRR']['eventType'] = messageItems[2]
+            self.details.eventDataAsInt = int(messageItems[0])
+            self.details.partition = int(messageItems[1])
+            self.details.eventType = messageItems[2]
 
             # if parition == 0 then partition is ALL
-            if self.messageDetails['LRR']['partition'] == 0:
-                self.messageDetails['LRR']['isAllPartitions'] = True
+            if self.details.partition == 0:
+                self.details.isAllPartitions = True
 
             # determine valid event type and user vs. paritition event
             # triggers are currently: first 19 lines
@@ -741,27 +908,27 @@ class Message(object):
                     LRRZoneEvents.append(oneType)
 
             # check if it is a known LRR message event type
-            if self.messageDetails['LRR']['eventType'] in validLRREvents.keys():
-                self.messageDetails['LRR']['isKnownLRR'] = True
+            if self.details.eventType in validLRREvents.keys():
+                self.details.isKnownLRR = True
                 self.needsProcessing = True
 
                 # next determine if its a zone of user message
-                if self.messageDetails['LRR']['eventType'] in LRRUserEvents:
-                    self.messageDetails['LRR']['isUserEvent'] = True
-                    self.messageDetails['LRR']['user'] = self.messageDetails['LRR']['eventData']
-                elif self.messageDetails['LRR']['eventType'] in LRRZoneEvents:
-                    self.messageDetails['LRR']['isZoneEvent'] = True
-                    self.messageDetails['LRR']['zoneNumber'] = self.__getIntFromString(self.messageDetails['LRR']['eventData'])
+                if self.details.eventType in LRRUserEvents:
+                    self.details.isUserEvent = True
+                    self.details.user = self.details.eventData
+                elif self.details.eventType in LRRZoneEvents:
+                    self.details.isZoneEvent = True
+                    self.details.zoneNumber = self.__getIntFromString(self.details.eventData)
 
             else:
                 self.logger.warning('Unknown LRR (v2.2a.6) eventType:{} message parsed:{}'.format(
-                    self.messageDetails['LRR']['eventType'], self.messageDetails['LRR']))
+                    self.details.eventType, self.details))
 
                 self.logger.warning('Post this messages in the Indigo User Forum')
-                self.messageDetails['LRR']['isKnownLRR'] = False
+                self.details.isKnownLRR = False
                 self.needsProcessing = False
 
-            self.logger.debug('LRR (v2.2a.6) message parsed:{}'.format(self.messageDetails['LRR']))
+            self.logger.debug('LRR (v2.2a.6) message parsed:{}'.format(self.details))
 
         except Exception as err:
             self.setMessageToInvalid('error processing LRR message')
@@ -794,28 +961,28 @@ class Message(object):
 
         try:
             progressMessage = 'started...'
-            self.messageDetails['LR2'] = {}
+            self.details = LR2Record()
 
             # init these in alphabetic order to help checking
-            self.messageDetails['LR2']['cid_event_code'] = ''
-            self.messageDetails['LR2']['cid_event_string'] = ''
-            self.messageDetails['LR2']['cid_event_qualifier'] = ''
-            self.messageDetails['LR2']['cid_message'] = ''
-
-            self.messageDetails['LR2']['eventData'] = ''
-            self.messageDetails['LR2']['eventType'] = ''
-
-            self.messageDetails['LR2']['isAllPartitions'] = False
-            self.messageDetails['LR2']['isKnownCode'] = False
-            self.messageDetails['LR2']['isMappedToEvent'] = False
-            self.messageDetails['LR2']['isUserEvent'] = False
-            self.messageDetails['LR2']['isZoneEvent'] = False
-
-            self.messageDetails['LR2']['partition'] = 0
-            self.messageDetails['LR2']['report_code'] = ''
-            self.messageDetails['LR2']['user'] = ''
-            self.messageDetails['LR2']['userCode'] = 0
-            self.messageDetails['LR2']['zoneNumber'] = 0
+            self.details.cid_event_code = ''
+            self.details.cid_event_string = ''
+            self.details.cid_event_qualifier = ''
+            self.details.cid_message = ''
+
+            self.details.eventData = ''
+            self.details.eventType = ''
+
+            self.details.isAllPartitions = False
+            self.details.isKnownCode = False
+            self.details.isMappedToEvent = False
+            self.details.isUserEvent = False
+            self.details.isZoneEvent = False
+
+            self.details.partition = 0
+            self.details.report_code = ''
+            self.details.user = ''
+            self.details.userCode = 0
+            self.details.zoneNumber = 0
 
             progressMessage = 'Values initialized'
 
@@ -825,15 +992,15 @@ class Message(object):
 
             # eventData, partition, cid_message, report_code = split on comma
             messageItems = re.split(',', messageText)
-            self.messageDetails['LR2']['eventData'] = messageItems[0]
-            self.messageDetails['LR2']['partition'] = int(messageItems[1])
-            self.messageDetails['LR2']['cid_message'] = messageItems[2]
-            self.messageDetails['LR2']['report_code'] = messageItems[3]
-            self.logger.debug("message split:{}".format(self.messageDetails))
+            self.details.eventData = messageItems[0]
+            self.details.partition = int(messageItems[1])
+            self.details.cid_message = messageItems[2]
+            self.details.report_code = messageItems[3]
+            self.logger.debug("message split:{}".format(self.details))
 
             # if parition == 0 then partition is ALL
-            if self.messageDetails['LR2']['partition'] == 0:
-                self.messageDetails['LR2']['isAllPartitions'] = True
+            if self.details.partition == 0:
+                self.details.isAllPartitions = True
 
             progressMessage = 'Partitions checked'
 
@@ -841,19 +1008,19 @@ class Message(object):
             # check that it starts with CID_ chars 0-3
             # CID event qualifier is char 4
             # CID event code is chars 5-7
-            if self.messageDetails['LR2']['cid_message'][0:4] == 'CID_':
-                self.messageDetails['LR2']['cid_event_qualifier'] = self.messageDetails['LR2']['cid_message'][4]
-                self.messageDetails['LR2']['cid_event_code'] = self.messageDetails['LR2']['cid_message'][5:8]
+            if self.details.cid_message[0:4] == 'CID_':
+                self.details.cid_event_qualifier = self.details.cid_message[4]
+                self.details.cid_event_code = self.details.cid_message[5:8]
             else:
                 self.setMessageToInvalid('CID string not found')
-                self.logger.warning('LR2 message failed to parse - CID not found:{}'.format(self.messageDetails['LR2']))
+                self.logger.warning('LR2 message failed to parse - CID not found:{}'.format(self.details))
                 return
 
             progressMessage = 'CID portion parsed'
 
             # a 3 digit code ex: 570
-            cid_code = self.messageDetails['LR2']['cid_event_code']
-            cid_event_qualifier = self.messageDetails['LR2']['cid_event_qualifier']
+            cid_code = self.details.cid_event_code
+            cid_event_qualifier = self.details.cid_event_qualifier
             self.logger.debug("SAIC code:{} and qualifier:{}".format(cid_code, cid_event_qualifier))
 
             # check if code exists in SAIC_EventCodes file
@@ -861,22 +1028,22 @@ class Message(object):
             if cid_code in SAIC_EventCodes.kCODE:
 
                 self.logger.debug("found valid SAIC code:{}".format(cid_code))
-                self.messageDetails['LR2']['isKnownCode'] = True
+                self.details.isKnownCode = True
 
                 # event description from SIA DC-05-1999.09
-                self.messageDetails['LR2']['cid_event_string'] = SAIC_EventCodes.kCODE[cid_code][0]
+                self.details.cid_event_string = SAIC_EventCodes.kCODE[cid_code][0]
                 progressMessage = 'description found'
 
                 # check if zone or user event
                 if SAIC_EventCodes.kCODE[cid_code][1] == 'user':
-                    self.messageDetails['LR2']['user'] = self.messageDetails['LR2']['eventData']
-                    self.messageDetails['LR2']['userCode'] = int(self.messageDetails['LR2']['eventData'])
-                    self.messageDetails['LR2']['isUserEvent'] = True
+                    self.details.user = self.details.eventData
+                    self.details.userCode = int(self.details.eventData)
+                    self.details.isUserEvent = True
                     progressMessage = 'user event found'
 
                 elif SAIC_EventCodes.kCODE[cid_code][1] == 'zone':
-                    self.messageDetails['LR2']['zoneNumber'] = int(self.messageDetails['LR2']['eventData'])
-                    self.messageDetails['LR2']['isZoneEvent'] = True
+                    self.details.zoneNumber = int(self.details.eventData)
+                    self.details.isZoneEvent = True
                     progressMessage = 'zone event found'
 
                 else:
@@ -888,24 +1055,24 @@ class Message(object):
 
             else:
                 self.logger.warning('Unknown LR2 (v2.2a.8.8) CID code:{} message parsed:{}'.format(
-                    cid_code, self.messageDetails['LR2']))
+                    cid_code, self.details))
                 self.setMessageToInvalid('Code {} not found in SAIC List'.format(cid_code))
                 return
 
             # if we made it here we have a valid and parsed LR2 message so log it
-            self.logger.debug("valid LR2 message parsed:{}".format(self.messageDetails['LR2']))
+            self.logger.debug("valid LR2 message parsed:{}".format(self.details))
 
             # map the code to a valid Event - the events were defined as old LRR message types
             # see the SAIC_EventCodes file for mapping
             # and set the event type property which matches Events.xml triggers
             if cid_code in SAIC_EventCodes.cid_code_to_event:
                 if cid_event_qualifier in SAIC_EventCodes.cid_code_to_event[cid_code]:
-                    self.messageDetails['LR2']['eventType'] = SAIC_EventCodes.cid_code_to_event[cid_code][cid_event_qualifier]
+                    self.details.eventType = SAIC_EventCodes.cid_code_to_event[cid_code][cid_event_qualifier]
 
                     self.logger.debug("message:{},{} mapped to:{}".format(
-                        cid_code, cid_event_qualifier, self.messageDetails['LR2']['eventType']))
+                        cid_code, cid_event_qualifier, self.details.eventType))
 
-                    self.messageDetails['LR2']['isMappedToEvent'] = True
+                    self.details.isMappedToEvent = True
 
                 else:
                     # log that we don't have an event qualified mapping
@@ -918,7 +1085,7 @@ class Message(object):
             # pass back to process the message
             # even if not mapped we assume its valid so we can log it
             self.needsProcessing = True
-            self.logger.debug('LRR (v2.2a.8.8) LR2 message parsed:{}'.format(self.messageDetails['LR2']))
+            self.logger.debug('LRR (v2.2a.8.8) LR2 message parsed:{}'.format(self.details))
 
         except Exception as err:
             self.setMessageToInvalid('error parsing LR2 message')
@@ -939,14 +1106,14 @@ class Message(object):
                 return
 
             # else its and AUI message
-            self.messageDetails['AUI'] = {}
-            self.messageDetails['AUI']['data'] = ''
+            self.details = AUIRecord()
+            self.details.data = ''
 
             # strip first 5 chars from the message - !AUI:
-            self.messageDetails['AUI']['data'] = self.messageString[5:]
+            self.details.data = self.messageString[5:]
 
             self.needsProcessing = True
-            self.logger.debug('AUI message parsed:{}'.format(self.messageDetails['AUI']))
+            self.logger.debug('AUI message parsed:{}'.format(self.details))
 
         except Exception as err:
             self.setMessageToInvalid('error parsing AUI message')
@@ -965,31 +1132,31 @@ class Message(object):
         """
         if self.messageType == 'EXP':
             try:
-                self.messageDetails['EXP'] = {}
-                self.messageDetails['EXP']['zoneExpanderAddress'] = ''
-                self.messageDetails['EXP']['expanderChannel'] = ''
-                self.messageDetails['EXP']['data'] = ''
-                self.messageDetails['EXP']['isFaulted'] = None
+                self.details = EXPRecord()
+                self.details.zoneExpanderAddress = ''
+                self.details.expanderChannel = ''
+                self.details.data = ''
+                self.details.isFaulted = None
 
                 # strip first 5 chars from the message - !EXP:
                 messageText = self.messageString[5:]
 
                 # zone expander address, channel, data = split on comma
                 messageItems = re.split(',', messageText)
-                self.messageDetails['EXP']['zoneExpanderAddress'] = messageItems[0]
-                self.messageDetails['EXP']['expanderChannel'] = messageItems[1]
-                self.messageDetails['EXP']['data'] = messageItems[2]
+                self.details.zoneExpanderAddress = messageItems[0]
+                self.details.expanderChannel = messageItems[1]
+                self.details.data = messageItems[2]
 
                 # determine if its faulted
-                if self.messageDetails['EXP']['data'] == '01':
-                    self.messageDetails['EXP']['isFaulted'] = True
-                elif self.messageDetails['EXP']['data'] == '00':
-                    self.messageDetails['EXP']['isFaulted'] = False
+                if self.details.data == '01':
+                    self.details.isFaulted = True
+                elif self.details.data == '00':
+                    self.details.isFaulted = False
                 else:
-                    self.messageDetails['EXP']['isFaulted'] = None
+                    self.details.isFaulted = None
 
                 self.needsProcessing = True
-                self.logger.debug('EXP message parsed:{}'.format(self.messageDetails['EXP']))
+                self.logger.debug('EXP message parsed:{}'.format(self.details))
 
             except Exception as err:
                 self.setMessageToInvalid('error parsing EXP message')
@@ -1008,31 +1175,31 @@ class Message(object):
         """
         if self.messageType == 'REL':
             try:
-                self.messageDetails['REL'] = {}
-                self.messageDetails['REL']['relayExpanderAddress'] = ''
-                self.messageDetails['REL']['expanderChannel'] = ''
-                self.messageDetails['REL']['data'] = ''
-                self.messageDetails['REL']['isOpen'] = None
+                self.details = RELRecord()
+                self.details.relayExpanderAddress = ''
+                self.details.expanderChannel = ''
+                self.details.data = ''
+                self.details.isOpen = None
 
                 # strip first 5 chars from the message - !EXP:
                 messageText = self.messageString[5:]
 
                 # zone expander address, channel, data = split on comma
                 messageItems = re.split(',', messageText)
-                self.messageDetails['REL']['relayExpanderAddress'] = messageItems[0]
-                self.messageDetails['REL']['expanderChannel'] = messageItems[1]
-                self.messageDetails['REL']['data'] = messageItems[2]
+                self.details.relayExpanderAddress = messageItems[0]
+                self.details.expanderChannel = messageItems[1]
+                self.details.data = messageItems[2]
 
                 # determine if its faulted
-                if self.messageDetails['REL']['data'] == '00':
-                    self.messageDetails['REL']['isOpen'] = True
-                elif self.messageDetails['REL']['data'] == '01':
-                    self.messageDetails['REL']['isOpen'] = False
+                if self.details.data == '00':
+                    self.details.isOpen = True
+                elif self.details.data == '01':
+                    self.details.isOpen = False
                 else:
-                    self.messageDetails['REL']['isOpen'] = None
+                    self.details.isOpen = None
 
                 self.needsProcessing = True
-                self.logger.debug('REL message parsed:{}'.format(self.messageDetails['REL']))
+                self.logger.debug('REL message parsed:{}'.format(self.details))
 
             except Exception as err:
                 self.setMessageToInvalid('error parsing REL message')
@@ -1053,34 +1220,34 @@ class Message(object):
             return
 
         try:
-            self.messageDetails['ERR'] = {}
-            self.messageDetails['ERR']['errorsDetails'] = []
-            self.messageDetails['ERR']['errorCount'] = 0
-            self.messageDetails['ERR']['hasError'] = False
+            self.details = ERRRecord()
+            self.details.errorsDetails = []
+            self.details.errorCount = 0
+            self.details.hasError = False
 
             # strip first 5 chars from the message - !ERR:
             messageText = self.messageString[5:]
 
             # check for no errors first
             if messageText == '0':
-                self.messageDetails['ERR']['errorsDetails'] = []
-                self.messageDetails['ERR']['errorCount'] = 0
-                self.messageDetails['ERR']['hasError'] = False
+                self.details.errorsDetails = []
+                self.details.errorCount = 0
+                self.details.hasError = False
             else:
                 # we should have an array of errors
                 messageItems = re.split(',', messageText)
-                self.messageDetails['ERR']['errorsDetails'] = messageItems
+                self.details.errorsDetails = messageItems
 
                 # get the count of errors
-                self.messageDetails['ERR']['errorCount'] = len(messageItems)
+                self.details.errorCount = len(messageItems)
 
                 # test each error - if any are non-zero we have an error
                 for anError in messageItems:
                     if anError != '0':
-                        self.messageDetails['ERR']['hasError'] = True
+                        self.details.hasError = True
 
             self.needsProcessing = True
-            self.logger.debug('ERR message parsed:{}'.format(self.messageDetails['ERR']))
+            self.logger.debug('ERR message parsed:{}'.format(self.details))
 
         except Exception as err:
             self.setMessageToInvalid('error parsing ERR message')
@@ -1088,12 +1255,9 @@ class Message(object):
 
     def getMessageProperties(self):
         """
-        returns a dictionary of the message properties
+        returns the message properties as a MessageRecord (or None if the message type has no properties)
         """
-        if self.messageType in self.messageDetails.keys():
-            return self.messageDetails[self.messageType]
-        else:
-            return None
+        return self.details
 
     def getMessageType(self):
         """
@@ -1109,10 +1273,7 @@ class Message(object):
         attributeName - name of the property you want to get
         """
         try:
-            if attributeName in self.messageDetails[self.messageType]:
-                return self.messageDetails[self.messageType][attributeName]
-            else:
-                return None
+            return self.details.get(attributeName)
 
         except Exception as err:
             self.logger.error("Unable to retrieve panel message attribute:{}, error msg:{}".format(
@@ -1129,10 +1290,7 @@ class Message(object):
         """
 
         if self.messageType == 'KPM':
-            if flag in self.messageDetails['KPM']['keypadFlags'].keys():
-                return self.messageDetails['KPM']['keypadFlags'][flag]
-            else:
-                return None
+            return self.details.keypadFlags.get(flag)
         else:
             return None
 
@@ -1142,6 +1300,16 @@ class Message(object):
         """
         return self.getMessageAttribute(attributeName)
 
+    def freeze(self):
+        """
+        prevents any further changes to the message and its properties (details) so the message can be shared
+        """
+        details = getattr(self, 'details', None)
+        if details is not None:
+            details.freeze()
+
+        self.__class__ = FrozenMessage
+
     def setMessageToInvalid(self, reason='reason not provided'):
         """
         sets attributes to ensure the caller knows the message is invalid
@@ -1200,3 +1368,119 @@ class Message(object):
         except Exception as err:
             self.logger.debug('Error converting:{} to integer - error:{}'.format(intAsString, str(err)))
             return None
+
+
+class FrozenMessage(Message):
+    """
+    A Message that can no longer be changed - see Message.freeze()
+    """
+    __slots__ = ()
+
+    isFrozen = True
+
+    def __setattr__(self, name, value):
+        # a frozen message may be returned to more than one caller - see MessageCache
+        raise AttributeError('cannot change {} - message is frozen'.format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError('cannot delete {} - message is frozen'.format(name))
+
+
+class MessageCache(object):
+    """
+    A bounded least recently used cache of parsed messages. The panel repeats the same keypad message
+    every few seconds while nothing changes so most keypad messages can be returned from the cache
+    instead of being parsed again. Messages are cached by the raw message and the firmware version
+    and are frozen so the same object can safely be returned more than once. Only valid message types
+    in kCACHED_MESSAGE_TYPES are cached.
+
+    The basic usage is:
+
+        x = MessageCache(maxSize=64)
+        x.getMessage(messageString, firmwareVersion, logger)  # returns an AlarmDecoder Message object
+        x.getStatistics()  # returns a dictionary of hits, misses, evictions and size
+    """
+
+    kCACHED_MESSAGE_TYPES = ('KPM',)
+
+    def __init__(self, maxSize=64):
+        """
+        **parameters:**
+        maxSize -- the number of messages to keep - 0 turns off the cache
+        """
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__messages = OrderedDict()
+
+    def getMessage(self, messageString='', firmwareVersion='', logger=None):
+        """
+        returns a Message for the message string - from the cache if it has been seen before
+
+        **parameters:**
+        messageString -- the message read from the AlarmDecoder
+        firmwareVersion -- the AlarmDecoder firmware version
+        logger -- the logger object to use
+        """
+        key = (messageString, firmwareVersion)
+
+        message = self.__messages.get(key)
+        if message is not None:
+            self.hits += 1
+            self.__messages.move_to_end(key)
+            return message
+
+        self.misses += 1
+        message = Message(messageString, firmwareVersion, logger)
+
+        if (self.maxSize > 0) and message.isValidMessage and (message.messageType in self.kCACHED_MESSAGE_TYPES):
+            message.freeze()
+            self.__messages[key] = message
+            if len(self.__messages) > self.maxSize:
+                self.__messages.popitem(last=False)
+                self.evictions += 1
+
+        return message
+
+    def clear(self):
+        """
+        removes all the cached messages
+        """
+        self.__messages.clear()
+
+    def getStatistics(self):
+        """
+        returns a dictionary of the cache hits, misses, evictions and size
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.__messages), 'maxSize': self.maxSize}
+
+
+# message header to message type and parser method - built once when the module is loaded
+# the header is '[' for keypad messages or the letters after the '!' (ex: !KPM: is KPM, !> is >)
+# adding a new firmware message type only needs a new entry here
+# note LRR is LRR or LR2 depending on the firmware version - see parseMessage_LRRForFirmware
+kMESSAGE_DISPATCH = {
+    '[': ('KPM', Message.parseMessage_KPM),
+    'KPM': ('KPM', Message.parseMessage_KPM),
+    'CONFIG': ('CONFIG', Message.parseMessage_CONFIG),
+    'VER': ('VER', Message.parseMessage_VER),
+    '>': ('PROMPT', None),
+    'AUI': ('AUI', Message.parseMessage_AUI),
+    'RFX': ('RFX', Message.parseMessage_RFX),
+    'EXP': ('EXP', Message.parseMessage_EXP),
+    'REL': ('REL', Message.parseMessage_REL),
+    'LRR': ('LRR', Message.parseMessage_LRRForFirmware),
+    'Sending': ('PROMPT', None),
+    'setting': ('PROMPT', None),
+    'Reading': ('PROMPT', None),
+    'UART': ('PROMPT', None),
+    'KPE': ('KPE', None),
+    'ERR': ('ERR', Message.parseMessage_ERR),
+    'CRC': ('CRC', None),
+}
+
+# finds the message header after the '!' - headers match as a prefix and are tried in the order above
+# (ex: !Sending.....done is Sending, !UARTx is UART)
+kMESSAGE_HEADER = re.compile('!(' + '|'.join(re.escape(header) for header in kMESSAGE_DISPATCH if header != '[') + ')')
@@ -6,21 +6,31 @@
 
 import indigo  # Not really needed, but a specific import removes lint errors
 from datetime import datetime
+import fcntl
 # import inspect
-import os
+import os  # only for os.read in __readChunk
 import re
+import select
 import serial
+import struct
 import sys
+import termios
 import string
+import threading
 import time
 import AlarmDecoder
+import AD2USB_AsyncTransport
 import AD2USB_Constants
+import AD2USB_Framer
+import AD2USB_Playback
+import AD2USB_Reader
+import AD2USB_Triggers
+import AD2USB_Zones
+import AD2USB_Writer
 # from string import atoi
 
 # kRespDecode = ['loop1', 'loop4', 'loop2', 'loop3', 'bit3', 'sup', 'bat', 'bit0']
 kRFXBits = ['bit0', 'bat', 'sup', 'bit3', 'loop3', 'loop2', 'loop4', 'loop1']
-kBin = ['0000', '0001', '0010', '0011', '0100', '0101', '0110', '0111', '1000',
-                '1001', '1010', '1011', '1100', '1101', '1110', '1111']
 kEventStateDict = ['OPEN', 'ARM_AWAY', 'ARM_STAY', 'ACLOSS', 'AC_RESTORE', 'LOWBAT',
                    'LOWBAT_RESTORE', 'RFLOWBAT', 'RFLOWBAT_RESTORE', 'TROUBLE',
                    'TROUBLE_RESTORE', 'ALARM_PANIC', 'ALARM_FIRE', 'ALARM_AUDIBLE',
@@ -30,6 +40,9 @@ kADCommands = {'CONFIG': 'C\r', 'VER': 'V\r'}
 # serial port timeout ex: 2 (seconds) or None (infinite)
 k_SERIAL_TIMEOUT = 5
 
+# most bytes read from the AlarmDecoder in one read - see __readChunk
+k_READ_CHUNK_SIZE = 4096
+
 ################################################################################
 # Globals
 ################################################################################
@@ -64,14 +77,53 @@ class ad2usb(object):
 
         # set the debug panel playback file
         self.playbackLastLineNumberRead = 0  # tracks the current line
+        self.playbackLastFileNameRead = ''  # the file the current line is in - playback can merge several files
         self.playbackSleepTime = 8  # 5 seconds sleep between each message
         self.hasPlaybackFileBeenRead = False  # flag to set after reading file
+        self.playbackReader = None  # keeps the playback file open between reads
+        self.playbackClock = AD2USB_Playback.PlaybackClock(speed=self.plugin.playbackSpeed, fixedSleep=self.playbackSleepTime)
 
         # set the firmware to unknown and the serial connection to None
         self.firmwareVersion = ''
         self.serialConnection = None
         self.isCommStarted = False  # this property is set in startAD2USBComm
 
+        # the serial connection can be reset from the reader thread and the main thread
+        self.connectionLock = threading.RLock()
+
+        # optional background reader thread - see startMessageReader
+        self.messageReader = None
+
+        # splits bytes read in chunks into complete lines - see panelReadWrapper
+        self.lineFramer = AD2USB_Framer.LineFramer()
+
+        # the last keypad message processed for each keypad address - see panelMsgRead
+        # a repeated message does not need to update the keypad device again
+        self.lastKeypadMessages = {}
+        self.unchangedKeypadMessages = 0
+
+        # the last state values written to each keypad device by id - see updateKeypadStates
+        self.lastKeypadStates = {}
+        self.keypadStatesWritten = 0
+        self.keypadStatesUnchanged = 0
+
+        # repeated keypad messages are returned from the cache instead of being parsed again
+        self.messageCache = AlarmDecoder.MessageCache(maxSize=AD2USB_Constants.k_MESSAGE_CACHE_SIZE)
+
+        # matches commands written with the AlarmDecoder's reply to measure round trip time
+        self.ackTracker = AD2USB_Writer.CommandAckTracker(logger=self.logger,
+                                                          keypadAddressMethod=lambda: self.plugin.ad2usbKeyPadAddress)
+
+        # all writes to the AlarmDecoder go through one prioritized queue - see queuePanelWrite
+        self.commandWriter = AD2USB_Writer.PanelCommandWriter(
+            writeMethod=self.__writeToConnection, logger=self.logger, pacing=self.plugin.writeCommandPacing,
+            ackTracker=self.ackTracker)
+        self.commandWriter.start()
+
+        # Indigo triggers are executed on worker threads so reading panel messages never waits for them
+        self.triggerExecutor = AD2USB_Triggers.TriggerExecutor(executeMethod=self.__executeIndigoTrigger, logger=self.logger)
+        self.triggerExecutor.start()
+
         # this code executes before runConcurrentThread so no open reading is happening
         # send a VER and CONFIG message and read the output
         if self.startAD2USBComm():
@@ -83,18 +135,6 @@ class ad2usb(object):
     def __del__(self):
         pass
 
-    ########################################
-    # hex to binary converter
-    def hex2bin(self, s):
-        self.logger.debug(u"called with:{}".format(s))
-
-        bits = ''
-        for i in range(len(s)):
-            bits += kBin[int(s[i], base=16)]
-
-        self.logger.debug(u"keypad address bit map:{}".format(bits))
-        return bits
-
     ########################################
     # Event queue management and trigger initiation
     def executeTrigger(self, partition, user, event):
@@ -104,54 +144,63 @@ class ad2usb(object):
         user = str(user)
         userAsInt = self.__getIntFromString(user)
 
-        # new logic - we have event and parition from panel and user or non-user event
-        # new cache - { event : { partition: 1, any user: True/False, user: number/variable/list } }
-        # for each event that exists in the cache and matches the event
-        for triggerId in self.plugin.triggerCache:
-            triggerName = self.plugin.triggerCache[triggerId]['name']
+        # the dispatch table has only the triggers for this event and partition - see plugin.__addTriggerToDispatch
+        for triggerId in self.plugin.triggerDispatch.get((event, partition), ()):
+            trigger = self.plugin.triggerCache.get(triggerId)
+            if trigger is None:
+                continue
 
-            # if partition matches
-            if partition == self.plugin.triggerCache[triggerId]['partition']:
+            triggerName = trigger['name']
 
-                # if the event is one of the events 
-                if event in self.plugin.triggerCache[triggerId]['events']:
+            # if its a user event
+            if trigger['type'] == 'userEvents':
 
-                    # if its a user event
-                    if self.plugin.triggerCache[triggerId]['type'] == 'userEvents':
+                # if its any user execute it
+                if trigger['anyUser'] is True:
+                    self.logger.debug("Executing Any User Trigger:{}".format(triggerName))
+                    self.__queueTrigger(triggerId, triggerName)
 
-                        # if its any user execute it
-                        if self.plugin.triggerCache[triggerId]['anyUser'] is True:
-                            self.logger.debug("Executing Any User Trigger:{}".format(triggerName))
-                            indigo.trigger.execute(triggerId)
-
-                        # else look at user variable and figure it out
-                        else:
-                            # get the users value
-                            users = self.plugin.triggerCache[triggerId]['users']
-                            
-                            # get the users as an array of int
-                            usersToCheck = self.__convertUsersStringToList(name=triggerName, userString=users)
+                # else look at user variable and figure it out
+                else:
+                    # the users are parsed when the trigger starts unless they are in an Indigo variable
+                    usersToCheck = trigger['userSet']
+                    if usersToCheck is None:
+                        usersToCheck = self.__convertUsersStringToList(name=triggerName, userString=trigger['users'])
 
-                            # if the user from the event is in the list of users in the Trigger
-                            if userAsInt in usersToCheck:
-                                self.logger.debug("Executing User Match Trigger:{}".format(triggerName))
-                                indigo.trigger.execute(triggerId)
+                    # if the user from the event is in the list of users in the Trigger
+                    if userAsInt in usersToCheck:
+                        self.logger.debug("Executing User Match Trigger:{}".format(triggerName))
+                        self.__queueTrigger(triggerId, triggerName)
 
-                    # old Panel Arming events no longer will be executed in 3.4.0 and higher
-                    elif self.plugin.triggerCache[triggerId]['type'] == 'armDisarm':
-                            self.logger.error("AD2USB Plugin Triggers based on Panel Arming Events are deprecated and will not be run. Delete Trigger named:{} and replace with a User Action with the 'Any User' option selected.".format(triggerName))
+            # old Panel Arming events no longer will be executed in 3.4.0 and higher
+            elif trigger['type'] == 'armDisarm':
+                    self.logger.error("AD2USB Plugin Triggers based on Panel Arming Events are deprecated and will not be run. Delete Trigger named:{} and replace with a User Action with the 'Any User' option selected.".format(triggerName))
 
-                    else:
-                        # execute the trigger if its not a userEvent
-                        self.logger.debug("Executing Non-User Trigger:{}".format(triggerName))
+            else:
+                # execute the trigger if its not a userEvent
+                self.logger.debug("Executing Non-User Trigger:{}".format(triggerName))
 
-                        indigo.trigger.execute(triggerId)
+                self.__queueTrigger(triggerId, triggerName)
 
         self.logger.debug(u"completed")
 
+    def __queueTrigger(self, triggerId, triggerName=''):
+        """
+        Queues a trigger on the trigger executor or executes it now if the executor has been stopped
+
+        **parameters:**
+        triggerId -- the Indigo trigger id
+        triggerName -- the trigger name used in log messages
+        """
+        if not self.triggerExecutor.queueTrigger(triggerId, name=triggerName):
+            self.__executeIndigoTrigger(triggerId)
+
+    def __executeIndigoTrigger(self, triggerId):
+        indigo.trigger.execute(triggerId)
+
     ########################################
     # Write arbitrary messages to the panel
-    def panelMsgWrite(self, panelMsg, address=''):
+    def panelMsgWrite(self, panelMsg, address='', priority=AD2USB_Constants.k_WRITE_PRIORITY_KEYPAD, coalesceKey=None):
         """
         Sends (writes) a message to the AlarmDecoder to be sent to the alarm panel. Messages can be
         prefixed by a keypad address to make the message come from another keypad address other than the
@@ -162,6 +211,8 @@ class ad2usb(object):
         **parameter:**
         panelMsg - the keypad entries to send to the AlarmDecoder keypad
         address - zero-padded two digit string representing keypad address
+        priority - write queue priority - one of the AD2USB_Constants k_WRITE_PRIORITY values
+        coalesceKey - optional key to replace a waiting message with the same key (see queuePanelWrite)
         """
         # strip panel codes from message
         messageToLog = ''
@@ -198,12 +249,12 @@ class ad2usb(object):
         try:
             # if no keypad address specified no need to prefix the message with K##
             if len(address) == 0:
-                self.panelWriteWrapper(self.serialConnection, panelMsg)
+                self.queuePanelWrite(panelMsg, priority, coalesceKey)
             else:
                 if len(address) == 1:
                     address = "0" + address
                 panelMsg = 'K' + address + str(panelMsg)
-                self.panelWriteWrapper(self.serialConnection, panelMsg)
+                self.queuePanelWrite(panelMsg, priority, coalesceKey)
                 
             self.logger.info(u"Panel message:{} sent to AlarmDecoder".format(messageToLog))
 
@@ -263,7 +314,7 @@ class ad2usb(object):
 
         if not self.zoneListInit:
             for address in self.plugin.getAllKeypadAddresses():
-                self.zoneStateDict[address] = []
+                self.zoneStateDict[address] = AD2USB_Zones.ZoneFaultList()
             self.zoneListInit = True
 
         # version 3.1 - removed EXP messages - these are now processed using new methods
@@ -425,13 +476,7 @@ class ad2usb(object):
                     stateUIName = AD2USB_Constants.kZoneStateUIValues.get(stateMsg, "Unknown")
                     self.logger.info(u"Zone:{}, Name:{}, State changed to:{}".format(zNumber, zName, stateUIName))
 
-                try:
-                    if not supervisionMessage:
-                        # replacing update Zone Group method
-                        # self.updateZoneGroups(zNumber, stateMsg)
-                        self.plugin.updateAllZoneGroups()
-                except Exception as err:
-                    self.logger.error(u"updateAllZoneGroups Error:{}".format(str(err)))
+                # the Zone Groups for this zone were updated by setDeviceState
 
         else:
             if rawData[0:8] != '!setting' and rawData[0:7] != '!CONFIG' and rawData[0:2] != '!>' and rawData[0:4] != '!KPE' and rawData[0:8] != '!Sending' and rawData[0:4] != '!VER':
@@ -446,7 +491,7 @@ class ad2usb(object):
 
         if not self.zoneListInit:
             for address in self.plugin.getAllKeypadAddresses():
-                self.zoneStateDict[address] = []
+                self.zoneStateDict[address] = AD2USB_Zones.ZoneFaultList()
             self.zoneListInit = True
 
         # check to see is zone number provided is in the zonesDict cache (exists in Indigo as a device) before updating the state
@@ -613,7 +658,6 @@ class ad2usb(object):
         """
         self.logger.debug("call with isAdvanced:{}".format(ad2usbIsAdvanced))
 
-        lastPanelMsg = ""
         doNotProcessThisMessage = False  # default to process every message
         rawData = ""
         messageReadSuccessfully = False
@@ -624,9 +668,9 @@ class ad2usb(object):
             if self.stopReadingMessages is True:
                 return None
 
-            # read the data from IP, Serial, or File device
+            # read the data from the reader thread queue or the IP, Serial, or File device
             # will timeout set by k_SERIAL_TIMEOUT
-            rawData = self.panelReadWrapper(self.serialConnection)
+            rawData = self.__getNextPanelMessage()
 
             # the panelReadWrapper will return with an empty message when the
             # serial timeout is reached - ignore these and loop back to read
@@ -647,7 +691,16 @@ class ad2usb(object):
             #
 
             # added this code to begin to test the message Object
-            newMessageObject = AlarmDecoder.Message(rawData, self.firmwareVersion, self.logger)
+            # the message object may be shared from the cache so it must not be changed
+            newMessageObject = self.messageCache.getMessage(rawData, self.firmwareVersion, self.logger)
+
+            # check if this message acknowledges a command we sent
+            # keypad messages only acknowledge a keypad command if they are sent to the command's keypad
+            if (newMessageObject.messageType == 'KPM') and newMessageObject.isValidMessage:
+                self.ackTracker.messageReceived('KPM', newMessageObject.messageString,
+                                                newMessageObject.details.keypadMaskAsInt)
+            else:
+                self.ackTracker.messageReceived(newMessageObject.messageType, newMessageObject.messageString)
 
             # process select messages - return if we don't want to process
             # using old methods
@@ -656,9 +709,10 @@ class ad2usb(object):
                 messageReadSuccessfully = True
                 messageType = newMessageObject.messageType
 
-                # we first update the 'heartbeat' state - lastADMessage on all keypad devices
+                # we first note the time for the 'heartbeat' state - lastADMessage on all keypad devices
                 # Note: RFX messages continue to report when alarm is armed
-                self.plugin.updateLastADMessageOnKeypads()
+                # the keypads are updated from runConcurrentThread - see updateLastADMessageOnKeypads
+                self.plugin.markADMessageSeen()
 
                 if (newMessageObject.messageType == 'CONFIG') and newMessageObject.needsProcessing:
                     # store the current setting in the properties
@@ -772,20 +826,24 @@ class ad2usb(object):
         # Start LEGACY / OLD processing the message
         # Start by checking if this message is "Press * for faults"
         try:
-            if len(rawData) > 0 and rawData[0] == "[":  # A valid panel message
+            if (len(rawData) > 0) and (rawData[0] == "["):  # A keypad message
                 self.logger.debug(u"raw zone type is:{}".format(rawData[0:4]))
 
-                # First split the message into parts and see if we need to send a * to get the faults
-                splitMsg = re.split('[\[\],]', rawData)
-                msgText = splitMsg[7]
-                # Python 3 fix:
-                # was string.find(msgText, ' * ')
-                if msgText.find(' * ') >= 0:
+                # keypad messages are only split and decoded once - by the message parser
+                # the fields are read from the parsed message (which may be shared from the cache)
+                keypadMessage = newMessageObject.details
+
+                # First see if we need to send a * to get the faults
+                if not newMessageObject.isValidMessage:
+                    # the parser has already logged why the message is not valid
+                    pass
+
+                elif keypadMessage.isPressForFaultMessage:
                     self.logger.debug(u"Received a Press * message:{}".format(rawData))
-                    self.panelWriteWrapper(self.serialConnection, '*')
+                    self.queuePanelWrite('*', AD2USB_Constants.k_WRITE_PRIORITY_PRESS_STAR, '*')
                     # That's all we need to do for this messsage
 
-                elif rawData[30:38] == '00000000':
+                elif keypadMessage.isSystemMessage:
                     self.logger.debug(u"System Message: we passed on this one")
                     pass  # Ignore system messages (no keypad address)
 
@@ -801,57 +859,52 @@ class ad2usb(object):
                             foundKeypadAddress = panelKeypadAddress
                             readThisMessage = True
                         else:
-                            # The msg sub-string with the keypad addresses (in hex)
-                            keypadAddressField = rawData[30:38]
-                            # Convert the address field to a binary string
-                            addrHex = self.hex2bin(keypadAddressField)
-                            self.logger.debug(u"addrHex:{}".format(addrHex))
-                            for panelKeypadAddress in self.plugin.getAllKeypadAddresses():       # loop through the keypad device dict
-                                bitPosition = -1  # reset this each pass through the loop
-                                panelAddress = -1  # reset this each pass through the loop
-                                panelAddress = int(panelKeypadAddress)
-                                self.logger.debug(u"panelAddress:{}".format(panelAddress))
-                                # determine the bit position for the current address
-                                bitPosition = 8 - (panelAddress % 8) + int(panelAddress / 8) * 8
-                                self.logger.debug(u"bitPosition:{}, bit at bitPosition:{}".format(
-                                    bitPosition, addrHex[bitPosition-1]))
-                                if addrHex[bitPosition-1] == '1':                   # See if we have a one in our slot
-                                    self.logger.debug(u"matched key={}".format(panelKeypadAddress))
-                                    foundKeypadAddress = panelKeypadAddress
-                                    readThisMessage = True   # Yes, we can read this message
-                                    if foundAddress:
-                                        self.logger.error(u"more than one matching keypad address. previous:{}, current:{}".format(
-                                            lastAddress, panelKeypadAddress))
-                                    foundAddress = True
-                                    lastAddress = panelKeypadAddress
+                            # the keypad mask is decoded once by the message parser - cached messages share it
+                            keypadMask = keypadMessage.keypadMaskAsInt
+                            self.logger.debug(u"keypad mask:{:08x}".format(keypadMask))
+                            for panelKeypadAddress in self.plugin.getKeypadAddressesForMask(keypadMask):
+                                self.logger.debug(u"matched key={}".format(panelKeypadAddress))
+                                foundKeypadAddress = panelKeypadAddress
+                                readThisMessage = True   # Yes, we can read this message
+                                if foundAddress:
+                                    self.logger.error(u"more than one matching keypad address. previous:{}, current:{}".format(
+                                        lastAddress, panelKeypadAddress))
+                                foundAddress = True
+                                lastAddress = panelKeypadAddress
 
                     except Exception as keypadException:
-                        self.logger.error(u"Keypad Address keypadAddressField:{}, panelAddress:{}, bitPosition:{}".format(
-                            keypadAddressField, panelAddress, bitPosition))
+                        self.logger.error(u"Keypad Address keypadAddressField:{}".format(rawData[30:38]))
                         self.logger.error(u"Keypad Address Error:{}".format(keypadException))
 
                     if readThisMessage:
-                        # Now look to see if the message has changed since the last one we processed
-                        self.logger.debug(u"Panel Message: Before:{}".format(lastPanelMsg))
+                        # Example: [1000000100000000----]
+                        # 1 = READY                           10 = ALARM OCCURRED STICKY BIT (cleared 2nd disarm)
+                        # 2 = ARMED AWAY  <*                  11 = ALARM BELL (cleared 1st disarm)
+                        # 3 = ARMED HOME  <*                  12 = BATTERY LOW
+                        # 4 = BACK LIGHT                      13 = ENTRY DELAY OFF (ARMED INSTANT/MAX) <*
+                        # 5 = Programming Mode                14 = FIRE ALARM
+                        # 6 = Beep 1-7 ( 3 = beep 3 times )   15 = CHECK ZONE - TROUBLE
+                        # 7 = A ZONE OR ZONES ARE BYPASSED    16 = PERIMETER ONLY (ARMED STAY/NIGHT)
+                        # 8 = AC Power                        17 - 20 unused
+                        # 9 = CHIME MODE
+                        #
+                        # the ready and bypass flags are needed by the zone processing below for every message
+                        # panelFlags is the bit field with its brackets so the positions match the list above
+                        panelFlags = keypadMessage.bitField
+                        apReadyMode = panelFlags[1]
+                        apZonesBypassed = panelFlags[7]
+                        panelDevice = None
+
+                        # Now look to see if the message has changed since the last one we processed for this keypad
+                        lastKeypadMessage = self.lastKeypadMessages.get(foundKeypadAddress)
+                        self.logger.debug(u"Panel Message: Before:{}".format(lastKeypadMessage))
                         self.logger.debug(u"Panel Message: Current:{}".format(rawData))
-                        # If it hasn't, start again
-                        if rawData == lastPanelMsg:  # The alarm status has not changed
+                        # If it hasn't, skip the keypad updates - the keypad states already have these values
+                        if (lastKeypadMessage is not None) and (rawData == lastKeypadMessage):  # The alarm status has not changed
                             self.logger.debug(u"no panel status change")
+                            self.unchangedKeypadMessages += 1
                         else:
-                            # Example: [1000000100000000----]
-                            # 1 = READY                           10 = ALARM OCCURRED STICKY BIT (cleared 2nd disarm)
-                            # 2 = ARMED AWAY  <*                  11 = ALARM BELL (cleared 1st disarm)
-                            # 3 = ARMED HOME  <*                  12 = BATTERY LOW
-                            # 4 = BACK LIGHT                      13 = ENTRY DELAY OFF (ARMED INSTANT/MAX) <*
-                            # 5 = Programming Mode                14 = FIRE ALARM
-                            # 6 = Beep 1-7 ( 3 = beep 3 times )   15 = CHECK ZONE - TROUBLE
-                            # 7 = A ZONE OR ZONES ARE BYPASSED    16 = PERIMETER ONLY (ARMED STAY/NIGHT)
-                            # 8 = AC Power                        17 - 20 unused
-                            # 9 = CHIME MODE
-                            #
-                            panelFlags = rawData[0:23]
                             panelBitStatus = panelFlags[1:4]
-                            apReadyMode = panelFlags[1]
 
                             apArmedMode = '0'
                             armedMode = 'unArmed'
@@ -867,7 +920,6 @@ class ad2usb(object):
                                     armedMode = 'armedInstant'
 
                             apProgramMode = panelFlags[5]
-                            apZonesBypassed = panelFlags[7]
                             apACPower = self.__flagToBoolean(flag=panelFlags[8], defaultValue=True)
                             apChimeMode = panelFlags[9]
                             apAlarmOccurred = panelFlags[10]
@@ -878,7 +930,6 @@ class ad2usb(object):
 
                             self.logger.debug(u"Panel message:{}".format(panelFlags))
 
-                            lastPanelMsg = rawData
                             # panelDevice = indigo.devices[self.plugin.panelsDict[foundKeypadAddress]['devId']]
                             panelDevice = self.plugin.getKeypadDeviceForAddress(foundKeypadAddress)
                             self.logger.debug(u"Found dev:{}, id:{}".format(panelDevice.name, panelDevice.id))
@@ -886,44 +937,42 @@ class ad2usb(object):
                             # panelDevice = indigo.devices[self.plugin.alarmDevId]
                             # self.plugin.setKeypadDeviceState(panelDevice, panelState)
 
-                            now = datetime.now()
-                            timeStamp = now.strftime("%Y-%m-%d %H:%M:%S")
-
-                            self.plugin.setKeypadDeviceState(panelDevice, newMessageObject.attr('panelState'))
-
-                            panelDevice.updateStateOnServer(key='LCDLine1', value=rawData[61:77])
-                            panelDevice.updateStateOnServer(key='LCDLine2', value=rawData[77:93])
-                            panelDevice.updateStateOnServer(key='lastADMessage', value=timeStamp)
-                            panelDevice.updateStateOnServer(key='programMode', value=apProgramMode)
-                            panelDevice.updateStateOnServer(key='zonesBypassed', value=apZonesBypassed)
-                            panelDevice.updateStateOnServer(key='acPower', value=apACPower)
-                            panelDevice.updateStateOnServer(key='chimeMode', value=apChimeMode)
-                            panelDevice.updateStateOnServer(key='alarmOccurred', value=apAlarmOccurred)
-                            panelDevice.updateStateOnServer(key='alarmBellOn', value=apAlarmBellOn)
-                            panelDevice.updateStateOnServer(key='batteryLow', value=apBatteryLow)
-                            panelDevice.updateStateOnServer(key='fireAlarm', value=apFireAlarm)
-                            panelDevice.updateStateOnServer(key='checkZones', value=apCheckZones)
-                            panelDevice.updateStateOnServer(key='panelReady', value=apReadyMode)
-                            panelDevice.updateStateOnServer(key='panelArmed', value=apArmedMode)
-                            panelDevice.updateStateOnServer(key='armedMode', value=armedMode)
-                            panelDevice.updateStateOnServer(key='homeKitState', value=newMessageObject.attr('homeKitState'))
+                            # lastADMessage is kept current by the heartbeat - see updateLastADMessageOnKeypads
+                            keypadStates = {'panelState': newMessageObject.attr('panelState'),
+                                            'LCDLine1': rawData[61:77],
+                                            'LCDLine2': rawData[77:93],
+                                            'programMode': apProgramMode,
+                                            'zonesBypassed': apZonesBypassed,
+                                            'acPower': apACPower,
+                                            'chimeMode': apChimeMode,
+                                            'alarmOccurred': apAlarmOccurred,
+                                            'alarmBellOn': apAlarmBellOn,
+                                            'batteryLow': apBatteryLow,
+                                            'fireAlarm': apFireAlarm,
+                                            'checkZones': apCheckZones,
+                                            'panelReady': apReadyMode,
+                                            'panelArmed': apArmedMode,
+                                            'armedMode': armedMode,
+                                            'homeKitState': newMessageObject.attr('homeKitState')}
+
                             if apAlarmBellOn == '1' or apFireAlarm == 1:
-                                splitMsg = re.split('[\[\],]', rawData)
-                                # apAlarmedZone = int(splitMsg[3])  # try this as a string to deal with commercial panels
-                                apAlarmedZone = splitMsg[3]
-                                panelDevice.updateStateOnServer(key='alarmedZone', value=apAlarmedZone)
+                                # apAlarmedZone = int(numericCode)  # try this as a string to deal with commercial panels
+                                apAlarmedZone = keypadMessage.numericCode
+                                keypadStates['alarmedZone'] = apAlarmedZone
                                 if apAlarmBellOn == '1':
                                     self.logger.info("Alarm tripped by zone:{}".format(apAlarmedZone))
                                 else:
                                     self.logger.info("Fire alarm tripped by zone:{}".format(apAlarmedZone))
 
                             else:
-                                panelDevice.updateStateOnServer(key='alarmedZone', value='n/a')
-                                splitMsg = re.split('[\[\],]', rawData)
+                                keypadStates['alarmedZone'] = 'n/a'
+
+                            # only the states that changed are written - in one update
+                            self.updateKeypadStates(panelDevice, keypadStates)
 
                             # Catch an alarm tripped event
                             try:
-                                if rawData[61:74] == "DISARM SYSTEM":
+                                if keypadMessage.isAlarmTripped:
                                     now = datetime.now()
                                     timeStamp = now.strftime("%Y-%m-%d %H:%M:%S")
                                     partition = panelDevice.pluginProps['panelPartitionNumber']
@@ -932,9 +981,9 @@ class ad2usb(object):
                                     self.logger.debug(u"alarm tripped:{}, partition:{}, function:{}".format(
                                         user, partition, function))
 
-                                    panelDevice.updateStateOnServer(key='lastChgBy', value=user)
-                                    panelDevice.updateStateOnServer(key='lastChgTo', value=function)
-                                    panelDevice.updateStateOnServer(key='lastChgAt', value=timeStamp)
+                                    panelDevice.updateStatesOnServer([{'key': 'lastChgBy', 'value': user},
+                                                                      {'key': 'lastChgTo', 'value': function},
+                                                                      {'key': 'lastChgAt', 'value': timeStamp}])
                                     if self.plugin.logArmingEvents:
                                         self.logger.info(
                                             u"Alarm partition {} set to {} caused/entered by {}".format(partition, function, user))
@@ -943,26 +992,22 @@ class ad2usb(object):
                             except Exception as err:
                                 self.logger.error(u'ALARM TRIPPED:{}'.format(str(err)))
 
+                            # remember the message only after the keypad has been updated
+                            self.lastKeypadMessages[foundKeypadAddress] = rawData
+
                         # Setup some variables for the next few steps
-                        msgBitMap = splitMsg[1]
+                        msgText = keypadMessage.alphanumericKeypadMessage
+                        msgBitMap = keypadMessage.bitField[1:21]
 
-                        # Use the new KPM Message Object to avoid processing invalid numerics
-                        if newMessageObject.attr('isValidNumericCode'):
-                            msgZoneNum = int(splitMsg[3])
-                        else:
-                            msgZoneNum = 0
+                        # zoneNumberAsInt is 0 for invalid numerics
+                        msgZoneNum = keypadMessage.zoneNumberAsInt
 
-                        # see if message text contains a zone
+                        # see if message text contains a zone - the parser only reads it for BYPAS, FAULT and CHECK
                         validBypassZone = False
                         bMsgZoneNum = 0  # set to zero to reflect invalid bypass zone
-                        try:
-                            bMsgZoneNum = int(msgText[7:9])
+                        if keypadMessage.zoneFromMessage is not None:
+                            bMsgZoneNum = keypadMessage.zoneFromMessage
                             validBypassZone = True
-                        except:
-                            bMsgZoneNum = 0  # set to zero to reflect invalid bypass zone
-                            validBypassZone = False
-                            # 0fc = comm failure; 0f* = Field?
-                            # self.logError("%s: Panel reports: %s" % (funcName, msgText), self.logName)
 
                         msgKey = msgText[1:6]
                         self.logger.debug(u"msgKey is:{}, msgTxt is:{}, msgBitMap:{}, msgZoneNum:{}, bMsgZoneNum:{}, validBypassZone:{}".format(
@@ -1040,6 +1085,9 @@ class ad2usb(object):
                             if msgKey == "FAULT" or apReadyMode == '1':
                                 if msgZoneNum != 0:
                                     self.logger.debug(u"ready to call basic msg handler")
+                                    # the keypad device is only looked up above when the message changed
+                                    if panelDevice is None:
+                                        panelDevice = self.plugin.getKeypadDeviceForAddress(foundKeypadAddress)
                                     self.basicReadZoneMessage(rawData, msgBitMap, msgZoneNum,
                                                               msgText, msgKey, panelDevice)
 
@@ -1140,6 +1188,10 @@ class ad2usb(object):
             self.stopReadingMessages = True
             self.isCommStarted = False
 
+            self.stopMessageReader()
+            self.commandWriter.stop(timeout=k_SERIAL_TIMEOUT)
+            self.triggerExecutor.stop(timeout=k_SERIAL_TIMEOUT)
+
             if self.serialConnection is not None:
                 self.logger.debug(u'serial connection is some object:{}'.format(self.serialConnection))
 
@@ -1178,7 +1230,7 @@ class ad2usb(object):
                     # send message to AlarmDecoder
                     configCommand = kADCommands['CONFIG']
                     self.logger.debug(u'attempting to send CONFIG command:{} to AlarmDecoder'.format(configCommand))
-                    self.panelWriteWrapper(self.serialConnection, configCommand)
+                    self.queuePanelWrite(configCommand, AD2USB_Constants.k_WRITE_PRIORITY_COMMAND, 'CONFIG')
                     self.logger.debug(u'sent CONFIG command to AlarmDecoder')
 
                     return True
@@ -1216,7 +1268,7 @@ class ad2usb(object):
                     # send message to AlarmDecoder
                     verCommand = kADCommands['VER']
                     self.logger.debug(u'attempting to send VER command:{} to AlarmDecoder'.format(verCommand))
-                    self.panelWriteWrapper(self.serialConnection, verCommand)
+                    self.queuePanelWrite(verCommand, AD2USB_Constants.k_WRITE_PRIORITY_COMMAND, 'VER')
                     self.logger.debug(u"VER command sent...")
                     return True
 
@@ -1251,7 +1303,7 @@ class ad2usb(object):
                         self.logger.debug(
                             u'attempting to update CONFIG settings:{} to AlarmDecoder'.format(configString))
 
-                        if self.panelWriteWrapper(self.serialConnection, configString):
+                        if self.queuePanelWrite(configString, AD2USB_Constants.k_WRITE_PRIORITY_COMMAND):
                             self.plugin.hasAlarmDecoderConfigBeenRead = False
                             self.logger.debug('AlarmDecoder CONFIG written successfully')
                             return True
@@ -1372,10 +1424,10 @@ class ad2usb(object):
         """
         This method is used to read alarm panel messages from a text file instead of the AlarmDecoder.
         It is used for testing and debugging. It will read the panel message playback file and
-        return a single message (line). It uses internal variable to keep track of the current line.
-        It expects the playback file to be in the **EXACT** format as the panel message log:
-        *datetime | panel_message_string* *BUT* will also allow a line to being with '#' that
-        will be skipped.
+        return a single message (line). The file is kept open between calls by a PanelMessagePlayback
+        object so it is only read once. It expects the playback file to be in the **EXACT** format
+        as the panel message log: *datetime | panel_message_string* *BUT* will also allow a line
+        to being with '#' that will be skipped.
 
         Return a string that is a panel message as if it was from the AlarmDecoder
         """
@@ -1383,13 +1435,7 @@ class ad2usb(object):
 
         try:
             # define all vars used in exception now
-            # TO DO: this is inefficient but simple - may need to improve
-            lineNumber = 0
             playbackCurrentMessage = ''
-            line = ''
-
-            # set the flag to catch we have read the entire file to true
-            didReadEntireFile = True
 
             if not self.__doesPlaybackFileExist():
                 self.logger.error("Unable to read playback file:{}".format(fileName))
@@ -1397,67 +1443,27 @@ class ad2usb(object):
                 self.stopReadingMessages = True
                 return ''
 
-            with open(fileName, 'rt') as f:
-                self.logger.debug(u'reading file:{}...'.format(fileName))
-
-                for lineNumber, line in enumerate(f):
-                    # increment the line number - first line is 1
-                    lineNumber += 1
-
-                    # check if current line number is > last read number (the next line after last read)
-                    if lineNumber > self.playbackLastLineNumberRead:
-
-                        self.logger.debug(u'reading line number:{}...'.format(lineNumber))
-                        self.logger.debug(u'line:{}'.format(line))
-
-                        # increment the last line number read
-                        self.playbackLastLineNumberRead += 1
+            # open the file on the first read or if the file name has changed
+            if (self.playbackReader is None) or (self.playbackReader.fileName != fileName):
+                if self.playbackReader is not None:
+                    self.playbackReader.close()
+                self.playbackReader = AD2USB_Playback.PanelMessagePlayback(fileName=fileName, logger=self.logger)
+                self.playbackClock.setSpeed(self.plugin.playbackSpeed)
 
-                        # we've read up to the last line so set the flag to False
-                        didReadEntireFile = False
-
-                        # skip the line if its a comment
-                        if line.startswith('#'):
-                            pass
-                            # we don't break here so we just read the next comment
-
-                        # lines that start with ~ are test comments to log to Indigo Log Window
-                        elif line.startswith('~'):
-                            self.logger.info(line.strip())
-                            pass
-                            # we don't break here so we just read the next comment
-
-                        # else process it
-                        else:
-                            # split on the "|" and strip the whitespace from the message part of the file
-                            lineItems = re.split(r'\|', line)
-                            playbackCurrentMessage = lineItems[1].strip()
-
-                            # because this is used for testing and is SO FAST
-                            # we sleep for a set time before returning the message
-                            # unless its countdown timer and then we sleep only 1 sec
-                            if "May Exit Now" in playbackCurrentMessage:
-                                time.sleep(1)
-                            else:
-                                time.sleep(self.playbackSleepTime)
-
-                            # end the for loop we have the one line we're interested
-                            break
-
-                    else:
-                        # do nothing since we've already processed this line
-                        pass
-
-                # end for loop
-
-            # close the file
-            f.close()
+            playbackCurrentMessage = self.playbackReader.readMessage()
+            self.playbackLastLineNumberRead = self.playbackReader.lineNumber
+            self.playbackLastFileNameRead = self.playbackReader.messageFileName
 
             # see if we've read the entire file; if so we tell the plugin to shutdown
-            if didReadEntireFile:
+            if playbackCurrentMessage is None:
                 self.logger.debug(u'file has been read - will initiate shutdown')
                 self.stopReadingMessages = True
                 self.hasPlaybackFileBeenRead = True
+                return ''
+
+            # because this is used for testing and is SO FAST we pause before returning the message
+            # either a fixed time or based on the message timestamps - see Playback speed in Configure
+            self.playbackClock.waitForMessage(self.playbackReader.messageTime, playbackCurrentMessage)
 
             # return the message string
             self.logger.debug(u'returning message:{}'.format(playbackCurrentMessage))
@@ -1465,7 +1471,8 @@ class ad2usb(object):
 
         except Exception as err:
             self.logger.error(
-                u"Error reading from AlarmPanel filename:{}, line ({}):{} - error:{}".format(fileName, lineNumber, line, str(err)))
+                u"Error reading from AlarmPanel filename:{}, line ({}) - error:{}".format(
+                    self.playbackLastFileNameRead or fileName, self.playbackLastLineNumberRead, str(err)))
             return ''
 
     def panelReadWrapper(self, serialObject):
@@ -1499,14 +1506,22 @@ class ad2usb(object):
                 if self.plugin.pythonVersion == 3:
                     self.logger.debug(u'attempting to read from the AlarmDecoder')
 
-                    # convert str to bytes for writing in Python 3
-                    myErrorMessage = 'reading bytes from serial object'
-                    panelMessageInBytes = serialObject.readline()
+                    # the async transport splits lines itself so we read a line at a time
+                    if self.plugin.isAsyncTransportEnabled:
+                        # convert str to bytes for writing in Python 3
+                        myErrorMessage = 'reading bytes from serial object'
+                        panelMessageInBytes = serialObject.readline()
+
+                        myErrorMessage = 'decoding bytes to string'
+                        panelMessageAsString = panelMessageInBytes.decode("utf8")
+
+                        self.logger.debug(u"read from AlarmDecoder (Python 3) bytes:{}".format(panelMessageInBytes))
 
-                    myErrorMessage = 'decoding bytes to string'
-                    panelMessageAsString = panelMessageInBytes.decode("utf8")
+                    # otherwise read whatever is waiting in chunks and split it into lines
+                    else:
+                        myErrorMessage = 'reading chunks from serial object'
+                        panelMessageAsString = self.__readLineFromChunks(serialObject)
 
-                    self.logger.debug(u"read from AlarmDecoder (Python 3) bytes:{}".format(panelMessageInBytes))
                     self.logger.debug(u"read from AlarmDecoder (Python 3):{}".format(panelMessageAsString))
                 else:
                     myErrorMessage = 'reading string from serial object'
@@ -1528,6 +1543,25 @@ class ad2usb(object):
             # return a blank message that will be skipped
             return ''
 
+    def queuePanelWrite(self, message='', priority=AD2USB_Constants.k_WRITE_PRIORITY_KEYPAD, coalesceKey=None):
+        """
+        Queues a message to be written to the AlarmDecoder by the writer thread. Messages with a
+        higher priority (lower number) are written first. A message with a coalesceKey replaces any
+        message with the same key still waiting to be written. If the writer thread is not running
+        the message is written immediately.
+
+        Returns True if queued (or written) successfully; False otherwise
+
+        **parameters:**
+        message -- the string to write
+        priority -- one of the AD2USB_Constants k_WRITE_PRIORITY values
+        coalesceKey -- optional key used to replace a waiting message (e.g. '*' or 'L05')
+        """
+        if self.commandWriter.isRunning():
+            return self.commandWriter.queueCommand(message, priority, coalesceKey)
+
+        return self.panelWriteWrapper(self.serialConnection, message)
+
     def panelWriteWrapper(self, serialObject, message=''):
         """
         this is a wrapper to support Python 2 and 3 serial communications. Python 2 is a string. Python 3 is bytes and must be encoded.
@@ -1566,6 +1600,129 @@ class ad2usb(object):
                 u"Error writing to AlarmPanel:{} - error:{}".format(myErrorMessage, str(err)))
             return False
 
+    def startMessageReader(self):
+        """
+        Starts a background thread that reads messages from the AlarmDecoder onto a queue.
+        panelMsgRead will then process messages from the queue instead of reading the connection.
+        The reader is not used in Playback mode.
+        """
+        self.logger.debug(u'called')
+
+        if self.plugin.isPlaybackCommunicationModeSet:
+            self.logger.debug(u'Panel message playback mode set - reader thread not started')
+            return
+
+        if self.messageReader is None:
+            self.messageReader = AD2USB_Reader.PanelMessageReader(
+                readMethod=self.__readFromConnection, isReadyMethod=self.__isConnectionReadable, logger=self.logger)
+
+        self.messageReader.start()
+
+    def stopMessageReader(self):
+        """
+        Stops the background reader thread if it is running. Any messages still queued are discarded.
+        """
+        self.logger.debug(u'called')
+
+        if self.messageReader is not None:
+            self.messageReader.stop(timeout=k_SERIAL_TIMEOUT + 1)
+            self.messageReader = None
+
+    def getMessageReaderStatistics(self):
+        """
+        Returns a dictionary of the reader thread queue statistics or None if the reader is not used
+        """
+        if self.messageReader is None:
+            return None
+
+        return self.messageReader.getStatistics()
+
+    def getAckStatistics(self):
+        """
+        Returns a dictionary of command acknowledgement counts and round trip times
+        """
+        return self.ackTracker.getStatistics()
+
+    def getMessageCacheStatistics(self):
+        """
+        Returns a dictionary of parsed message cache hits, misses and evictions
+        """
+        return self.messageCache.getStatistics()
+
+    def clearLastKeypadMessages(self):
+        """
+        Forgets the last keypad message and states for every keypad so the next message updates all the keypad states
+        """
+        self.lastKeypadMessages.clear()
+        self.lastKeypadStates.clear()
+
+    def getKeypadChangeStatistics(self):
+        """
+        Returns a dictionary of the number of keypad messages skipped because they had not changed and
+        the number of keypad state writes skipped because the state value had not changed
+        """
+        return {'unchangedKeypadMessages': self.unchangedKeypadMessages, 'keypadsTracked': len(self.lastKeypadMessages),
+                'keypadStatesWritten': self.keypadStatesWritten, 'keypadStatesUnchanged': self.keypadStatesUnchanged}
+
+    def updateKeypadStates(self, keypadDevice, keypadStates):
+        """
+        Writes the keypad states that are different from the last values written to the keypad device.
+        The panelState is set with setKeypadDeviceState so the state icon is also updated. All the other
+        changed states are written with one updateStatesOnServer call.
+
+        **parameters:**
+        keypadDevice -- the Indigo keypad device
+        keypadStates -- dictionary of state key and new value
+        """
+        lastStates = self.lastKeypadStates.setdefault(keypadDevice.id, {})
+
+        changedStates = []
+        for key, value in keypadStates.items():
+            if (key in lastStates) and (lastStates[key] == value):
+                self.keypadStatesUnchanged += 1
+                continue
+
+            self.keypadStatesWritten += 1
+            if key == 'panelState':
+                self.plugin.setKeypadDeviceState(keypadDevice, value)
+            else:
+                changedStates.append({'key': key, 'value': value})
+
+        if len(changedStates) > 0:
+            keypadDevice.updateStatesOnServer(changedStates)
+
+        # remember the values only after they have been written
+        lastStates.update(keypadStates)
+
+    def getReadBufferDepth(self):
+        """
+        Returns the number of messages waiting on the reader thread queue if the reader is running;
+        otherwise the number of bytes received from the AlarmDecoder that are waiting to be read.
+        Returns 0 in Playback mode, if there is no serial connection, or if there are any errors.
+        """
+        try:
+            if (self.messageReader is not None) and self.messageReader.isRunning():
+                return self.messageReader.getQueueDepth()
+
+            if self.plugin.isPlaybackCommunicationModeSet or (self.serialConnection is None):
+                return 0
+
+            # the async transport counts its complete lines waiting
+            if self.plugin.isAsyncTransportEnabled:
+                return self.serialConnection.in_waiting
+
+            bytesWaiting = self.__getBytesWaiting(self.serialConnection)
+
+            # include complete lines already read from the connection and waiting in the framer
+            if self.lineFramer.hasLine():
+                return bytesWaiting + len(self.lineFramer.buffer)
+
+            return bytesWaiting
+
+        except Exception as err:
+            self.logger.debug(u"unable to determine read buffer depth - error:{}".format(str(err)))
+            return 0
+
     def getURL(self):
         """
         returns the URL value from the plugin
@@ -1594,6 +1751,13 @@ class ad2usb(object):
         """
         self.logger.debug(u'called')
 
+        # only one thread at a time can open or reset the connection
+        with self.connectionLock:
+            return self.__openSerialConnection(forceReset)
+
+    def __openSerialConnection(self, forceReset=False):
+        # see setSerialConnection - must be called with connectionLock held
+
         try:
             # return True and set serialConnection to None if in Playback mode
             # unless the file has been read and then send a False
@@ -1648,11 +1812,20 @@ class ad2usb(object):
             self.logger.info(u"attempting to connect to:{}".format(theURL))
 
             # attempt to create a new serial object and connect
-            self.serialConnection = serial.serial_for_url(theURL, baudrate=115200)
+            # the optional async transport has the same interface as the serial object
+            if self.plugin.isAsyncTransportEnabled:
+                self.serialConnection = AD2USB_AsyncTransport.AsyncTransport(
+                    url=theURL, baudrate=115200, logger=self.logger,
+                    handshakeCommands=[kADCommands['VER'], kADCommands['CONFIG']])
+            else:
+                self.serialConnection = serial.serial_for_url(theURL, baudrate=115200)
 
             # set a timeout to not wait indefinitely on readline
             self.serialConnection.timeout = k_SERIAL_TIMEOUT
 
+            # any partial line from the old connection will never be completed
+            self.lineFramer.clear()
+
             # log and return success
             self.isCommStarted = True
             self.logger.info(u"connected to AlarmDecoder:{}".format(theURL))
@@ -1894,66 +2067,151 @@ class ad2usb(object):
         except Exception as err:
             self.logger.error(u"LRR Error:{}".format(str(err)))
 
+    def __getNextPanelMessage(self):
+        """
+        Returns the next panel message from the reader thread queue if the reader is running or
+        reads it directly from the AlarmDecoder (or playback file). Returns an empty string on timeout.
+        """
+        if (self.messageReader is not None) and self.messageReader.isRunning():
+            queuedMessage = self.messageReader.getMessage(timeout=k_SERIAL_TIMEOUT)
+            if queuedMessage is None:
+                return ''
+
+            return queuedMessage[1]
+
+        return self.panelReadWrapper(self.serialConnection)
+
+    def __readLineFromChunks(self, serialObject):
+        """
+        Returns the next complete line read from the serial object or an empty string if no complete
+        line arrives before the serial timeout. Reads everything waiting on the connection in one call
+        and keeps any partial line in the line framer for the next read.
+
+        **parameters:**
+        serialObject -- a pyserial object
+        """
+        # return a line already read by an earlier chunk
+        panelMessageAsString = self.lineFramer.getLine()
+        if panelMessageAsString is not None:
+            return panelMessageAsString
+
+        deadline = time.time() + k_SERIAL_TIMEOUT
+        while True:
+            # read what has arrived or wait (up to the serial timeout) for at least one byte
+            self.lineFramer.feed(self.__readChunk(serialObject))
+
+            panelMessageAsString = self.lineFramer.getLine()
+            if panelMessageAsString is not None:
+                return panelMessageAsString
+
+            # timeout - any partial line is kept for the next read
+            if time.time() >= deadline:
+                return ''
+
+    def __readChunk(self, serialObject):
+        """
+        Returns the bytes that have arrived on the connection - up to k_READ_CHUNK_SIZE bytes - waiting up to
+        the serial timeout for the first byte. Returns empty bytes on timeout.
+
+        **parameters:**
+        serialObject -- a pyserial object
+        """
+        # pyserial's read() waits until all the bytes asked for arrive (or the timeout) and its in_waiting
+        # is only 0 or 1 for a socket:// (IP) connection - so wait for the socket or serial port to be
+        # readable and read what has arrived from it directly
+        socketObject = getattr(serialObject, '_socket', None)
+        if socketObject is not None:
+            isReady, _, _ = select.select([socketObject], [], [], serialObject.timeout)
+            if not isReady:
+                return b''
+
+            data = socketObject.recv(k_READ_CHUNK_SIZE)
+            if len(data) == 0:
+                raise serial.SerialException('socket disconnected')
+
+            return data
+
+        fileDescriptor = serialObject.fileno()
+        isReady, _, _ = select.select([fileDescriptor], [], [], serialObject.timeout)
+        if not isReady:
+            return b''
+
+        data = os.read(fileDescriptor, k_READ_CHUNK_SIZE)
+        if len(data) == 0:
+            raise serial.SerialException('serial port reports readiness to read but returned no data')
+
+        return data
+
+    def __getBytesWaiting(self, serialObject):
+        """
+        Returns the number of bytes received on the connection that have not been read yet
+
+        **parameters:**
+        serialObject -- a pyserial object
+        """
+        # pyserial's in_waiting is only 0 or 1 for a socket:// (IP) connection so ask the socket
+        socketObject = getattr(serialObject, '_socket', None)
+        if socketObject is not None:
+            return struct.unpack('I', fcntl.ioctl(socketObject.fileno(), termios.FIONREAD, b'\0\0\0\0'))[0]
+
+        return serialObject.in_waiting
+
+    def __writeToConnection(self, message):
+        # used by the writer thread
+        return self.panelWriteWrapper(self.serialConnection, message)
+
+    def __readFromConnection(self):
+        # used by the reader thread
+        return self.panelReadWrapper(self.serialConnection)
+
+    def __isConnectionReadable(self):
+        # used by the reader thread to wait for the connection
+        return self.isCommStarted and (self.serialConnection is not None)
+
     def __doesPlaybackFileExist(self):
         """
-        Checks if Playback file exists.
+        Checks if Playback file exists. The playback file name can also be a folder or glob pattern.
 
         Returns True if exists; False otherwise.
         """
-        if os.path.isfile(self.plugin.panelMessagePlaybackFilename):
+        # the files are only looked up until playback has started
+        if (self.playbackReader is not None) and (self.playbackReader.fileName == self.plugin.panelMessagePlaybackFilename):
+            return True
+
+        if len(AD2USB_Playback.findPlaybackFiles(self.plugin.panelMessagePlaybackFilename)) > 0:
             return True
         else:
             return False
 
     def updateZoneFaultListForKeypad(self, keypad=None, addZone=None, removeZone=None):
         """
-        Adds or removes an element to the zoneStatDict property for a given keypad.
-        Ensure the property is an array of integers that is sorted and unique.
+        Adds or removes a zone in the zoneStateDict property for a given keypad. Each keypad has a
+        ZoneFaultList so the zones are always sorted and unique.
         """
         # initialize the list for the keypad if needed
         if keypad not in self.zoneStateDict:
-            self.zoneStateDict[keypad] = []
+            self.zoneStateDict[keypad] = AD2USB_Zones.ZoneFaultList()
 
         # lets try to add first
         try:
             # skip if None
             if addZone is not None:
-                # convert to an Int
-                addAsInt = int(addZone)
-                # don't add a zero or negative
-                if addAsInt > 0:
-                    self.zoneStateDict[keypad].append(addAsInt)
+                # zero or negative zones are not added
+                self.zoneStateDict[keypad].add(int(addZone))
 
         except Exception as err:
             self.logger.warning("Unable to add zone to fault list:{}, msg:{}".format(addZone, str(err)))
 
-        # next we we unique the list
-        # initialize a null list
-        unique_list = []
-
-        # traverse for all elements
-        for x in self.zoneStateDict[keypad]:
-            # check if exists in unique_list or not
-            if x not in unique_list:
-                unique_list.append(x)
-
         # next lets try to remove
         try:
             # skip if None
             if removeZone is not None:
-                # convert to an Int
-                removeAsInt = int(removeZone)
-                # only remove if it exists
-                if removeAsInt in unique_list:
-                    unique_list.remove(removeAsInt)
+                # only removed if it exists
+                self.zoneStateDict[keypad].remove(int(removeZone))
 
         except Exception as err:
             self.logger.warning("Unable to remove zone from fault list:{}, msg:{}".format(removeZone, str(err)))
 
-        # replace the property with the sorted uniq list
-        unique_list.sort()
-        self.zoneStateDict[keypad] = unique_list.copy()
-
     def __convertToPaddedKeypadAddress(self, keypadAddressString=''):
         """
         Takes a string and returns a valid two-digit keypad address as a string. Will be
@@ -1996,6 +2254,20 @@ class ad2usb(object):
         else:
             return defaultValue
 
+    def getUserSetForTrigger(self, name='', userString=''):
+        """
+        Returns the User Numbers in a Trigger users string as a frozenset of integer or None if the users
+        string is an Indigo variable - a variable can change so it is read each time the Trigger is checked.
+
+        **parameters:**
+        name -- the Trigger name used in log messages
+        userString -- the users string from the Trigger
+        """
+        if re.search(r'^%%v:\d+%%$', userString.strip()) is not None:
+            return None
+
+        return frozenset(self.__convertUsersStringToList(name=name, userString=userString))
+
     def __convertUsersStringToList(self, name='', userString=''):
         """
         Takes a string or Indigo variable 'userString' and returns an array of integer that represent User Numbers
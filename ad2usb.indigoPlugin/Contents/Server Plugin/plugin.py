@@ -14,7 +14,10 @@ import sys
 import indigo   # Not needed. But it supresses lint errors
 from ad2usb import ad2usb
 import AD2USB_OTP
+import AD2USB_Playback
 import AD2USB_Constants  # Global Constants
+import AlarmDecoder
+import AD2USB_Zones
 
 ################################################################################
 # Now, Let's get started...
@@ -39,8 +42,9 @@ class Plugin(indigo.PluginBase):
             self.pythonVersion = 3
 
         # set the default debug playback file name and status
-        self.panelMessagePlaybackFilename = indigo.server.getLogsFolderPath(
+        self.panelMessagePlaybackDefaultFilename = indigo.server.getLogsFolderPath(
             pluginId=self.pluginId) + "/" + "panelMessagePlayback.txt"
+        self.panelMessagePlaybackFilename = self.panelMessagePlaybackDefaultFilename
         self.isPlaybackCommunicationModeSet = False  # flag for settings in Configure
 
         # call method to upgrade (if needed) and get preferences
@@ -74,11 +78,26 @@ class Plugin(indigo.PluginBase):
         self.lastZoneFaulted = 0
         self.zonesDict = {}
         self.advZonesDict = {}
+
+        # zone number (string and int) to device id for Alarm Zone and Virtual Zone devices
+        # built in startup - see __buildZoneIndex
+        self.zoneNumberIndex = {}
+        self.zoneNumberAsIntIndex = {}
+
+        # zone number (string and int) to the list of device ids with that zone number in the order found
+        # and device id to its zone number - so a device can be moved or removed without scanning the devices
+        self.zoneNumberDevices = {}
+        self.zoneNumberAsIntDevices = {}
+        self.zoneNumberForDevice = {}
+
         self.virtualDict = {}
         self.zoneGroup2zoneDict = {}
         self.zone2zoneGroupDevDict = {}
         self.triggerCache = {}
 
+        # (event, partition) to a tuple of trigger ids in the trigger cache - see __addTriggerToDispatch
+        self.triggerDispatch = {}
+
         self.pluginDisplayName = pluginDisplayName
         self.pluginPrefs = pluginPrefs
 
@@ -90,6 +109,20 @@ class Plugin(indigo.PluginBase):
         self.previousOTPValues = []
         self.OTPAttempts = []
 
+        # largest backlog seen on the AlarmDecoder connection or reader queue in drain mode
+        self.readBacklogHighWater = 0
+
+        # keypad device ids by address and partition - see __getKeypadRegistry
+        self.keypadRegistry = None
+
+        # zone number to zone groups and the faulted zones of each zone group - see __getZoneGroupIndex
+        self.zoneGroupIndex = None
+
+        # the heartbeat state lastADMessage is written at most every heartbeatInterval seconds
+        # see markADMessageSeen and updateLastADMessageOnKeypads
+        self.lastADMessageSeenTime = None
+        self.lastADMessageUpdateTime = 0.0
+
         # adding new logging object introduced in API 2.0
         self.logger.info(u"Plugin init completed")
 
@@ -106,6 +139,9 @@ class Plugin(indigo.PluginBase):
         self.zonesDict = {}
         self.advZonesDict = {}
 
+        # zone number (string and int) to device id for Alarm Zone and Virtual Zone devices
+        self.__buildZoneIndex()
+
         mode = 'Basic'
         if self.ad2usbIsAdvanced:
             mode = 'Advanced'
@@ -149,6 +185,9 @@ class Plugin(indigo.PluginBase):
         # Always load the basic Dict because we need a zone number to device lookup in advanced mode too.
         self.basicBuildDevDict(dev, 'add', self.ad2usbKeyPadAddress)
 
+        # the zone number may have been edited while the device was stopped
+        self.__addDeviceToZoneIndex(dev)
+
         if self.ad2usbIsAdvanced:
             self.advancedBuildDevDict(dev, 'add', self.ad2usbKeyPadAddress)
 
@@ -177,8 +216,16 @@ class Plugin(indigo.PluginBase):
                 if 'lastBatteryRestore' not in localStates:
                     dev.stateListOrDisplayStateIdChanged()
 
+        # a started zone group may have new zones - the next zone change recalculates every zone group
+        if dev.deviceTypeId == 'zoneGroup':
+            self.invalidateZoneGroupIndex()
+
         if dev.deviceTypeId == 'ad2usbInterface':
 
+            # the keypad address or states may have changed so the next keypad message updates every state
+            self.ad2usb.clearLastKeypadMessages()
+            self.invalidateKeypadRegistry()
+
             # migrate for version 3.1.0 state from old displayState to panelState
             if dev.displayStateId == 'displayState':
                 # refresh from updated Devices.xml
@@ -240,8 +287,53 @@ class Plugin(indigo.PluginBase):
             except Exception as err:
                 self.logger.error(u"advancedBuildDevDict error: {}".format(err))
 
+        # a stopped keypad is no longer returned by the keypad lookups
+        if dev.deviceTypeId == 'ad2usbInterface':
+            self.invalidateKeypadRegistry()
+
+        # a stopped zone group is no longer updated when its zones change
+        if dev.deviceTypeId == 'zoneGroup':
+            self.invalidateZoneGroupIndex()
+
+        # the device stays in the zone index since disabled devices can still be found by zone number
+        # it is removed from the index in deviceDeleted
         self.logger.info("Device stop completed for {}".format(dev.name))
 
+    ########################################################
+    def deviceUpdated(self, origDev, newDev):
+        # let Indigo restart the device if a communication property changed
+        indigo.PluginBase.deviceUpdated(self, origDev, newDev)
+
+        # deviceUpdated is also called for every state change - only update the zone index when the zone number changes
+        if origDev.pluginProps.get('zoneNumber') != newDev.pluginProps.get('zoneNumber'):
+            self.logger.debug(u"zone number changed for device:{}".format(newDev.name))
+            self.__addDeviceToZoneIndex(newDev)
+            self.invalidateZoneGroupIndex()
+
+        # rebuild the zone group index if the zones in a zone group were edited
+        if newDev.deviceTypeId == 'zoneGroup':
+            if origDev.pluginProps.get('zoneDeviceList') != newDev.pluginProps.get('zoneDeviceList'):
+                self.invalidateZoneGroupIndex()
+
+        # rebuild the keypad registry if a keypad address or partition was edited or a keypad was enabled or disabled
+        if newDev.deviceTypeId == 'ad2usbInterface':
+            if ((origDev.pluginProps.get('panelKeypadAddress') != newDev.pluginProps.get('panelKeypadAddress'))
+                    or (origDev.pluginProps.get('panelPartitionNumber') != newDev.pluginProps.get('panelPartitionNumber'))
+                    or (origDev.enabled != newDev.enabled)):
+                self.invalidateKeypadRegistry()
+
+    ########################################################
+    def deviceDeleted(self, dev):
+        indigo.PluginBase.deviceDeleted(self, dev)
+
+        self.__removeDeviceFromZoneIndex(dev.id)
+
+        if dev.deviceTypeId == 'ad2usbInterface':
+            self.invalidateKeypadRegistry()
+        else:
+            # a deleted zone or zone group changes the zone group states
+            self.invalidateZoneGroupIndex()
+
     ########################################################
     # start/stop/restart Calls from Indigo
     ########################################################
@@ -267,6 +359,10 @@ class Plugin(indigo.PluginBase):
             self.ad2usb.stopReadingMessages = False
             failedCounter = 1
 
+            # start the reader thread if enabled - messages are then processed from its queue
+            if self.isReaderThreadEnabled:
+                self.ad2usb.startMessageReader()
+
             while True and (failedCounter < 50):
                 # is communicaiton to AlarmDecoder OK?
                 if self.ad2usb.isCommStarted:
@@ -282,7 +378,10 @@ class Plugin(indigo.PluginBase):
                         # add code to ensure we have 1 keypad device before reading
                         # errors are generated in the method if no keypad exists
                         if len(self.getAllKeypadDevices()) > 0:
-                            self.ad2usb.panelMsgRead(self.ad2usbIsAdvanced)
+                            if self.isBurstDrainEnabled:
+                                self.__drainPanelMessages()
+                            else:
+                                self.ad2usb.panelMsgRead(self.ad2usbIsAdvanced)
 
                     # TO DO: FUTURE
                     # newMessage = self.ad2usb.newReadMessage()
@@ -307,14 +406,18 @@ class Plugin(indigo.PluginBase):
                             self.logger.error(
                                 'Unable to re-establish communications - check AlarmDecoder and Plugin Configure settings')
 
-                # built in sleep
-                self.sleep(0.5)
+                # write the heartbeat to the keypads if a message was seen and the interval has passed
+                self.updateLastADMessageOnKeypads()
+
+                # built in sleep - in drain mode we only get here once the read buffer is empty
+                self.sleep(AD2USB_Constants.k_READ_LOOP_SLEEP)
 
             # failed counter > 50
             self.logger.error('AlarmDecoder communication fail count exceeded 50 consecutive times')
 
         except self.StopThread:
             self.ad2usb.stopReadingMessages = True
+            self.ad2usb.stopMessageReader()
             self.logger.info('AlarmDecoder StopThread received')
             pass    # Optionally catch the StopThread exception and do any needed cleanup.
 
@@ -323,6 +426,50 @@ class Plugin(indigo.PluginBase):
 
         self.logger.info(u"runConcurrentThread completed")
 
+    ########################################################
+    def __drainPanelMessages(self):
+        """
+        Reads and processes one panel message and then keeps reading and processing messages
+        as long as data is still buffered on the AlarmDecoder connection. This lets bursts of
+        messages (alarms, arming, etc.) be processed without sleeping between each message.
+        Raises StopThread if Indigo has asked the concurrent thread to stop.
+
+        Returns the number of messages read
+        """
+        messagesRead = 0
+        burstBacklog = 0
+
+        while True:
+            self.ad2usb.panelMsgRead(self.ad2usbIsAdvanced)
+            messagesRead += 1
+
+            # stop draining when the buffer is empty or reading has been stopped
+            backlog = self.ad2usb.getReadBufferDepth()
+            if (backlog == 0) or self.ad2usb.stopReadingMessages:
+                break
+
+            if backlog > burstBacklog:
+                burstBacklog = backlog
+
+            # stay responsive to a plugin shutdown or restart during a long burst
+            if self.stopThread:
+                raise self.StopThread
+
+            # keep the heartbeat current during a long burst
+            self.updateLastADMessageOnKeypads()
+
+        if messagesRead > 1:
+            self.logger.debug(u"drained {} messages - read backlog was {}".format(messagesRead, burstBacklog))
+
+        # track and report the largest backlog seen
+        # backlog is queued messages if the reader thread is running or bytes waiting if not
+        if burstBacklog > self.readBacklogHighWater:
+            self.readBacklogHighWater = burstBacklog
+            self.logger.info(u"New maximum AlarmDecoder read backlog:{} ({} messages processed in burst)".format(
+                burstBacklog, messagesRead))
+
+        return messagesRead
+
     ########################################################
     # def stopConcurrentThread(self):
     #     self.logger.debug(u"Called")
@@ -387,7 +534,7 @@ class Plugin(indigo.PluginBase):
             # TO DO: remove this code block below to reference all current keypad devices
             if not self.ad2usb.zoneListInit:
                 for address in self.getAllKeypadAddresses():
-                    self.ad2usb.zoneStateDict[address] = []
+                    self.ad2usb.zoneStateDict[address] = AD2USB_Zones.ZoneFaultList()
                 self.ad2usb.zoneListInit = True
 
             # part 1 - write the message to AlarmDecoder
@@ -399,7 +546,9 @@ class Plugin(indigo.PluginBase):
             if (action == '0') or (action == '1'):
                 panelMsg = 'L' + virtZoneNumber + action + '\r'
                 self.logger.debug(u"Sending panel message: {}".format(panelMsg))
-                self.ad2usb.panelMsgWrite(panelMsg)
+                # a newer update for the same zone replaces one still waiting to be written
+                self.ad2usb.panelMsgWrite(panelMsg, priority=AD2USB_Constants.k_WRITE_PRIORITY_VIRTUAL_ZONE,
+                                          coalesceKey='L' + virtZoneNumber)
 
                 # TO DO: remove this and log success within panelMsgWrite
                 self.logger.debug(u"Sent panel message: {}".format(panelMsg))
@@ -444,7 +593,7 @@ class Plugin(indigo.PluginBase):
 
                 # init the zone state list if needed
                 if myKeypadAddress not in self.ad2usb.zoneStateDict.keys():
-                    self.ad2usb.zoneStateDict[myKeypadAddress] = []
+                    self.ad2usb.zoneStateDict[myKeypadAddress] = AD2USB_Zones.ZoneFaultList()
 
                 # set default newState
                 if newZoneState == AD2USB_Constants.k_CLEAR:   # Clear
@@ -878,6 +1027,7 @@ class Plugin(indigo.PluginBase):
         previousAddress = self.ad2usbAddress
         previousPort = self.ad2usbPort
         previousSerialPort = self.ad2usbSerialPort
+        previousAsyncTransport = self.isAsyncTransportEnabled
 
         # TO DO: need to address all parameters in this code
         if UserCancelled is False:
@@ -923,6 +1073,15 @@ class Plugin(indigo.PluginBase):
             self.logUnknownLRRMessages = valuesDict["logUnknownLRRMessages"]
             self.clearAllOnRestart = valuesDict["restartClear"]
             self.numPartitions = int(valuesDict.get("panelPartitionCount", '1'))
+            self.isBurstDrainEnabled = valuesDict.get("isBurstDrainEnabled", True)
+            self.isReaderThreadEnabled = valuesDict.get("isReaderThreadEnabled", True)
+            self.isAsyncTransportEnabled = valuesDict.get("isAsyncTransportEnabled", False)
+            self.writeCommandPacing = int(valuesDict.get("writeCommandPacing", '100')) / 1000.0  # seconds
+            self.ad2usb.commandWriter.pacing = self.writeCommandPacing
+            self.heartbeatInterval = int(valuesDict.get("heartbeatInterval", '5'))  # seconds
+            self.playbackSpeed = valuesDict.get("playbackSpeed", AD2USB_Playback.kPLAYBACK_FIXED)
+            self.ad2usb.playbackClock.setSpeed(self.playbackSpeed)
+            self.panelMessagePlaybackFilename = valuesDict.get("panelMessagePlaybackPath", '').strip() or self.panelMessagePlaybackDefaultFilename
 
             # we have a hidden value in Prefs for ad2usbKeyPadAddress
             # get the current address from the environment
@@ -980,6 +1139,9 @@ class Plugin(indigo.PluginBase):
                 self.logger.info(
                     "AlarmDecoder type changed to {} - opening new serial connection".format(self.ad2usbCommType))
                 self.ad2usb.setSerialConnection(True)  # force a reset
+            elif (previousAsyncTransport != self.isAsyncTransportEnabled):
+                self.logger.info("AlarmDecoder async transport setting changed - opening new connection")
+                self.ad2usb.setSerialConnection(True)  # force a reset
             else:
                 # if the type is IP but IP or port changed then force a reset
                 if self.ad2usbCommType == 'IP':
@@ -994,6 +1156,12 @@ class Plugin(indigo.PluginBase):
                         self.logger.info("AlarmDecoder USB changed - opening new serial connection")
                         self.ad2usb.setSerialConnection(True)  # force a reset
 
+            # start or stop the reader thread to match the preferences
+            if self.isReaderThreadEnabled and (not self.isPlaybackCommunicationModeSet):
+                self.ad2usb.startMessageReader()
+            else:
+                self.ad2usb.stopMessageReader()
+
             self.logger.info(u"Plugin preferences have been updated")
 
         else:
@@ -1685,16 +1853,8 @@ class Plugin(indigo.PluginBase):
 
         self.logger.debug(u"called with zone address:{}".format(forZoneNumber))
 
-        zoneGroups = []
         try:
-            # for each zone group
-            for deviceId in self.getAllZoneGroups():
-                # for each zone address in the zone group
-                for zone in self.getZoneNumbersForZoneGroup(deviceId):
-                    # if the zone address is what we are looking for
-                    if zone == forZoneNumber:
-                        # append it to the list
-                        zoneGroups.append(deviceId)
+            zoneGroups = list(self.__getZoneGroupIndex()['byZone'].get(forZoneNumber, []))
 
             self.logger.debug(u"Zone:{} is in Groups:{}".format(forZoneNumber, zoneGroups))
             return zoneGroups
@@ -1704,11 +1864,11 @@ class Plugin(indigo.PluginBase):
                 u"error retrieving Zone Groups for Zone Address:{} - error:{}".format(forZoneNumber, str(err)))
             return []
 
-    # TO DO: simplify and leverage getDeviceForZoneNumber()
     def getDeviceIdForZoneNumber(self, forZoneNumber=''):
         """
         Returns the device.id (integer) for the Zone Number (Address) provided or 0 if not found.
         This only looks at Alarm Zone and Virtual Zone devices. Keypad devices are not included.
+        The device id is found in the zone index - see __addDeviceToZoneIndex.
 
         **parameters**:
         forZoneNumber -- an string that is the Zone Number (Address)
@@ -1724,20 +1884,12 @@ class Plugin(indigo.PluginBase):
             else:
                 zoneNumberAsString = str(forZoneNumber)
 
-            for device in indigo.devices.iter("self"):
-                # TO DO: do I need this restriction?
-                if device.deviceTypeId == 'alarmZone' or device.deviceTypeId == 'alarmZoneVirtual':
-                    deviceProperties = device.pluginProps.to_dict()
-                    self.logger.debug(u"device properties are:{}".format(deviceProperties))
-                    zoneNumber = deviceProperties.get('zoneNumber', "NONE")
-                    if zoneNumber == zoneNumberAsString:
-                        self.logger.debug(u"found device id:{} for zone number:{}".format(
-                            device.id, zoneNumberAsString))
-                        return device.id
-
-            # did not find device
-            self.logger.error(u"Unable to find device id for zone number:{}".format(forZoneNumber))
-            return 0
+            deviceId = self.zoneNumberIndex.get(zoneNumberAsString, 0)
+            if deviceId == 0:
+                # did not find device
+                self.logger.error(u"Unable to find device id for zone number:{}".format(forZoneNumber))
+
+            return deviceId
 
         except Exception as err:
             self.logger.error("Error trying to get device id for zone number:{}, error:{}".format(
@@ -1756,27 +1908,11 @@ class Plugin(indigo.PluginBase):
         self.logger.debug(u"called with zone number:{}".format(forZoneNumber))
 
         try:
-            # convert zone to a string if needed
-            zoneNumberAsString = ''
-            if isinstance(forZoneNumber, str):
-                zoneNumberAsString = forZoneNumber
-            else:
-                zoneNumberAsString = str(forZoneNumber)
+            deviceId = self.getDeviceIdForZoneNumber(forZoneNumber)
+            if deviceId == 0:
+                return None
 
-            for device in indigo.devices.iter("self"):
-                # TO DO: do I need this restriction?
-                if device.deviceTypeId == 'alarmZone' or device.deviceTypeId == 'alarmZoneVirtual':
-                    deviceProperties = device.pluginProps.to_dict()
-                    self.logger.debug(u"device properties are:{}".format(deviceProperties))
-                    zoneNumber = deviceProperties.get('zoneNumber', "NONE")
-                    if zoneNumber == zoneNumberAsString:
-                        self.logger.debug(u"found device id:{} for zone number:{}".format(
-                            device.id, zoneNumberAsString))
-                        return device
-
-            # did not find device
-            self.logger.error(u"Unable to find device id for zone number:{}".format(forZoneNumber))
-            return None
+            return indigo.devices[deviceId]
 
         except Exception as err:
             self.logger.error("Error trying to get device id for zone number:{}, error:{}".format(
@@ -1802,30 +1938,107 @@ class Plugin(indigo.PluginBase):
             else:
                 zoneNumberAsInt = int(forZoneNumber)
 
-            for device in indigo.devices.iter("self"):
-                # TO DO: do I need this restriction?
-                if device.deviceTypeId == 'alarmZone' or device.deviceTypeId == 'alarmZoneVirtual':
-                    deviceProperties = device.pluginProps.to_dict()
-                    self.logger.debug(u"device properties are:{}".format(deviceProperties))
-                    zoneNumberAsString = deviceProperties.get('zoneNumber', '0')
-
-                    # convert the property to an int for comparison
-                    zoneNumberProperty = int(zoneNumberAsString)
-
-                    if zoneNumberProperty == zoneNumberAsInt:
-                        self.logger.debug(u"found device id:{} for zone number:{}".format(
-                            device.id, zoneNumberAsString))
-                        return device
-
-            # did not find device
-            self.logger.error(u"Unable to find device id for zone number:{}".format(forZoneNumber))
-            return None
+            deviceId = self.zoneNumberAsIntIndex.get(zoneNumberAsInt, 0)
+            if deviceId == 0:
+                # did not find device
+                self.logger.error(u"Unable to find device id for zone number:{}".format(forZoneNumber))
+                return None
+
+            return indigo.devices[deviceId]
 
         except Exception as err:
             self.logger.error("Error trying to get device id for zone number:{}, error:{}".format(
                 forZoneNumber, str(err)))
             return None
 
+    def __buildZoneIndex(self):
+        """
+        Builds the zone number to device id index from all the Alarm Zone and Virtual Zone devices - including
+        disabled devices. The index is then kept current by deviceStartComm, deviceUpdated and deviceDeleted.
+        If more than one device has the same zone number the first device found is used - as the device scans did.
+        """
+        self.zoneNumberIndex = {}
+        self.zoneNumberAsIntIndex = {}
+        self.zoneNumberDevices = {}
+        self.zoneNumberAsIntDevices = {}
+        self.zoneNumberForDevice = {}
+
+        for device in indigo.devices.iter("self"):
+            self.__addDeviceToZoneIndex(device)
+
+        self.logger.debug(u"zone index:{}".format(self.zoneNumberIndex))
+
+    def __addDeviceToZoneIndex(self, forDevice):
+        """
+        Adds or updates the zone number of an Alarm Zone or Virtual Zone device in the zone index.
+        Any other device type is ignored. A device added with a zone number another device already has
+        is used only after the devices that already have it.
+
+        **parameters:**
+        forDevice -- an Indigo device object
+        """
+        if (forDevice.deviceTypeId != 'alarmZone') and (forDevice.deviceTypeId != 'alarmZoneVirtual'):
+            return
+
+        zoneNumber = forDevice.pluginProps.get('zoneNumber', "NONE")
+
+        # nothing to do if the zone number has not changed
+        if self.zoneNumberForDevice.get(forDevice.id) == zoneNumber:
+            return
+
+        # remove the device first since its zone number changed
+        self.__removeDeviceFromZoneIndex(forDevice.id)
+
+        self.zoneNumberForDevice[forDevice.id] = zoneNumber
+        self.zoneNumberDevices.setdefault(zoneNumber, []).append(forDevice.id)
+        self.zoneNumberIndex[zoneNumber] = self.zoneNumberDevices[zoneNumber][0]
+
+        zoneNumberAsInt = self.__zoneNumberAsInt(zoneNumber)
+        if zoneNumberAsInt is None:
+            self.logger.debug(u"zone number:{} is not an integer for device:{}".format(zoneNumber, forDevice.name))
+            return
+
+        self.zoneNumberAsIntDevices.setdefault(zoneNumberAsInt, []).append(forDevice.id)
+        self.zoneNumberAsIntIndex[zoneNumberAsInt] = self.zoneNumberAsIntDevices[zoneNumberAsInt][0]
+
+    def __removeDeviceFromZoneIndex(self, deviceId):
+        """
+        Removes a device from the zone index. A zone number the device had is given to the next device
+        with the same zone number, if there is one.
+
+        **parameters:**
+        deviceId -- the Indigo device id
+        """
+        zoneNumber = self.zoneNumberForDevice.pop(deviceId, None)
+        if zoneNumber is None:
+            return
+
+        self.__removeDeviceFromZoneList(deviceId, zoneNumber, self.zoneNumberDevices, self.zoneNumberIndex)
+
+        zoneNumberAsInt = self.__zoneNumberAsInt(zoneNumber)
+        if zoneNumberAsInt is not None:
+            self.__removeDeviceFromZoneList(deviceId, zoneNumberAsInt, self.zoneNumberAsIntDevices,
+                                            self.zoneNumberAsIntIndex)
+
+    def __removeDeviceFromZoneList(self, deviceId, zoneNumber, zoneDevices, zoneIndex):
+        # removes the device from the list of devices with the zone number and updates the zone index
+        deviceIds = zoneDevices.get(zoneNumber, [])
+        if deviceId in deviceIds:
+            deviceIds.remove(deviceId)
+
+        if len(deviceIds) > 0:
+            zoneIndex[zoneNumber] = deviceIds[0]
+        else:
+            zoneDevices.pop(zoneNumber, None)
+            zoneIndex.pop(zoneNumber, None)
+
+    def __zoneNumberAsInt(self, zoneNumber=''):
+        # returns the zone number (string) as an int or None if it is not an integer
+        try:
+            return int(zoneNumber)
+        except (TypeError, ValueError):
+            return None
+
     def getZoneNumberForDevice(self, forDevice):
         """
         Returns a zone number (int) for a given Indigo Device object. Returns None if the
@@ -1898,56 +2111,117 @@ class Plugin(indigo.PluginBase):
             self.logger.error("Error trying to get zone state for device id:{}, error:{}".format(forDeviceId, str(err)))
             return 'ERROR'
 
+    def invalidateZoneGroupIndex(self):
+        """
+        Marks the zone group index to be rebuilt the next time a zone changes. This must be called whenever a zone
+        group is added, edited, enabled, disabled or removed or the zone number of a zone device is edited.
+        """
+        self.logger.debug('called')
+        self.zoneGroupIndex = None
+
+    def __getZoneGroupIndex(self):
+        """
+        Returns the zone group index - a dictionary built from the enabled Zone Group devices: byZone (Zone Number
+        string to an array of zone group device ids) and faultedZones (zone group device id to the set of its Zone
+        Numbers that are faulted). A zone group is faulted when its set of faulted zones is not empty.
+        """
+        if self.zoneGroupIndex is not None:
+            return self.zoneGroupIndex
+
+        zoneGroupIndex = {'byZone': {}, 'faultedZones': {}}
+
+        for zoneGroupDeviceId in self.getAllZoneGroups():
+            faultedZones = set()
+            for zoneNumber in self.getZoneNumbersForZoneGroup(zoneGroupDeviceId):
+                zoneGroupIndex['byZone'].setdefault(zoneNumber, []).append(zoneGroupDeviceId)
+
+                deviceId = self.getDeviceIdForZoneNumber(zoneNumber)
+                if deviceId != 0:
+                    if self.getZoneStateForDeviceId(deviceId) == AD2USB_Constants.k_FAULT:
+                        faultedZones.add(zoneNumber)
+
+            zoneGroupIndex['faultedZones'][zoneGroupDeviceId] = faultedZones
+
+        self.logger.debug(u"zone group index:{}".format(zoneGroupIndex))
+        self.zoneGroupIndex = zoneGroupIndex
+        return zoneGroupIndex
+
+    def __setZoneGroupState(self, zoneGroupDeviceId, isFaulted):
+        """
+        Sets the state of a Zone Group device to FAULT or CLEAR if it is not already in that state
+
+        **parameters**:
+        zoneGroupDeviceId -- an integer that is the device.id of the Zone Group
+        isFaulted -- True if any zone in the zone group is faulted
+        """
+        zoneGroupDevice = indigo.devices[zoneGroupDeviceId]
+
+        newZoneGroupZoneState = AD2USB_Constants.k_CLEAR
+        if isFaulted:
+            newZoneGroupZoneState = AD2USB_Constants.k_FAULT
+
+        self.logger.debug(u"zone group:{} state current:{}, new:{}".format(
+            zoneGroupDevice.name, zoneGroupDevice.displayStateValRaw, newZoneGroupZoneState))
+        if newZoneGroupZoneState != zoneGroupDevice.displayStateValRaw:
+            self.logger.debug(u"updating zone group:{} to state:{}".format(zoneGroupDevice.name, newZoneGroupZoneState))
+            self.setDeviceState(zoneGroupDevice, newZoneGroupZoneState)
+
     def updateAllZoneGroups(self):
         """
-        Updates all the applicable Zone Groups when a Zone changes. call this method after an alarm zone state update
+        Rebuilds the zone group index from the current zone states and updates every Zone Group that has
+        the wrong state. Zone changes normally only update their own Zone Groups - see updateZoneGroupsForZone.
         """
 
         self.logger.debug(u"called")
 
+        zoneGroupDeviceId = 0
         try:
+            self.invalidateZoneGroupIndex()
+            zoneGroupIndex = self.__getZoneGroupIndex()
+
             # check and update every zone group
-            for zoneGroupDeviceId in self.getAllZoneGroups():
-
-                # get the Zone Group state
-                zoneGroupDevice = indigo.devices[zoneGroupDeviceId]
-                currentZoneGroupZoneState = zoneGroupDevice.displayStateValRaw
-                self.logger.debug(u"updating zone group:{}, id:{}, current zone state:{}".format(
-                    zoneGroupDevice.name, zoneGroupDeviceId, currentZoneGroupZoneState))
-
-                # start as false - but if we find one zone as fault the group is fault
-                zoneGroupIsFaulted = False
-                for zoneNumber in self.getZoneNumbersForZoneGroup(zoneGroupDeviceId):
-                    deviceId = self.getDeviceIdForZoneNumber(zoneNumber)
-                    if deviceId != 0:
-                        # TO DO: replace this with standard methods to get device state
-                        zoneState = self.getZoneStateForDeviceId(deviceId)
-                        self.logger.debug(u"checking alarm zone number:{}, id:{}, with state:{}".format(
-                            zoneNumber, deviceId, zoneState))
-                        if zoneState == AD2USB_Constants.k_FAULT:
-                            zoneGroupIsFaulted = True
-                            self.logger.debug(u"zone group:{} will be faulted".format(zoneGroupDevice.name))
-                            break
-
-                # determine the new zone group state
-                newZoneGroupZoneState = AD2USB_Constants.k_CLEAR
-                if zoneGroupIsFaulted:
-                    newZoneGroupZoneState = AD2USB_Constants.k_FAULT
-
-                # update the device state if it changed
-                self.logger.debug(u"zone group state current:{}, new:{}".format(
-                    currentZoneGroupZoneState, newZoneGroupZoneState))
-                if newZoneGroupZoneState != currentZoneGroupZoneState:
-                    self.logger.debug(u"updating zone group:{} to state:{}".format(
-                        zoneGroupDevice.name, newZoneGroupZoneState))
-                    self.setDeviceState(zoneGroupDevice, newZoneGroupZoneState)
-                else:
-                    self.logger.debug(u"zone group:{} is not changed".format(zoneGroupDevice.name))
+            for zoneGroupDeviceId, faultedZones in zoneGroupIndex['faultedZones'].items():
+                self.__setZoneGroupState(zoneGroupDeviceId, len(faultedZones) > 0)
 
         except Exception as err:
             self.logger.error("Error trying to update all zone groups, current zone group id:{}, error:{}".format(
                 zoneGroupDeviceId, str(err)))
 
+    def updateZoneGroupsForZone(self, zoneNumber='', isFaulted=False):
+        """
+        Updates the faulted zones of each Zone Group that contains a zone and writes the Zone Group state
+        only if the zone group changes between faulted and clear. If the zone group index needs to be rebuilt
+        every Zone Group is checked instead.
+
+        **parameters**:
+        zoneNumber -- a string that is the Zone Number (Address) that changed
+        isFaulted -- True if the zone is now faulted
+        """
+        self.logger.debug(u"called with zone number:{}, faulted:{}".format(zoneNumber, isFaulted))
+
+        # the rebuilt index already has the new zone state
+        if self.zoneGroupIndex is None:
+            self.updateAllZoneGroups()
+            return
+
+        zoneGroupDeviceId = 0
+        try:
+            for zoneGroupDeviceId in self.zoneGroupIndex['byZone'].get(zoneNumber, []):
+                faultedZones = self.zoneGroupIndex['faultedZones'][zoneGroupDeviceId]
+                wasFaulted = len(faultedZones) > 0
+
+                if isFaulted:
+                    faultedZones.add(zoneNumber)
+                else:
+                    faultedZones.discard(zoneNumber)
+
+                if (len(faultedZones) > 0) != wasFaulted:
+                    self.__setZoneGroupState(zoneGroupDeviceId, not wasFaulted)
+
+        except Exception as err:
+            self.logger.error("Error trying to update zone groups for zone:{}, current zone group id:{}, error:{}".format(
+                zoneNumber, zoneGroupDeviceId, str(err)))
+
     def updateRFBatteryForZone(self, zoneNumber):
         """
         Updates the indigo.device state 'lastBatteryRestore' for a given zone number.
@@ -2039,10 +2313,12 @@ class Plugin(indigo.PluginBase):
                 self.logger.error(u"Unable to set device name:{}, id:{}, to state:{}".format(
                     forDevice.name, forDevice.id, newState))
 
-            # update any Zone Groups
+            # update the Zone Groups that contain this zone - an error state does not change the zone state
             try:
-                # now that zones have been updated we can refresh the zone groups
-                self.updateAllZoneGroups()
+                if ((forDevice.deviceTypeId == 'alarmZone') or (forDevice.deviceTypeId == 'alarmZoneVirtual')) and \
+                        (newState != AD2USB_Constants.k_ERROR):
+                    self.updateZoneGroupsForZone(forDevice.pluginProps.get('zoneNumber', "NONE"),
+                                                 newState == AD2USB_Constants.k_FAULT)
             except Exception as err:
                 self.logger.error("Error updating Zone Groups:{}".format(str(err)))
 
@@ -2147,6 +2423,7 @@ class Plugin(indigo.PluginBase):
             # set user variables to a default
             users = ''
             anyUser = True
+            userSet = frozenset()
             
             # look for these types first to process them quickly
             if (triggerType == 'systemEvents') or (triggerType == 'alarmEvents'):
@@ -2159,6 +2436,8 @@ class Plugin(indigo.PluginBase):
                 if (userOption is None) or (userOption == 'selectUser'):
                     anyUser = False
                     users = trigger.pluginProps.get('userNumber','')
+                    # parse the users once - None if the users are in an Indigo variable
+                    userSet = self.ad2usb.getUserSetForTrigger(name=triggerName, userString=users)
                 elif userOption == 'anyUser':
                     anyUser = True
 
@@ -2170,12 +2449,15 @@ class Plugin(indigo.PluginBase):
                 self.logger.error("Delete the Trigger named:{} and replace with a User Action with the 'Any User' option selected.".format(triggerName))
 
             # build the dictionary
-            self.triggerCache[tid] = {'events': events, 'partition': partition, 'name': triggerName, 'type': triggerType, 'anyUser': anyUser, 'users': users}
+            self.triggerCache[tid] = {'events': events, 'partition': partition, 'name': triggerName, 'type': triggerType,
+                                      'anyUser': anyUser, 'users': users, 'userSet': userSet}
+            self.__addTriggerToDispatch(tid)
 
         except Exception as err:
             self.logger.error("Problem updating new Trigger cache:{}".format(str(err)))
 
         self.logger.debug(u"updated (post add) Trigger Cache:{}".format(self.triggerCache))
+        self.logger.debug(u"updated (post add) Trigger Dispatch:{}".format(self.triggerDispatch))
 
     ########################################
     def triggerStopProcessing(self, trigger):
@@ -2183,11 +2465,44 @@ class Plugin(indigo.PluginBase):
 
         # new cache - remove the trigger id if it exists
         tid = trigger.id
+        self.__removeTriggerFromDispatch(tid)
         if tid in self.triggerCache:
             self.logger.debug(u"trigger:{} id:{} removed from cache".format(trigger.name, tid))
             del self.triggerCache[tid]
 
         self.logger.debug(u"updated (post remove) Trigger Cache:{}".format(self.triggerCache))
+        self.logger.debug(u"updated (post remove) Trigger Dispatch:{}".format(self.triggerDispatch))
+
+    def __addTriggerToDispatch(self, triggerId):
+        """
+        Adds a trigger in the trigger cache to the trigger dispatch table under each of its events for its partition.
+        The dispatch table values are tuples that are replaced - not changed - so executeTrigger can read them while
+        triggers are started or stopped.
+
+        **parameters:**
+        triggerId -- the Indigo trigger id
+        """
+        # remove the trigger first in case its events or partition changed
+        self.__removeTriggerFromDispatch(triggerId)
+
+        triggerEntry = self.triggerCache[triggerId]
+        for event in set(triggerEntry['events']):
+            dispatchKey = (event, triggerEntry['partition'])
+            self.triggerDispatch[dispatchKey] = self.triggerDispatch.get(dispatchKey, ()) + (triggerId,)
+
+    def __removeTriggerFromDispatch(self, triggerId):
+        """
+        Removes a trigger from the trigger dispatch table
+
+        **parameters:**
+        triggerId -- the Indigo trigger id
+        """
+        for dispatchKey in [key for key, value in self.triggerDispatch.items() if triggerId in value]:
+            triggerIds = tuple(oneId for oneId in self.triggerDispatch[dispatchKey] if oneId != triggerId)
+            if len(triggerIds) > 0:
+                self.triggerDispatch[dispatchKey] = triggerIds
+            else:
+                del self.triggerDispatch[dispatchKey]
 
     def __setURLFromConfig(self):
         """
@@ -2400,6 +2715,13 @@ class Plugin(indigo.PluginBase):
 
         self.clearAllOnRestart = pluginPrefs.get("restartClear", True)
         self.numPartitions = int(pluginPrefs.get("panelPartitionCount", '1'))
+        self.isBurstDrainEnabled = pluginPrefs.get("isBurstDrainEnabled", True)
+        self.isReaderThreadEnabled = pluginPrefs.get("isReaderThreadEnabled", True)
+        self.isAsyncTransportEnabled = pluginPrefs.get("isAsyncTransportEnabled", False)
+        self.writeCommandPacing = int(pluginPrefs.get("writeCommandPacing", '100')) / 1000.0  # seconds
+        self.heartbeatInterval = int(pluginPrefs.get("heartbeatInterval", '5'))  # seconds
+        self.playbackSpeed = pluginPrefs.get("playbackSpeed", AD2USB_Playback.kPLAYBACK_FIXED)
+        self.panelMessagePlaybackFilename = pluginPrefs.get("panelMessagePlaybackPath", '').strip() or self.panelMessagePlaybackDefaultFilename
 
         # TO DO: this is part of AlarmDecoder CONFIG - do we need it here ?
         self.ad2usbKeyPadAddress = pluginPrefs.get("ad2usbKeyPadAddress", '18')
@@ -2576,16 +2898,13 @@ class Plugin(indigo.PluginBase):
         try:
             self.logger.debug('called')
 
-            allKeypadDevices = []
-
-            # get all the keypad devices
-            for device in indigo.devices.iter("self"):
-                # just the Keypad Devices
-                if device.deviceTypeId == 'ad2usbInterface':
-                    if device.enabled or (includeDisabled is True):
-                        allKeypadDevices.append(device)
+            keypadRegistry = self.__getKeypadRegistry()
+            if includeDisabled is True:
+                keypadIds = keypadRegistry['allIds']
+            else:
+                keypadIds = keypadRegistry['enabledIds']
 
-            return allKeypadDevices
+            return [indigo.devices[keypadId] for keypadId in keypadIds]
 
         except Exception as err:
             self.logger.error(u"error retrieving ad2usb Keypad devices from Indigo, msg:{}".format(str(err)))
@@ -2602,18 +2921,11 @@ class Plugin(indigo.PluginBase):
         try:
             self.logger.debug('called')
 
-            allKeypadAddresses = []
-
-            # get all the keypad devices
-            for device in indigo.devices.iter("self"):
-                # just the Keypad Devices
-                if device.deviceTypeId == 'ad2usbInterface':
-                    if device.enabled or (includeDisabled is True):
-
-                        # get the address from each keypad
-                        localProps = device.pluginProps.to_dict()
-                        if 'panelKeypadAddress' in localProps:
-                            allKeypadAddresses.append(localProps['panelKeypadAddress'])
+            keypadRegistry = self.__getKeypadRegistry()
+            if includeDisabled is True:
+                allKeypadAddresses = list(keypadRegistry['allAddresses'])
+            else:
+                allKeypadAddresses = list(keypadRegistry['enabledAddresses'])
 
             self.logger.debug("found {} keypad addresses:{}".format(len(allKeypadAddresses), allKeypadAddresses))
             return allKeypadAddresses
@@ -2624,6 +2936,86 @@ class Plugin(indigo.PluginBase):
             emptyArray = []
             return emptyArray
 
+    def getKeypadAddressesForMask(self, keypadMask=0):
+        """
+        Returns an array of the enabled keypad addresses (strings) that a KPM message is sent to.
+
+        **parameters:**
+        keypadMask -- the keypadMaskAsInt of the KPM message
+        """
+        keypadRegistry = self.__getKeypadRegistry()
+
+        # most messages are not for any of our keypads
+        if not (keypadMask & keypadRegistry['addressMask']):
+            return []
+
+        return [address for address, addressBit in keypadRegistry['addressBits'] if keypadMask & addressBit]
+
+    def invalidateKeypadRegistry(self):
+        """
+        Marks the keypad registry to be rebuilt the next time it is used. This must be called whenever a keypad
+        device is added, edited, enabled, disabled or removed.
+        """
+        self.logger.debug('called')
+        self.keypadRegistry = None
+
+    def __getKeypadRegistry(self):
+        """
+        Returns the keypad registry - a dictionary of keypad device ids built from one scan of the plugin devices:
+        allIds and enabledIds (arrays in Indigo device order), allAddresses and enabledAddresses (arrays of address
+        strings), byAddress (address as int to id) and byPartition (partition string to id). Only enabled keypads
+        are in byAddress and byPartition. The first keypad found is kept if two keypads have the same address or partition.
+        addressBits (array of enabled address string and its bit in a KPM keypad mask) and addressMask (the bits of
+        every enabled address) are used to route multi-partition keypad messages - see getKeypadAddressesForMask.
+        """
+        if self.keypadRegistry is not None:
+            return self.keypadRegistry
+
+        keypadRegistry = {'allIds': [], 'enabledIds': [], 'allAddresses': [], 'enabledAddresses': [],
+                          'byAddress': {}, 'byPartition': {}, 'addressBits': [], 'addressMask': 0}
+
+        # get all the keypad devices
+        for device in indigo.devices.iter("self"):
+            # just the Keypad Devices
+            if device.deviceTypeId != 'ad2usbInterface':
+                continue
+
+            localProps = device.pluginProps.to_dict()
+            keypadAddress = localProps.get('panelKeypadAddress')
+
+            keypadRegistry['allIds'].append(device.id)
+            if keypadAddress is not None:
+                keypadRegistry['allAddresses'].append(keypadAddress)
+
+            if not device.enabled:
+                continue
+
+            keypadRegistry['enabledIds'].append(device.id)
+            if keypadAddress is not None:
+                keypadRegistry['enabledAddresses'].append(keypadAddress)
+
+                try:
+                    keypadRegistry['byAddress'].setdefault(int(keypadAddress), device.id)
+
+                    addressBit = AlarmDecoder.KPMRecord.getKeypadAddressBit(int(keypadAddress))
+                    keypadRegistry['addressBits'].append((keypadAddress, addressBit))
+                    keypadRegistry['addressMask'] |= addressBit
+                except ValueError:
+                    self.logger.debug("keypad address:{} is not valid for device:{}".format(keypadAddress, device.name))
+
+            if 'panelPartitionNumber' in localProps:
+                keypadRegistry['byPartition'].setdefault(localProps['panelPartitionNumber'], device.id)
+
+        self.logger.debug("keypad registry:{}".format(keypadRegistry))
+        self.keypadRegistry = keypadRegistry
+        return keypadRegistry
+
+    def __logNoKeypadDevices(self):
+        if int(self.numPartitions) == 1:
+            self.logger.error("No Indigo ad2usb Keypad device found; exactly one (1) should be defined")
+        else:
+            self.logger.error("No Indigo ad2usb Keypad device found; one (1) per partition should be defined")
+
     def getKeypadAddressFromDevice(self, keypadDevice=None):
         """
         Returns a valid keypad address from an Indigo ad2usb keypad device object. None is returned if address is
@@ -2710,25 +3102,18 @@ class Plugin(indigo.PluginBase):
             # ensure its an int
             deviceIdAsInt = int(deviceId)
             self.logger.debug("Searching for ad2usb Keypad device id:{} - int value:{}".format(deviceId, deviceIdAsInt))
- 
-            # get all keypads
-            allKeypadDevices = self.getAllKeypadDevices()
 
-            # the case of no keypad devices
-            if len(allKeypadDevices) == 0:
-                if int(self.numPartitions) == 1:
-                    self.logger.error("No Indigo ad2usb Keypad device found; exactly one (1) should be defined")
-                else:
-                    self.logger.error("No Indigo ad2usb Keypad device found; one (1) per partition should be defined")
+            keypadRegistry = self.__getKeypadRegistry()
 
+            # the case of no keypad devices
+            if len(keypadRegistry['enabledIds']) == 0:
+                self.__logNoKeypadDevices()
                 return None
 
-            # if we have keypad devices search for one that matches deviceId
-            else:
-                for oneKeypadDevice in allKeypadDevices:
-                    if oneKeypadDevice.id == deviceIdAsInt:
-                        self.logger.debug("found keypad:{} match for device id:{}".format(oneKeypadDevice.name, deviceId))
-                        return oneKeypadDevice
+            # if we have keypad devices check for one that matches deviceId
+            if deviceIdAsInt in keypadRegistry['enabledIds']:
+                self.logger.debug("found keypad match for device id:{}".format(deviceId))
+                return indigo.devices[deviceIdAsInt]
 
             # if we get this far it does not exist
             self.logger.debug("did not find keypad match for device id:{}".format(deviceId))
@@ -2747,23 +3132,17 @@ class Plugin(indigo.PluginBase):
         partition - a partition value as a string (e.g. "2")
         """
         try:
-            allKeypadDevices = self.getAllKeypadDevices()
+            keypadRegistry = self.__getKeypadRegistry()
             partitionAsString = str(partition)
 
             # the case of no devices
-            if len(allKeypadDevices) == 0:
-                if int(self.numPartitions) == 1:
-                    self.logger.error("No Indigo ad2usb Keypad device found; exactly one (1) should be defined")
-                else:
-                    self.logger.error("No Indigo ad2usb Keypad device found; one (1) per partition should be defined")
-
+            if len(keypadRegistry['enabledIds']) == 0:
+                self.__logNoKeypadDevices()
                 return None
 
             # the case of mutiple keypad devices and parition parameter provided but not '0'
-            elif (partition is not None):
-                for oneKeypadDevice in allKeypadDevices:
-                    if oneKeypadDevice.pluginProps['panelPartitionNumber'] == partitionAsString:
-                        return oneKeypadDevice
+            elif (partition is not None) and (partitionAsString in keypadRegistry['byPartition']):
+                return indigo.devices[keypadRegistry['byPartition'][partitionAsString]]
 
             # if we get this far it does not exist
             self.logger.debug("did not find keypad match for partition:{}".format(partitionAsString))
@@ -2789,26 +3168,18 @@ class Plugin(indigo.PluginBase):
             if not self.isValidKeypadAddress(address):
                 return None
 
-            allKeypadDevices = self.getAllKeypadDevices()
+            keypadRegistry = self.__getKeypadRegistry()
             addressAsInt = int(address)
 
             # the case of no devices
-            if len(allKeypadDevices) == 0:
-                if int(self.numPartitions) == 1:
-                    self.logger.error("No Indigo ad2usb Keypad device found; exactly one (1) should be defined")
-                else:
-                    self.logger.error("No Indigo ad2usb Keypad device found; one (1) per partition should be defined")
-
+            if len(keypadRegistry['enabledIds']) == 0:
+                self.__logNoKeypadDevices()
                 return None
 
-            # now look thru each keypad for one that matches address and return it
-            for eachKeypad in allKeypadDevices:
-                localProps = eachKeypad.pluginProps.to_dict()
-                if 'panelKeypadAddress' in localProps:
-                    # if the addresses match via integer comparison
-                    if int(localProps['panelKeypadAddress']) == addressAsInt:
-                        self.logger.debug("found keypad match for address (as int):{}".format(addressAsInt))
-                        return eachKeypad
+            # if the addresses match via integer comparison
+            if addressAsInt in keypadRegistry['byAddress']:
+                self.logger.debug("found keypad match for address (as int):{}".format(addressAsInt))
+                return indigo.devices[keypadRegistry['byAddress'][addressAsInt]]
 
             # if we get this far it does not exist
             self.logger.debug("did not find keypad match for address (as int):{}".format(addressAsInt))
@@ -2860,6 +3231,7 @@ class Plugin(indigo.PluginBase):
 
                 # replace the values on the server
                 allKeypads[0].replacePluginPropsOnServer(newPluginProps)
+                self.invalidateKeypadRegistry()
 
             else:
                 # store if the old address is valid.
@@ -2890,6 +3262,7 @@ class Plugin(indigo.PluginBase):
 
                     # replace the values on the server
                     keyPadDevice.replacePluginPropsOnServer(newPluginProps)
+                    self.invalidateKeypadRegistry()
 
                 # scenario 2
                 elif (keyPadDevice is None) and (possibleDuplicateKeypad is None):
@@ -2911,16 +3284,34 @@ class Plugin(indigo.PluginBase):
             self.logger.error(
                 "Error while attempting to update Keypad Device with new AlarmDecoder address:{}".format(str(err)))
 
-    def updateLastADMessageOnKeypads(self):
+    def markADMessageSeen(self):
+        """
+        Records that a valid AlarmDecoder message was just read. This is called for every message so it only
+        saves the time - the keypad devices are updated by updateLastADMessageOnKeypads.
+        """
+        self.lastADMessageSeenTime = datetime.now()
+
+    def updateLastADMessageOnKeypads(self, force=False):
         """
-        Updates all Keypad devices state 'lastADMessage' with the current date-time. The 'lastADMessage' state is used
-        as a heartbeat to confirm the AlarmDecoder is still working when the panel is armed. So far, only RFX messsages are
-        seen when panel is armed.
+        Updates all Keypad devices state 'lastADMessage' with the date-time the last AlarmDecoder message was seen.
+        The 'lastADMessage' state is used as a heartbeat to confirm the AlarmDecoder is still working when the panel
+        is armed. So far, only RFX messsages are seen when panel is armed. This is called from runConcurrentThread and
+        only updates the keypads if a message was seen and heartbeatInterval seconds have passed since the last update.
+
+        **parameters:**
+        force -- True to update the keypads now even if heartbeatInterval has not passed
         """
         try:
-            self.logger.debug("called")
-            now = datetime.now()
-            timeStamp = now.strftime("%Y-%m-%d %H:%M:%S")
+            # nothing to do if no message has been seen since the last update
+            if self.lastADMessageSeenTime is None:
+                return
+
+            if (not force) and (time.time() - self.lastADMessageUpdateTime < self.heartbeatInterval):
+                return
+
+            timeStamp = self.lastADMessageSeenTime.strftime("%Y-%m-%d %H:%M:%S")
+            self.lastADMessageSeenTime = None
+            self.lastADMessageUpdateTime = time.time()
 
             for eachKeypad in self.getAllKeypadDevices():
                 self.logger.debug("Updating lastADMessage on Keypad Device:{} with new lastADMessage:{}".format(eachKeypad.name, timeStamp))
@@ -3255,6 +3646,9 @@ class Plugin(indigo.PluginBase):
                     elif device.deviceTypeId == 'ad2usbInterface':
                         self.setKeypadDeviceState(forDevice=device, newState=AD2USB_Constants.k_PANEL_READY)
 
+            # the keypad states were changed here so the next keypad message must update every state
+            self.ad2usb.clearLastKeypadMessages()
+
         except Exception as err:
             self.logger.error("Unable to clear all devices - msg:{}".format(str(err)))
             return False
@@ -3292,6 +3686,52 @@ class Plugin(indigo.PluginBase):
         for device in indigo.devices.iter("self"):
             self.logger.info("Device:{}".format(device))
 
+    def logMessageStatistics(self):
+        """
+        Menu item to write message reading and processing statistics to the Event Log
+        """
+        self.logger.info(u"Largest read backlog seen in drain mode:{}".format(self.readBacklogHighWater))
+
+        readerStatistics = self.ad2usb.getMessageReaderStatistics()
+        if readerStatistics is None:
+            self.logger.info(u"Reader thread is not running")
+        else:
+            self.logger.info(u"Reader thread - queue depth:{queueDepth} of {queueSize}, high water mark:{queueHighWater}, "
+                             u"messages read:{messagesRead}, dropped:{messagesDropped}, "
+                             u"longest wait in queue:{maxQueueWait} sec".format(**readerStatistics))
+
+        writerStatistics = self.ad2usb.commandWriter.getStatistics()
+        self.logger.info(u"Writer - queue depth:{queueDepth}, commands queued:{commandsQueued}, written:{commandsWritten}, "
+                         u"coalesced:{commandsCoalesced}, errors:{writeErrors}, "
+                         u"longest wait in queue by priority:{maxQueueLatencyByPriority}".format(**writerStatistics))
+
+        triggerStatistics = self.ad2usb.triggerExecutor.getStatistics()
+        self.logger.info(u"Trigger executor - queue depth:{queueDepth}, triggers queued:{triggersQueued}, "
+                         u"executed:{triggersExecuted}, errors:{executeErrors}, "
+                         u"queue latency average:{averageQueueLatency} sec, max:{maxQueueLatency} sec, "
+                         u"execution time average:{averageExecutionTime} sec, max:{maxExecutionTime} sec".format(**triggerStatistics))
+
+        framerStatistics = self.ad2usb.lineFramer.getStatistics()
+        self.logger.info(u"Line framer - reads:{chunksRead}, bytes read:{bytesRead}, lines:{linesFramed}, "
+                         u"bytes buffered:{bufferedBytes}, partial lines discarded:{partialLinesDiscarded}".format(**framerStatistics))
+
+        cacheStatistics = self.ad2usb.getMessageCacheStatistics()
+        self.logger.info(u"Parsed message cache - hits:{hits}, misses:{misses}, evictions:{evictions}, "
+                         u"size:{size} of {maxSize}".format(**cacheStatistics))
+
+        keypadStatistics = self.ad2usb.getKeypadChangeStatistics()
+        self.logger.info(u"Keypad updates skipped for unchanged messages:{unchangedKeypadMessages}, "
+                         u"keypads tracked:{keypadsTracked}, states written:{keypadStatesWritten}, "
+                         u"unchanged states skipped:{keypadStatesUnchanged}".format(**keypadStatistics))
+
+        ackStatistics = self.ad2usb.getAckStatistics()
+        self.logger.info(u"Command acknowledgements - acknowledged:{acknowledged}, retries:{retries}, "
+                         u"timeouts:{timeouts}, waiting:{pending}".format(**ackStatistics))
+        for ackType in ['KEYPAD', 'VER', 'CONFIG']:
+            if ackType in ackStatistics:
+                self.logger.info(u"{} command round trip - count:{count}, p50:{p50} sec, p90:{p90} sec, "
+                                 u"p99:{p99} sec, max:{max} sec".format(ackType, **ackStatistics[ackType]))
+
     def sendAlarmDecoderConfigCommand(self):
         # set the previous CONFIG string to empty to force message to be written to console log
         self.previousCONFIGString = ''
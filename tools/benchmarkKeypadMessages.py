@@ -0,0 +1,233 @@
+"""
+Measures the CPU time the plugin spends on each keypad (KPM) message in a captured panel message log.
+
+Two measurements are made:
+
+1. Tokenizing - for every KPM in the log the CPU time to get the fields panelMsgRead uses (message
+   text, bit field, flags, numeric code, zone in the message text) by splitting the raw message with
+   re.split as panelMsgRead did before v 3.5.0 is compared with reading the same fields from the
+   already parsed AlarmDecoder Message. The difference is the CPU saved for each keypad message by
+   only splitting it once.
+
+2. Pipeline - the log is replayed through ad2usb.panelMsgRead with tools/replayPanelLog.py and the
+   CPU time for each KPM message is reported. Each replay is run in its own process so every run
+   starts with a new plugin. Run it before and after a change to compare the two.
+
+The best (lowest) time of all the runs is reported since it is the least affected by other work on
+the computer.
+
+The basic usage is:
+
+    python3 tools/benchmarkKeypadMessages.py panelMessages.log
+    python3 tools/benchmarkKeypadMessages.py panelMessages.log --devices devices.json --repeat 10
+    python3 tools/benchmarkKeypadMessages.py panelMessages.log --json > results.json
+
+The optional devices file is the same as tools/replayPanelLog.py.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+
+kTOOLS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+kPLUGIN_FOLDER = os.path.join(kTOOLS_FOLDER, '..', 'ad2usb.indigoPlugin', 'Contents', 'Server Plugin')
+
+# the keypad messages are parsed the same for both supported firmware versions
+kFIRMWARE_VERSION = 'V2.2a.8.8'
+
+
+def readKeypadMessages(playbackPath=''):
+    """
+    returns the list of KPM message strings in a panel message log
+
+    **parameters:**
+    playbackPath -- a panel message log file, folder or glob pattern
+    """
+    import AD2USB_Playback
+
+    logger = logging.getLogger('benchmark')
+    playback = AD2USB_Playback.PanelMessagePlayback(fileName=playbackPath, logger=logger)
+
+    messages = []
+    message = playback.readMessage()
+    while message is not None:
+        if (len(message) > 0) and (message[0] == '['):
+            messages.append(message)
+        message = playback.readMessage()
+
+    playback.close()
+    return messages
+
+
+def splitFields(rawData='', lastMessage=None):
+    """
+    returns the fields panelMsgRead used from a keypad message by splitting it as it did before v 3.5.0 -
+    the message was split again when it was not the same as the last keypad message
+
+    **parameters:**
+    rawData -- the keypad message string
+    lastMessage -- the keypad message string before this one
+    """
+    splitMsg = re.split(r'[\[\],]', rawData)
+    msgText = splitMsg[7]
+    isPressForFaultMessage = msgText.find(' * ') >= 0
+    isSystemMessage = rawData[30:38] == '00000000'
+    panelFlags = rawData[0:23]
+    isAlarmTripped = rawData[61:74] == "DISARM SYSTEM"
+
+    alarmedZone = None
+    if rawData != lastMessage:
+        splitMsg = re.split(r'[\[\],]', rawData)
+        alarmedZone = splitMsg[3]
+    msgBitMap = splitMsg[1]
+
+    try:
+        msgZoneNum = int(splitMsg[3])
+    except ValueError:
+        msgZoneNum = 0
+
+    try:
+        bMsgZoneNum = int(msgText[7:9])
+    except ValueError:
+        bMsgZoneNum = 0
+
+    return (msgText, isPressForFaultMessage, isSystemMessage, panelFlags, isAlarmTripped, alarmedZone, msgBitMap,
+            msgZoneNum, bMsgZoneNum)
+
+
+def readParsedFields(message=None):
+    """
+    returns the fields panelMsgRead uses from a keypad message by reading them from the parsed message
+
+    **parameters:**
+    message -- the AlarmDecoder Message for the keypad message
+    """
+    keypadMessage = message.details
+    msgText = keypadMessage.alphanumericKeypadMessage
+
+    return (msgText, keypadMessage.isPressForFaultMessage, keypadMessage.isSystemMessage, keypadMessage.bitField,
+            keypadMessage.isAlarmTripped, keypadMessage.numericCode, keypadMessage.bitField[1:21],
+            keypadMessage.zoneNumberAsInt, keypadMessage.zoneFromMessage or 0)
+
+
+def benchmarkTokenizing(rawMessages=None, repeat=5):
+    """
+    returns a dictionary of the best CPU microseconds per keypad message to split the message and to
+    read the parsed message
+
+    **parameters:**
+    rawMessages -- list of keypad message strings
+    repeat -- number of times to measure
+    """
+    import AlarmDecoder
+
+    logger = logging.getLogger('benchmark')
+
+    # both ways parse every message first - panelMsgRead always gets the parsed message from the cache
+    messageCache = AlarmDecoder.MessageCache()
+    parsedMessages = [messageCache.getMessage(rawData, kFIRMWARE_VERSION, logger) for rawData in rawMessages]
+    parsedMessages = [message for message in parsedMessages if message.isValidMessage]
+    validMessages = [message.messageString for message in parsedMessages]
+
+    splitTimes = []
+    parsedTimes = []
+    for run in range(0, repeat):
+        lastMessage = None
+        startTime = time.process_time()
+        for rawData in validMessages:
+            splitFields(rawData, lastMessage)
+            lastMessage = rawData
+        splitTimes.append(time.process_time() - startTime)
+
+        startTime = time.process_time()
+        for message in parsedMessages:
+            readParsedFields(message)
+        parsedTimes.append(time.process_time() - startTime)
+
+    count = max(len(validMessages), 1)
+    splitMicroseconds = round(min(splitTimes) / count * 1000000, 2)
+    parsedMicroseconds = round(min(parsedTimes) / count * 1000000, 2)
+
+    return {'messages': len(validMessages), 'splitMicroseconds': splitMicroseconds,
+            'parsedMicroseconds': parsedMicroseconds,
+            'savedMicroseconds': round(splitMicroseconds - parsedMicroseconds, 2)}
+
+
+def benchmarkPipeline(playbackPath='', devicesPath=None, repeat=5):
+    """
+    returns a dictionary of the best CPU and elapsed microseconds per keypad message replaying the log
+    through panelMsgRead
+
+    **parameters:**
+    playbackPath -- a panel message log file, folder or glob pattern
+    devicesPath -- optional JSON file of prefs, devices and triggers for replayPanelLog.py
+    repeat -- number of times to replay the log
+    """
+    command = [sys.executable, os.path.join(kTOOLS_FOLDER, 'replayPanelLog.py'), playbackPath, '--json']
+    if devicesPath:
+        command += ['--devices', devicesPath]
+
+    keypadResults = []
+    for run in range(0, repeat):
+        output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+                                universal_newlines=True).stdout
+        results = json.loads(output)
+        if 'KPM' in results['byType']:
+            keypadResults.append(results['byType']['KPM'])
+
+    if len(keypadResults) == 0:
+        return {'messages': 0, 'cpuMicroseconds': 0, 'processMicroseconds': 0}
+
+    return {'messages': keypadResults[0]['count'],
+            'cpuMicroseconds': min(item['cpuMicroseconds'] for item in keypadResults),
+            'processMicroseconds': min(item['processMicroseconds'] for item in keypadResults)}
+
+
+def printResults(results):
+    tokenizing = results['tokenizing']
+    print(u"Tokenizing {messages} keypad messages (best of {repeat}):".format(repeat=results['repeat'], **tokenizing))
+    print(u"  split with re.split:   {splitMicroseconds:>8} us/message".format(**tokenizing))
+    print(u"  read parsed message:   {parsedMicroseconds:>8} us/message".format(**tokenizing))
+    print(u"  saved:                 {savedMicroseconds:>8} us/message".format(**tokenizing))
+
+    pipeline = results.get('pipeline')
+    if pipeline is not None:
+        print(u"\npanelMsgRead {messages} keypad messages (best of {repeat}):".format(repeat=results['repeat'],
+                                                                                     **pipeline))
+        print(u"  CPU:                   {cpuMicroseconds:>8} us/message".format(**pipeline))
+        print(u"  elapsed:               {processMicroseconds:>8} us/message".format(**pipeline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the CPU time for each keypad message in a panel message log.')
+    parser.add_argument('playbackPath', help='panel message log file, folder or glob pattern (.gz files are supported)')
+    parser.add_argument('--devices', help='JSON file of prefs, devices and triggers - see replayPanelLog.py')
+    parser.add_argument('--repeat', type=int, default=5, help='number of times to measure')
+    parser.add_argument('--skip-pipeline', action='store_true', help='only measure tokenizing')
+    parser.add_argument('--json', action='store_true', help='write the results as JSON')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(kPLUGIN_FOLDER))
+
+    # the plugin already logs invalid messages - they are not needed here
+    logging.getLogger('benchmark').setLevel(logging.ERROR)
+
+    repeat = max(args.repeat, 1)
+    rawMessages = readKeypadMessages(args.playbackPath)
+    results = {'repeat': repeat, 'tokenizing': benchmarkTokenizing(rawMessages, repeat)}
+
+    if not args.skip_pipeline:
+        results['pipeline'] = benchmarkPipeline(args.playbackPath, args.devices, repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        printResults(results)
+
+
+if __name__ == '__main__':
+    main()
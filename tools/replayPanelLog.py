@@ -0,0 +1,465 @@
+"""
+Replays a panel message log through the plugin message pipeline without Indigo.
+
+An in-memory stand-in for the indigo module (devices, triggers, variables) is installed before the
+plugin is imported. The plugin is created in panel message playback mode at the 'max' playback
+speed and every message is passed through ad2usb.panelMsgRead exactly as the plugin would. At the
+end the messages per second, parse, processing and CPU time by message type, triggers executed and
+the final device states are reported.
+
+The basic usage is:
+
+    python3 tools/replayPanelLog.py panelMessages.log
+    python3 tools/replayPanelLog.py '/path/to/Logs/com.berkinet.ad2usb/panelMessages.log*' --devices devices.json
+    python3 tools/replayPanelLog.py panelMessages.log --json > results.json
+
+The optional devices file is JSON with a list of devices and triggers. Each device and trigger has
+an id, name, type and pluginProps just as they are in Indigo:
+
+    {"prefs": {"isAdvanced": false, "ad2usbKeyPadAddress": "18"},
+     "devices": [{"id": 1, "name": "Keypad", "deviceTypeId": "ad2usbInterface",
+                  "pluginProps": {"panelPartitionNumber": "1", "panelKeypadAddress": "18"}},
+                 {"id": 2, "name": "Front Door", "deviceTypeId": "alarmZone",
+                  "pluginProps": {"zoneNumber": "1", "zonePartitionNumber": "1"}}],
+     "triggers": [{"id": 100, "name": "Alarm", "pluginTypeId": "alarmEvents",
+                   "pluginProps": {"indigoTrigger": ["ALARM_TRIPPED"], "panelPartitionNumber": "1"}}]}
+
+Without a devices file a single keypad device for partition 1 is used.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import types
+import xml.etree.ElementTree as ElementTree
+
+kPLUGIN_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ad2usb.indigoPlugin',
+                              'Contents', 'Server Plugin')
+kPLUGIN_ID = 'com.berkinet.ad2usb'
+
+kDEFAULT_DEVICES = {'devices': [{'id': 1, 'name': 'Keypad', 'deviceTypeId': 'ad2usbInterface',
+                                 'pluginProps': {'panelPartitionNumber': '1', 'panelKeypadAddress': '18',
+                                                 'numPartitions': '1'}}],
+                    'triggers': []}
+
+
+################################################################################
+# In-memory stand-in for the indigo module
+################################################################################
+class IndigoDict(dict):
+    """
+    indigo.Dict - a dict that converts lists to indigo.List
+    """
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        for key, value in self.items():
+            if isinstance(value, list):
+                self[key] = IndigoList(value)
+
+    def to_dict(self):
+        return dict(self)
+
+
+class IndigoList(list):
+    """
+    indigo.List
+    """
+    def to_list(self):
+        return list(self)
+
+
+class IndigoDevice(object):
+    """
+    indigo device - states are held in a dict and each state update is counted
+    """
+    def __init__(self, deviceId=0, name='', deviceTypeId='', pluginProps=None, stateDefaults=None,
+                 displayStateId='', enabled=True):
+        self.id = deviceId
+        self.name = name
+        self.deviceTypeId = deviceTypeId
+        self.pluginId = kPLUGIN_ID
+        self.pluginProps = IndigoDict(pluginProps or {})
+        self.states = IndigoDict(stateDefaults or {})
+        self.displayStateId = displayStateId
+        self.enabled = enabled
+        self.configured = True
+        self.address = self.pluginProps.get('address', '')
+        self.errorState = ''
+        self.stateUpdates = 0
+
+    @property
+    def displayStateValRaw(self):
+        return self.states.get(self.displayStateId, '')
+
+    def updateStateOnServer(self, key='', value=None, uiValue=None, decimalPlaces=None, clearErrorState=True):
+        self.states[key] = value
+        self.stateUpdates += 1
+
+    def updateStatesOnServer(self, keyValueList):
+        for keyValue in keyValueList:
+            self.updateStateOnServer(**keyValue)
+
+    def updateStateImageOnServer(self, image):
+        pass
+
+    def setErrorStateOnServer(self, errorState):
+        self.errorState = errorState
+
+    def stateListOrDisplayStateIdChanged(self):
+        pass
+
+    def replacePluginPropsOnServer(self, pluginProps):
+        self.pluginProps = IndigoDict(pluginProps)
+
+
+class IndigoTrigger(object):
+    """
+    indigo trigger
+    """
+    def __init__(self, triggerId=0, name='', pluginTypeId='', pluginProps=None, enabled=True):
+        self.id = triggerId
+        self.name = name
+        self.pluginTypeId = pluginTypeId
+        self.pluginId = kPLUGIN_ID
+        self.pluginProps = IndigoDict(pluginProps or {})
+        self.enabled = enabled
+
+
+class IndigoCollection(object):
+    """
+    indigo.devices, indigo.triggers and indigo.variables - items by id or name
+    """
+    def __init__(self):
+        self.items = {}
+
+    def add(self, item):
+        self.items[item.id] = item
+
+    def iter(self, filter=''):
+        return iter(list(self.items.values()))
+
+    def __iter__(self):
+        return self.iter()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, key):
+        if key in self.items:
+            return self.items[key]
+
+        for item in self.items.values():
+            if item.name == key:
+                return item
+
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def subscribeToChanges(self):
+        pass
+
+
+class IndigoVariable(object):
+    """
+    indigo variable
+    """
+    def __init__(self, variableId=0, name='', value=''):
+        self.id = variableId
+        self.name = name
+        self.value = value
+
+
+class PluginBase(object):
+    """
+    indigo.PluginBase - provides the logger and log handlers the plugin configures
+    """
+    class StopThread(Exception):
+        pass
+
+    def __init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs):
+        self.pluginId = pluginId
+        self.pluginDisplayName = pluginDisplayName
+        self.pluginVersion = pluginVersion
+        self.pluginPrefs = pluginPrefs
+        self.stopThread = False
+
+        self.logger = logging.getLogger('Plugin')
+        self.indigo_log_handler = logging.StreamHandler(sys.stderr)
+        self.indigo_log_handler.setLevel(logging.WARNING)
+        self.plugin_file_handler = logging.NullHandler()
+        self.logger.addHandler(self.indigo_log_handler)
+        self.logger.addHandler(self.plugin_file_handler)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+
+    def __del__(self):
+        pass
+
+    def sleep(self, seconds):
+        if self.stopThread:
+            raise self.StopThread()
+        time.sleep(seconds)
+
+
+def createIndigoModule(logsFolder=''):
+    """
+    returns a module object that stands in for the indigo module. Triggers executed are recorded
+    in indigo.trigger.executed.
+
+    **parameters:**
+    logsFolder -- folder returned by indigo.server.getLogsFolderPath
+    """
+    indigo = types.ModuleType('indigo')
+    indigo.PluginBase = PluginBase
+    indigo.Dict = IndigoDict
+    indigo.List = IndigoList
+    indigo.devices = IndigoCollection()
+    indigo.triggers = IndigoCollection()
+    indigo.variables = IndigoCollection()
+
+    executed = []
+    indigo.trigger = types.SimpleNamespace(executed=executed, execute=lambda triggerId: executed.append(triggerId))
+
+    def createVariable(name, value=''):
+        variable = IndigoVariable(len(indigo.variables) + 1, name, value)
+        indigo.variables.add(variable)
+        return variable
+
+    indigo.variable = types.SimpleNamespace(create=createVariable)
+    indigo.device = types.SimpleNamespace(id=0)
+    indigo.server = types.SimpleNamespace(getLogsFolderPath=lambda pluginId='': logsFolder,
+                                          getDbName=lambda: 'replay',
+                                          getPlugin=lambda pluginId: None)
+    indigo.kStateImageSel = types.SimpleNamespace(SensorTripped='SensorTripped', SensorOn='SensorOn',
+                                                  SensorOff='SensorOff', Error='Error')
+    return indigo
+
+
+def readDeviceDefinitions(devicesXmlFile=''):
+    """
+    returns a dictionary of device type to (displayStateId, default states, default pluginProps)
+    read from Devices.xml
+
+    **parameters:**
+    devicesXmlFile -- the plugin Devices.xml file
+    """
+    definitions = {}
+    for deviceNode in ElementTree.parse(devicesXmlFile).getroot().iter('Device'):
+        displayStateId = deviceNode.findtext('UiDisplayStateId', default='')
+        states = {}
+        for stateNode in deviceNode.iter('State'):
+            valueTypeNode = stateNode.find('ValueType')
+            if (valueTypeNode is not None) and (valueTypeNode.text or '').strip() == 'Boolean':
+                states[stateNode.get('id')] = False
+            else:
+                states[stateNode.get('id')] = ''
+
+        # Indigo saves the default value of each config field in the device pluginProps
+        pluginProps = {}
+        for fieldNode in deviceNode.iter('Field'):
+            if fieldNode.get('type') in ('label', 'separator'):
+                continue
+
+            defaultValue = fieldNode.get('defaultValue', '')
+            if fieldNode.get('type') == 'checkbox':
+                defaultValue = defaultValue.lower() in ('1', 'true')
+            pluginProps[fieldNode.get('id')] = defaultValue
+
+        definitions[deviceNode.get('id')] = (displayStateId, states, pluginProps)
+
+    return definitions
+
+
+################################################################################
+# Replay
+################################################################################
+class TimedMessageFactory(object):
+    """
+    wraps the message cache getMessage method to record how long each message type takes to parse
+    or find in the cache
+    """
+    def __init__(self, messageClass):
+        self.messageClass = messageClass
+        self.parseTimeByType = {}
+        self.lastMessageType = ''
+
+    def __call__(self, *args, **kwargs):
+        startTime = time.perf_counter()
+        message = self.messageClass(*args, **kwargs)
+        elapsed = time.perf_counter() - startTime
+
+        self.lastMessageType = message.messageType or 'UNKNOWN'
+        count, total = self.parseTimeByType.get(self.lastMessageType, (0, 0.0))
+        self.parseTimeByType[self.lastMessageType] = (count + 1, total + elapsed)
+
+        return message
+
+
+def replay(playbackPath='', configuration=None, limit=0):
+    """
+    replays the panel messages and returns a dictionary of results
+
+    **parameters:**
+    playbackPath -- a panel message log file, folder or glob pattern
+    configuration -- dictionary of prefs, devices and triggers (see kDEFAULT_DEVICES)
+    limit -- stop after this many messages (0 for no limit)
+    """
+    configuration = configuration or kDEFAULT_DEVICES
+    logsFolder = tempfile.mkdtemp(prefix='ad2usbReplay')
+
+    indigo = createIndigoModule(logsFolder)
+    sys.modules['indigo'] = indigo
+    sys.path.insert(0, os.path.abspath(kPLUGIN_FOLDER))
+
+    import plugin
+
+    # the devices must exist before the plugin starts - like Indigo
+    definitions = readDeviceDefinitions(os.path.join(kPLUGIN_FOLDER, 'Devices.xml'))
+    for deviceConfig in configuration.get('devices', []):
+        displayStateId, stateDefaults, pluginProps = definitions.get(deviceConfig['deviceTypeId'], ('', {}, {}))
+        pluginProps = dict(pluginProps, **deviceConfig.get('pluginProps', {}))
+        indigo.devices.add(IndigoDevice(deviceConfig['id'], deviceConfig['name'], deviceConfig['deviceTypeId'],
+                                        pluginProps, stateDefaults, displayStateId, deviceConfig.get('enabled', True)))
+
+    for triggerConfig in configuration.get('triggers', []):
+        indigo.triggers.add(IndigoTrigger(triggerConfig['id'], triggerConfig['name'], triggerConfig['pluginTypeId'],
+                                          triggerConfig.get('pluginProps'), triggerConfig.get('enabled', True)))
+
+    prefs = IndigoDict({'indigoLoggingLevel': 'WARNING', 'pluginLoggingLevel': 'WARNING', 'isAdvanced': False,
+                        'isReaderThreadEnabled': False, 'restartClear': True})
+    prefs.update(configuration.get('prefs', {}))
+    prefs.update({'ad2usbCommType': 'messageFile', 'panelMessagePlaybackPath': playbackPath, 'playbackSpeed': 'max'})
+
+    pluginObject = plugin.Plugin(kPLUGIN_ID, 'AD2USB Alarm Interface', 'replay', prefs)
+    pluginObject.startup()
+
+    messageCache = pluginObject.ad2usb.messageCache
+    timedFactory = TimedMessageFactory(messageCache.getMessage)
+    messageCache.getMessage = timedFactory
+
+    for device in indigo.devices:
+        pluginObject.deviceStartComm(device)
+
+    for trigger in indigo.triggers:
+        pluginObject.triggerStartProcessing(trigger)
+
+    # drive the message pipeline the same way runConcurrentThread does
+    processTimeByType = {}
+    messageCount = 0
+    startTime = time.perf_counter()
+
+    while not pluginObject.ad2usb.hasPlaybackFileBeenRead:
+        messageStart = time.perf_counter()
+        cpuStart = time.process_time()
+        timedFactory.lastMessageType = ''
+        pluginObject.ad2usb.panelMsgRead(pluginObject.ad2usbIsAdvanced)
+        elapsed = time.perf_counter() - messageStart
+        cpuElapsed = time.process_time() - cpuStart
+
+        if timedFactory.lastMessageType == '':
+            continue
+
+        messageCount += 1
+        count, total, cpuTotal = processTimeByType.get(timedFactory.lastMessageType, (0, 0.0, 0.0))
+        processTimeByType[timedFactory.lastMessageType] = (count + 1, total + elapsed, cpuTotal + cpuElapsed)
+
+        if (limit > 0) and (messageCount >= limit):
+            break
+
+    elapsedTotal = time.perf_counter() - startTime
+
+    # triggers are executed on the trigger executor threads - count them once they have all run
+    pluginObject.ad2usb.triggerExecutor.waitUntilIdle(timeout=10)
+    triggerStatistics = pluginObject.ad2usb.triggerExecutor.getStatistics()
+
+    # runConcurrentThread writes the heartbeat on a timer - write the last one now
+    pluginObject.updateLastADMessageOnKeypads(force=True)
+    pluginObject.shutdown()
+
+    results = {'messages': messageCount, 'seconds': round(elapsedTotal, 3),
+               'messagesPerSecond': round(messageCount / elapsedTotal, 1) if elapsedTotal > 0 else 0,
+               'byType': {}, 'triggersExecuted': {}, 'deviceStates': {}, 'deviceStateUpdates': 0,
+               'messageCache': messageCache.getStatistics(), 'triggerExecutor': triggerStatistics}
+
+    for messageType in sorted(processTimeByType):
+        count, total, cpuTotal = processTimeByType[messageType]
+        parseCount, parseTotal = timedFactory.parseTimeByType.get(messageType, (0, 0.0))
+        results['byType'][messageType] = {'count': count,
+                                          'parseMicroseconds': round(parseTotal / max(parseCount, 1) * 1000000, 1),
+                                          'processMicroseconds': round(total / count * 1000000, 1),
+                                          'cpuMicroseconds': round(cpuTotal / count * 1000000, 1)}
+
+    for triggerId in indigo.trigger.executed:
+        triggerName = indigo.triggers[triggerId].name
+        results['triggersExecuted'][triggerName] = results['triggersExecuted'].get(triggerName, 0) + 1
+
+    for device in indigo.devices:
+        results['deviceStates'][device.name] = device.states
+        results['deviceStateUpdates'] += device.stateUpdates
+
+    return results
+
+
+def printResults(results):
+    print(u"Messages:{messages} in {seconds} sec - {messagesPerSecond} messages/sec, "
+          u"device state updates:{deviceStateUpdates}".format(**results))
+
+    print(u"\n{:<8} {:>10} {:>14} {:>14} {:>14}".format('Type', 'Count', 'Parse (us)', 'Process (us)', 'CPU (us)'))
+    for messageType, typeResults in results['byType'].items():
+        print(u"{:<8} {count:>10} {parseMicroseconds:>14} {processMicroseconds:>14} {cpuMicroseconds:>14}".format(
+            messageType, **typeResults))
+
+    print(u"\nParsed message cache - hits:{hits}, misses:{misses}, evictions:{evictions}".format(
+        **results['messageCache']))
+
+    print(u"\nTrigger executor - executed:{triggersExecuted}, errors:{executeErrors}, "
+          u"queue latency average:{averageQueueLatency} sec, max:{maxQueueLatency} sec".format(**results['triggerExecutor']))
+
+    print(u"\nTriggers executed:")
+    for triggerName, count in results['triggersExecuted'].items():
+        print(u"  {}: {}".format(triggerName, count))
+
+    print(u"\nFinal device states:")
+    for deviceName, states in results['deviceStates'].items():
+        print(u"  {}".format(deviceName))
+        for key in sorted(states):
+            print(u"    {}: {}".format(key, states[key]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a panel message log through the ad2usb plugin without Indigo.')
+    parser.add_argument('playbackPath', help='panel message log file, folder or glob pattern (.gz files are supported)')
+    parser.add_argument('--devices', help='JSON file of prefs, devices and triggers')
+    parser.add_argument('--limit', type=int, default=0, help='stop after this many messages')
+    parser.add_argument('--json', action='store_true', help='write the results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='show plugin INFO messages')
+    args = parser.parse_args()
+
+    configuration = None
+    if args.devices:
+        with open(args.devices, 'rt') as f:
+            configuration = json.load(f)
+
+    if args.verbose:
+        configuration = configuration or dict(kDEFAULT_DEVICES)
+        configuration['prefs'] = dict(configuration.get('prefs', {}), indigoLoggingLevel='INFO')
+
+    results = replay(args.playbackPath, configuration, args.limit)
+
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        printResults(results)
+
+
+if __name__ == '__main__':
+    main()